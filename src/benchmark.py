@@ -0,0 +1,981 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import cv2
+import multiprocessing
+import numpy
+import os
+import random
+import requests
+import resource
+import shutil
+import threading
+import time
+
+from argparse import ArgumentParser as Parser
+from argparse import RawDescriptionHelpFormatter
+
+from clf_train import create_model
+from clf_train import load_classifier
+from clf_train import save_classifier
+
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset_miner import create_session
+from dataset_miner import fetch_images
+from dataset_miner import get_image_urls
+from dataset_miner import get_page
+
+from face_tracking import TRACKERS
+from face_tracking import match_boxes
+
+from frame_analysis import FrameAnalyser
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from http_cache import ResponseCache
+
+from image_process import check_faces
+
+from lbph import LBPHGallery
+from lbph import LBPHIndex
+from lbph import extract_gallery
+
+from subspace import batch_predict
+from subspace import extract_subspace
+from subspace import is_subspace_model
+
+from utils import compute_path
+from utils import get_file_paths
+from utils import read_json
+
+
+# Default benchmark modes
+modes = (
+	'batch_predict',
+	'detection_scales',
+	'image_downloads',
+	'lbph_index',
+	'model_load',
+	'subspace_backends',
+	'tracking',
+)
+
+
+
+
+def read_video(video_path, max_frames):
+
+	""" Reads the first frames of a video into memory
+
+	Arguments:
+	----------
+		video_path:
+			type: string
+			info: path where the video is located
+
+		max_frames:
+			type: int
+			info: maximum number of frames to read
+
+	Returns:
+	----------
+		frames:
+			type: list
+			info: arrays of frame pixels
+	"""
+
+	video = cv2.VideoCapture(video_path)
+	frames = []
+
+	not_finished, frame = video.read()
+	while not_finished and len(frames) < max_frames:
+		frames.append(frame)
+		not_finished, frame = video.read()
+
+	video.release()
+	return frames
+
+
+
+
+def time_analysis(frames, analyser):
+
+	""" Analyses a list of frames measuring the elapsed time
+
+	Arguments:
+	----------
+		frames:
+			type: list
+			info: arrays of frame pixels
+
+		analyser:
+			type: FrameAnalyser object
+			info: analyser to benchmark
+
+	Returns:
+	----------
+		boxes:
+			type: list
+			info: coordinates dicts of the faces found on each frame
+
+		elapsed:
+			type: float
+			info: seconds spent analysing the frames
+	"""
+
+	boxes = []
+	start = time.perf_counter()
+
+	for frame in frames:
+		detections = analyser.analyse(frame)
+		boxes.append([d['coords'] for d in detections])
+
+	return boxes, time.perf_counter() - start
+
+
+
+
+def read_faces(training_config, max_images):
+
+	""" Reads the first face images of the datasets of a training config
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		max_images:
+			type: int
+			info: maximum number of images to read
+
+	Returns:
+	----------
+		images:
+			type: list
+			info: normalized greyscale and sized images
+	"""
+
+	datasets = read_json(training_config, 'training_c')
+	images = []
+
+	for dataset in datasets:
+		for path in get_file_paths(dataset['folder'], 'dataset'):
+			if len(images) == max_images:
+				return images
+			images.append(cv2.imread(path, 0))
+
+	return images
+
+
+
+
+def read_samples(training_config, max_images):
+
+	""" Reads the same number of face images from every dataset of a config
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		max_images:
+			type: int
+			info: maximum number of images to read
+
+	Returns:
+	----------
+		images:
+			type: list
+			info: normalized greyscale and sized images
+
+		labels:
+			type: list
+			info: integer label of each image
+	"""
+
+	datasets = read_json(training_config, 'training_c')
+	per_dataset = max_images // len(datasets)
+	images, labels = [], []
+
+	for i, dataset in enumerate(datasets):
+		paths = get_file_paths(dataset['folder'], 'dataset')[:per_dataset]
+		images += [cv2.imread(path, 0) for path in paths]
+		labels += [i] * len(paths)
+
+	return images, labels
+
+
+
+
+def train_backend(algorithm, params, samples, labels, tests, test_labels):
+
+	""" Trains and tests a recognizer measuring its time and memory
+
+	Arguments:
+	----------
+		algorithm:
+			type: string
+			info: name of the algorithm
+
+		params:
+			type: dict
+			info: constructor parameters of the model
+
+		samples:
+			type: list
+			info: training images
+
+		labels:
+			type: list
+			info: training images labels
+
+		tests:
+			type: list
+			info: testing images
+
+		test_labels:
+			type: list
+			info: testing images labels
+
+	Returns:
+	----------
+		train_time:
+			type: float
+			info: seconds spent training
+
+		peak_memory:
+			type: float
+			info: increase of the process peak RSS while training (MB)
+
+		accuracy:
+			type: float
+			info: ratio of testing images correctly predicted
+	"""
+
+	labels = numpy.array(labels)
+	peak_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	start = time.perf_counter()
+	model = create_model(algorithm, **params)
+	model.train(samples, labels)
+	train_time = time.perf_counter() - start
+
+	# Linux reports the peak RSS in KB
+	peak_memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_start) / 1024
+
+	pred_labels, _ = batch_predict(model, tests)
+	accuracy = numpy.mean(pred_labels == numpy.array(test_labels))
+
+	return train_time, peak_memory, accuracy
+
+
+
+
+def subspace_backends(training_config, components, max_images, seed):
+
+	""" Compares the OpenCV Eigen / Fisher recognizers with the NumPy ones
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		components:
+			type: int
+			info: number of Eigen components
+
+		max_images:
+			type: int
+			info: maximum number of images to read
+
+		seed:
+			type: int
+			info: seed of the training / testing split
+	"""
+
+	split = split_samples(training_config, max_images, seed)
+
+	print('Training images:', len(split[0]))
+	print('Testing images:', len(split[2]))
+
+	backends = (
+		('Eigen', {'num_components': components}),
+		('NumpyEigen', {'num_components': components}),
+		('Fisher', {}),
+		('NumpyFisher', {}),
+	)
+
+	# Each model is trained in a new process, so the peak RSS is its own
+	context = multiprocessing.get_context('spawn')
+
+	for algorithm, params in backends:
+		with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+			train_time, peak_memory, accuracy = \
+				executor.submit(train_backend, algorithm, params, *split).result()
+
+		print(
+			algorithm, '->',
+			round(train_time, 2), 's,',
+			round(peak_memory, 1), 'MB peak increase,',
+			'accuracy:', round(accuracy, 4)
+		)
+
+
+
+
+def batch_predict_sizes(model_name, training_config, sizes, max_images):
+
+	""" Compares the prediction throughput of several batch sizes
+
+	Arguments:
+	----------
+		model_name:
+			type: string
+			info: name of the trained model
+
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		sizes:
+			type: list
+			info: batch sizes to compare with one image at a time
+
+		max_images:
+			type: int
+			info: maximum number of images to predict
+	"""
+
+	model = load_classifier(model_name).model
+	images = read_faces(training_config, max_images)
+
+	start = time.perf_counter()
+	for image in images:
+		model.predict(image)
+	single_time = time.perf_counter() - start
+
+	print('Images:', len(images))
+	print('One at a time:', round(len(images) / single_time, 2), 'images/s')
+
+	if not is_subspace_model(model):
+		print('Only Eigen and Fisher models are predicted in batches')
+		return
+
+	start = time.perf_counter()
+	subspace = extract_subspace(model)
+	print('Matrices extraction:', round(time.perf_counter() - start, 4), 's')
+
+	for size in sizes:
+		start = time.perf_counter()
+		for i in range(0, len(images), size):
+			batch_predict(model, images[i: i+size], subspace)
+		elapsed = time.perf_counter() - start
+
+		print(
+			'Batch size', size, '->',
+			round(len(images) / elapsed, 2), 'images/s,',
+			'speedup:', round(single_time / max(elapsed, 1e-9), 2), 'x'
+		)
+
+
+
+
+def detection_scales(video_path, widths, max_frames):
+
+	""" Compares the detection recall and time at several downscaled widths
+
+	Arguments:
+	----------
+		video_path:
+			type: string
+			info: path where the video is located
+
+		widths:
+			type: list
+			info: detection widths to compare with the full resolution
+
+		max_frames:
+			type: int
+			info: maximum number of frames to analyse
+	"""
+
+	if min(widths) < 1:
+		exit('The detection widths must be greater than 0')
+
+	frames = read_video(video_path, max_frames)
+	results = {}
+
+	for width in [None] + widths:
+		boxes = []
+		start = time.perf_counter()
+
+		for frame in frames:
+			boxes.append([c for _, c in check_faces(frame, detect_width=width)])
+
+		results[width] = (boxes, time.perf_counter() - start)
+
+	full_boxes, full_time = results[None]
+	total = sum(len(b) for b in full_boxes)
+
+	print('Frames:', len(frames))
+	print('Full resolution:', round(full_time, 4), 's,', total, 'faces')
+
+	# Recall: faces found at full resolution also found when downscaled
+	for width in widths:
+		boxes, elapsed = results[width]
+		found = sum(
+			len(match_boxes(full, scaled, min_iou=0.5))
+			for full, scaled in zip(full_boxes, boxes)
+		)
+
+		print(
+			'Width', width, '->',
+			round(elapsed, 4), 's,',
+			'speedup:', round(full_time / max(elapsed, 1e-9), 2), 'x,',
+			'recall:', round(found / max(total, 1), 4)
+		)
+
+
+
+
+def split_samples(training_config, max_images, seed):
+
+	""" Reads some face images and splits them into training and testing sets
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		max_images:
+			type: int
+			info: maximum number of images to read
+
+		seed:
+			type: int
+			info: seed of the training / testing split
+
+	Returns:
+	----------
+		split:
+			type: tuple
+			info: training images and labels, testing images and labels (80% / 20%)
+	"""
+
+	images, labels = read_samples(training_config, max_images)
+
+	comb_list = list(zip(images, labels))
+	random.Random(seed).shuffle(comb_list)
+	images, labels = zip(*comb_list)
+
+	cut = int(len(images) * 0.8)
+	return list(images[:cut]), list(labels[:cut]), list(images[cut:]), list(labels[cut:])
+
+
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+
+	""" Serves a results page and its images, as a slow search engine would
+
+	Attributes:
+	----------
+		images:
+			type: int
+			info: number of images linked by the page (the last one is missing)
+
+		latency:
+			type: float
+			info: seconds waited before every response
+	"""
+
+	images = 100
+	latency = 0.1
+
+
+
+
+	def do_GET(self):
+
+		""" Responds with the page, an image or a not found error """
+
+		time.sleep(self.latency)
+
+		if self.path == '/':
+			links = ''.join('<img src="/img/' + str(i) + '.png">' for i in range(self.images))
+			self.respond('text/html', ('<html><body>' + links + '</body></html>').encode())
+
+		elif self.path.startswith('/img/') and self.path != '/img/' + str(self.images - 1) + '.png':
+			etag = '"' + self.path + '"'
+
+			# The images never change, so they can be revalidated
+			if self.headers.get('If-None-Match') == etag:
+				self.send_response(304)
+				self.end_headers()
+				return
+
+			seed = int(self.path[5:-4])
+			image = numpy.random.RandomState(seed).randint(0, 255, (120, 120, 3), dtype=numpy.uint8)
+			self.respond('image/png', cv2.imencode('.png', image)[1].tobytes(), etag)
+
+		else:
+			self.send_error(404)
+
+
+
+
+	def respond(self, content_type, content, etag=None):
+
+		""" Sends a successful response
+
+		Arguments:
+		----------
+			content_type:
+				type: string
+				info: MIME type of the content
+
+			content:
+				type: bytes
+				info: body of the response
+
+			etag:
+				type: string (optional)
+				info: validator of the content
+		"""
+
+		self.send_response(200)
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(content)))
+
+		if etag is not None:
+			self.send_header('ETag', etag)
+
+		self.end_headers()
+		self.wfile.write(content)
+
+
+
+
+	def log_message(self, *args):
+
+		""" Silences the requests log """
+
+		pass
+
+
+
+
+def image_downloads(images, latency, workers, per_host):
+
+	""" Compares downloading the images of a page one by one, concurrently and cached
+
+	A local server stands in for the search engine, so the results
+	only depend on its latency and not on the network. The cached
+	downloads are repeated with a fresh and an expired cache.
+
+	Arguments:
+	----------
+		images:
+			type: int
+			info: number of images of the page
+
+		latency:
+			type: float
+			info: seconds the server waits before every response
+
+		workers:
+			type: int
+			info: number of concurrent downloads
+
+		per_host:
+			type: int
+			info: maximum number of concurrent downloads from the server
+	"""
+
+	FixtureHandler.images = images
+	FixtureHandler.latency = latency
+
+	server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+
+	url = 'http://127.0.0.1:' + str(server.server_address[1]) + '/'
+
+	try:
+		urls = get_image_urls(get_page(url), url)
+
+		# Previous approach: a new connection per image, one after another
+		start = time.perf_counter()
+		serial = [requests.get(image_url).content for image_url in urls]
+		serial_time = time.perf_counter() - start
+
+		start = time.perf_counter()
+		session = create_session(pool_size=workers)
+		fetched = list(fetch_images(urls, session, workers, per_host))
+		fetch_time = time.perf_counter() - start
+
+		cached_times = {}
+
+		for name, ttl in (('Cold cache', 3600), ('Fresh cache', 3600), ('Expired cache', 0)):
+			cache = ResponseCache('benchmark', ttl=ttl)
+
+			start = time.perf_counter()
+			cached = list(fetch_images(urls, session, workers, per_host, cache=cache))
+			cached_times[name] = (time.perf_counter() - start, len(cached), dict(cache.stats))
+
+			cache.save()
+
+	finally:
+		server.shutdown()
+		server.server_close()
+		shutil.rmtree(compute_path('benchmark', 'cache'), ignore_errors=True)
+
+	print('Page images:', len(urls), ', server latency:', latency, 's')
+
+	print(
+		'Serial ->', len(serial), 'responses,',
+		round(len(serial) / serial_time, 2), 'images/s'
+	)
+	print(
+		'Concurrent ->', len(fetched), 'images,',
+		round(len(fetched) / fetch_time, 2), 'images/s',
+		'(' + str(len(urls) - len(fetched)), 'failed)'
+	)
+
+	print('Speedup:', round(serial_time / max(fetch_time, 1e-9), 2), 'x')
+
+	for name, (elapsed, count, stats) in cached_times.items():
+		print(name, '->', count, 'images,', round(count / elapsed, 2), 'images/s,', stats)
+
+
+
+
+def lbph_index(training_config, cells, nprobes, max_images, seed):
+
+	""" Compares the exact LBPH search with the indexed one
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		cells:
+			type: int
+			info: number of cells of the index (None for 4 x sqrt(samples))
+
+		nprobes:
+			type: list
+			info: numbers of cells searched per face to compare
+
+		max_images:
+			type: int
+			info: maximum number of images to read
+
+		seed:
+			type: int
+			info: seed of the training / testing split
+	"""
+
+	samples, labels, tests, test_labels = split_samples(training_config, max_images, seed)
+	test_labels = numpy.array(test_labels)
+
+	model = create_model('LBPH')
+	model.train(samples, numpy.array(labels))
+	gallery = LBPHGallery(extract_gallery(model))
+
+	start = time.perf_counter()
+	exact_labels, _ = gallery.predict_batch(tests)
+	exact_time = time.perf_counter() - start
+
+	start = time.perf_counter()
+	index = LBPHIndex(extract_gallery(gallery), cells)
+	print('Training images:', len(samples), ', cells:', len(index.centroids))
+	print('Index build:', round(time.perf_counter() - start, 2), 's')
+
+	print(
+		'Exact ->',
+		round(1000 * exact_time / len(tests), 3), 'ms/face,',
+		'accuracy:', round(numpy.mean(exact_labels == test_labels), 4)
+	)
+
+	for nprobe in nprobes:
+		index.nprobe = nprobe
+
+		start = time.perf_counter()
+		pred_labels, _ = index.predict_batch(tests)
+		elapsed = time.perf_counter() - start
+
+		print(
+			'nprobe', nprobe, '->',
+			round(1000 * elapsed / len(tests), 3), 'ms/face,',
+			'speedup:', round(exact_time / max(elapsed, 1e-9), 2), 'x,',
+			'accuracy:', round(numpy.mean(pred_labels == test_labels), 4), ',',
+			'same as exact:', round(numpy.mean(pred_labels == exact_labels), 4)
+		)
+
+
+
+
+def model_load(model_name, repeats):
+
+	""" Compares the loading time of a XML model with its binary version
+
+	Arguments:
+	----------
+		model_name:
+			type: string
+			info: name of the trained model, in the XML format
+
+		repeats:
+			type: int
+			info: number of times each model is loaded
+	"""
+
+	if os.path.exists(compute_path(model_name + '.npz', 'model')):
+		exit('The model must only be stored in the xml format')
+
+	binary_name = model_name + '_binary'
+	times = {}
+
+	start = time.perf_counter()
+	for _ in range(repeats):
+		clf = load_classifier(model_name)
+	times['xml'] = (time.perf_counter() - start) / repeats
+
+	save_classifier(clf, binary_name, 'npz')
+
+	start = time.perf_counter()
+	for _ in range(repeats):
+		load_classifier(binary_name)
+	times['npz'] = (time.perf_counter() - start) / repeats
+
+	sizes = {
+		'xml': os.path.getsize(compute_path(model_name + '.xml', 'model')),
+		'npz': os.path.getsize(compute_path(binary_name + '.npz', 'model'))
+	}
+
+	for model_format in ('xml', 'npz'):
+		print(
+			model_format, '->',
+			round(times[model_format], 4), 's,',
+			round(sizes[model_format] / 2**20, 2), 'MB'
+		)
+
+	print('Speedup:', round(times['xml'] / max(times['npz'], 1e-9), 2), 'x')
+	print('Binary model stored as', binary_name)
+
+
+
+
+def tracking(video_path, model_name, clf_th, detect_every, tracker, max_frames):
+
+	""" Compares full detection on every frame against detection plus tracking
+
+	Arguments:
+	----------
+		video_path:
+			type: string
+			info: path where the video is located
+
+		model_name:
+			type: string
+			info: name of the trained model
+
+		clf_th:
+			type: float
+			info: confidence threshold to identify an actor
+
+		detect_every:
+			type: int
+			info: number of frames between two full face detections
+
+		tracker:
+			type: string
+			info: name of the tracker following faces between detections
+
+		max_frames:
+			type: int
+			info: maximum number of frames to analyse
+	"""
+
+	clf = load_classifier(model_name)
+	frames = read_video(video_path, max_frames)
+
+	full_boxes, full_time = time_analysis(frames, FrameAnalyser(clf, clf_th))
+	tracked_boxes, tracked_time = time_analysis(
+		frames,
+		FrameAnalyser(clf, clf_th, detect_every=detect_every, tracker=tracker)
+	)
+
+	overlaps, shifts, missed, total = [], [], 0, 0
+
+	# Drift: tracked boxes compared with the ones fully detected
+	for full, tracked in zip(full_boxes, tracked_boxes):
+		matches = match_boxes(full, tracked, min_iou=0.1)
+		total += len(full)
+		missed += len(full) - len(matches)
+
+		for i, j, overlap in matches:
+			a, b = full[i], tracked[j]
+			shift_x = (a['X_coord'] + a['width']/2) - (b['X_coord'] + b['width']/2)
+			shift_y = (a['Y_coord'] + a['height']/2) - (b['Y_coord'] + b['height']/2)
+
+			overlaps.append(overlap)
+			shifts.append((shift_x**2 + shift_y**2) ** 0.5)
+
+	print('Frames:', len(frames))
+	print('Full detection time:', round(full_time, 4), 's')
+	print('Tracking time:', round(tracked_time, 4), 's')
+	print('Speedup:', round(full_time / max(tracked_time, 1e-9), 2), 'x')
+	print('Mean IoU:', round(sum(overlaps) / max(len(overlaps), 1), 4))
+	print('Mean centre drift:', round(sum(shifts) / max(len(shifts), 1), 2), 'px')
+	print('Missed faces:', missed, 'of', total)
+
+
+
+
+if __name__ == '__main__':
+
+	global_parser = Parser(
+		usage='benchmark.py [mode] [arguments]',
+		description=
+			'modes and arguments:\n'
+			'  \n'
+			'  batch_predict: compares the prediction throughput of several batch sizes\n'
+			'			-m <model name>\n'
+			'			-d <training config file>\n'
+			'			--sizes <batch sizes> (optional)\n'
+			'			--images <maximum number of images> (optional)\n'
+			'  \n'
+			'  detection_scales: compares detection recall and time at several widths\n'
+			'			-v <video path>\n'
+			'			--widths <detection widths> (optional)\n'
+			'			--frames <maximum number of frames> (optional)\n'
+			'  \n'
+			'  image_downloads: compares serial and concurrent downloads from a local server\n'
+			'			--images <number of images> (optional)\n'
+			'			--latency <server seconds per response> (optional)\n'
+			'			--workers <concurrent downloads> (optional)\n'
+			'			--per-host <concurrent downloads per host> (optional)\n'
+			'  \n'
+			'  lbph_index: compares the exact LBPH search with the indexed one\n'
+			'			-d <training config file>\n'
+			'			--cells <number of cells> (optional)\n'
+			'			--nprobes <cells searched per face> (optional)\n'
+			'			--images <maximum number of images> (optional)\n'
+			'			--seed <split seed> (optional)\n'
+			'  \n'
+			'  model_load: compares the loading time of a XML model and its binary version\n'
+			'			-m <model name>\n'
+			'			--repeats <number of loads> (optional)\n'
+			'  \n'
+			'  subspace_backends: compares the OpenCV and NumPy Eigen / Fisher training\n'
+			'			-d <training config file>\n'
+			'			--components <number of Eigen components> (optional)\n'
+			'			--images <maximum number of images> (optional)\n'
+			'			--seed <split seed> (optional)\n'
+			'  \n'
+			'  tracking: compares full detection against detection plus tracking\n'
+			'			-v <video path>\n'
+			'			-m <model name>\n'
+			'			-c <classifier threshold>\n'
+			'			--detect-every <frames between detections> (optional)\n'
+			'			--tracker <tracker name> (optional)\n'
+			'			--frames <maximum number of frames> (optional)\n',
+		formatter_class=RawDescriptionHelpFormatter
+	)
+
+	# Parsing the arguments in order to check the mode
+	global_parser.add_argument('mode', choices=modes)
+	arg, func_args = global_parser.parse_known_args()
+
+
+	if arg.mode == 'batch_predict':
+
+		parser = Parser(usage="Use 'benchmark.py -h' for help")
+		parser.add_argument('-m', required=True)
+		parser.add_argument('-d', required=True)
+		parser.add_argument('--sizes', default=[1, 4, 16, 64, 256, 1024], nargs='+', type=int)
+		parser.add_argument('--images', default=2000, type=int)
+
+		args = parser.parse_args(func_args)
+		batch_predict_sizes(args.m, args.d, args.sizes, args.images)
+
+
+	elif arg.mode == 'detection_scales':
+
+		parser = Parser(usage="Use 'benchmark.py -h' for help")
+		parser.add_argument('-v', required=True)
+		parser.add_argument('--widths', default=[1280, 960, 640, 480, 320], nargs='+', type=int)
+		parser.add_argument('--frames', default=500, type=int)
+
+		args = parser.parse_args(func_args)
+		detection_scales(args.v, args.widths, args.frames)
+
+
+	elif arg.mode == 'image_downloads':
+
+		parser = Parser(usage="Use 'benchmark.py -h' for help")
+		parser.add_argument('--images', default=100, type=int)
+		parser.add_argument('--latency', default=0.1, type=float)
+		parser.add_argument('--workers', default=8, type=int)
+		parser.add_argument('--per-host', default=8, type=int)
+
+		args = parser.parse_args(func_args)
+		image_downloads(args.images, args.latency, args.workers, args.per_host)
+
+
+	elif arg.mode == 'lbph_index':
+
+		parser = Parser(usage="Use 'benchmark.py -h' for help")
+		parser.add_argument('-d', required=True)
+		parser.add_argument('--cells', default=None, type=int)
+		parser.add_argument('--nprobes', default=[1, 2, 4, 8, 16, 32], nargs='+', type=int)
+		parser.add_argument('--images', default=10000, type=int)
+		parser.add_argument('--seed', default=0, type=int)
+
+		args = parser.parse_args(func_args)
+		lbph_index(args.d, args.cells, args.nprobes, args.images, args.seed)
+
+
+	elif arg.mode == 'model_load':
+
+		parser = Parser(usage="Use 'benchmark.py -h' for help")
+		parser.add_argument('-m', required=True)
+		parser.add_argument('--repeats', default=5, type=int)
+
+		args = parser.parse_args(func_args)
+		model_load(args.m, args.repeats)
+
+
+	elif arg.mode == 'subspace_backends':
+
+		parser = Parser(usage="Use 'benchmark.py -h' for help")
+		parser.add_argument('-d', required=True)
+		parser.add_argument('--components', default=100, type=int)
+		parser.add_argument('--images', default=5000, type=int)
+		parser.add_argument('--seed', default=0, type=int)
+
+		args = parser.parse_args(func_args)
+		subspace_backends(args.d, args.components, args.images, args.seed)
+
+
+	elif arg.mode == 'tracking':
+
+		parser = Parser(usage="Use 'benchmark.py -h' for help")
+		parser.add_argument('-v', required=True)
+		parser.add_argument('-m', required=True)
+		parser.add_argument('-c', required=True, type=float)
+		parser.add_argument('--detect-every', default=5, type=int)
+		parser.add_argument('--tracker', default='KCF', choices=TRACKERS.keys())
+		parser.add_argument('--frames', default=500, type=int)
+
+		args = parser.parse_args(func_args)
+		tracking(args.v, args.m, args.c, args.detect_every, args.tracker, args.frames)
@@ -0,0 +1,161 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import csv
+import numpy
+import os
+
+from utils import compute_path
+
+
+CURVE_FIELDS = [
+	'threshold',
+	'precision',
+	'recall',
+	'unknown_rate',
+	'f1',
+]
+
+
+
+
+def threshold_curves(true_labels, pred_labels, dists):
+
+	""" Computes the identification metrics of every possible threshold at once
+
+	A face is named when its label is not -1 and its distance is
+	greater or equal than the threshold (see 'FaceClassifier.identify'),
+	so only the distances of the predictions are candidate thresholds.
+
+	Arguments:
+	----------
+		true_labels:
+			type: numpy array
+			info: true label of each validation sample
+
+		pred_labels:
+			type: numpy array
+			info: predicted label of each validation sample
+
+		dists:
+			type: numpy array
+			info: prediction distance of each validation sample
+
+	Returns:
+	----------
+		curves:
+			type: dict
+			info: arrays of the thresholds and their metrics (see 'CURVE_FIELDS')
+	"""
+
+	order = numpy.argsort(dists, kind='stable')
+	dists = dists[order]
+
+	named = pred_labels[order] != -1
+	correct = named & (pred_labels[order] == true_labels[order])
+
+	# Faces named and correctly named with each sorted distance or a greater one
+	named_from = numpy.cumsum(named[::-1])[::-1]
+	correct_from = numpy.cumsum(correct[::-1])[::-1]
+
+	thresholds = numpy.unique(dists[named])
+	starts = numpy.searchsorted(dists, thresholds, side='left')
+
+	named_count = named_from[starts]
+	correct_count = correct_from[starts]
+	total = len(dists)
+
+	# Without any named face, no face is wrongly named
+	precision = numpy.divide(
+		correct_count, named_count,
+		out=numpy.ones(len(thresholds)),
+		where=named_count > 0
+	)
+	recall = correct_count / total
+
+	f1 = numpy.divide(
+		2 * precision * recall, precision + recall,
+		out=numpy.zeros(len(thresholds)),
+		where=(precision + recall) > 0
+	)
+
+	return {
+		'threshold': thresholds,
+		'precision': precision,
+		'recall': recall,
+		'unknown_rate': 1 - named_count / total,
+		'f1': f1
+	}
+
+
+
+
+def suggest_threshold(curves, min_precision=None):
+
+	""" Chooses the threshold with the best balance of the curves
+
+	Arguments:
+	----------
+		curves:
+			type: dict
+			info: arrays of the thresholds and their metrics (see 'threshold_curves')
+
+		min_precision:
+			type: float (optional)
+			info: minimum precision (None to maximize the F1 score)
+
+	Returns:
+	----------
+		position:
+			type: int
+			info: position of the suggested threshold in the curves
+	"""
+
+	if len(curves['threshold']) == 0:
+		exit('No validation sample was identified')
+
+	if min_precision is not None:
+		reached = curves['precision'] >= min_precision
+
+		# The greatest recall among the thresholds reaching the precision
+		if reached.any():
+			return int(numpy.argmax(numpy.where(reached, curves['recall'], -1)))
+
+		print('No threshold reaches a precision of', min_precision)
+
+	return int(numpy.argmax(curves['f1']))
+
+
+
+
+def write_curves(curves, file_name):
+
+	""" Writes the threshold curves as a CSV file inside the reports folder
+
+	Arguments:
+	----------
+		curves:
+			type: dict
+			info: arrays of the thresholds and their metrics (see 'threshold_curves')
+
+		file_name:
+			type: string
+			info: saved CSV name
+	"""
+
+	file_path = compute_path(file_name, 'report')
+
+	file_dir = file_path.replace(file_name, '')
+	os.makedirs(file_dir, exist_ok=True)
+
+	try:
+		file = open(file_path, 'w', encoding='utf-8', newline='')
+
+		writer = csv.writer(file)
+		writer.writerow(CURVE_FIELDS)
+		writer.writerows(zip(*[curves[field].tolist() for field in CURVE_FIELDS]))
+
+		file.close()
+
+	except IOError:
+		exit('The file ' + file_name + ' cannot be opened')
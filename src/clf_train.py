@@ -2,18 +2,67 @@
 
 
 import cv2
+import json
 import numpy
+import os
 
+from functools import partial
+
+from lbph import LBPHGallery
+from lbph import LBPHIndex
+from lbph import extract_gallery
+from lbph import is_lbph_model
+
+from subspace import EigenRecognizer
+from subspace import FisherRecognizer
+from subspace import SubspaceRecognizer
+from subspace import batch_predict
+from subspace import extract_subspace
+from subspace import import_subspace
+from subspace import is_subspace_model
+
+from utils import compute_path
 from utils import get_file_paths
 from utils import crossValidation
+from utils import read_arrays
+from utils import read_clf
+from utils import read_images
+from utils import read_json
+from utils import write_arrays
+from utils import write_clf
+from utils import write_json
 
 
+# Recognizer factories: models are only built when a classifier needs one
 ALGORITHMS = {
-	'Eigen': cv2.face.EigenFaceRecognizer_create(),
-	'Fisher': cv2.face.FisherFaceRecognizer_create(),
-	'LBPH': cv2.face.LBPHFaceRecognizer_create(),
+	'Eigen': cv2.face.EigenFaceRecognizer_create,
+	'Fisher': cv2.face.FisherFaceRecognizer_create,
+	'LBPH': cv2.face.LBPHFaceRecognizer_create,
+	'NumpyEigen': EigenRecognizer,
+	'NumpyFisher': FisherRecognizer,
 }
 
+# Constructor parameters accepted by each recognizer
+ALGORITHM_PARAMS = {
+	'Eigen': ('num_components', 'threshold'),
+	'Fisher': ('num_components', 'threshold'),
+	'LBPH': ('radius', 'neighbors', 'grid_x', 'grid_y', 'threshold'),
+	'NumpyEigen': ('num_components', 'threshold'),
+	'NumpyFisher': ('num_components', 'pca_components', 'threshold'),
+}
+
+# OpenCV recognizers without updates, replaced by their NumPy equivalents
+UPDATE_CONVERSIONS = {
+	'Eigen': 'NumpyEigen',
+	'Fisher': 'NumpyFisher',
+}
+
+# Formats of the stored models: single binary file or legacy JSON + XML pair
+MODEL_FORMATS = (
+	'npz',
+	'xml',
+)
+
 
 
 
@@ -31,12 +80,20 @@ class FaceClassifier(object):
 		labels_dict:
 			type: dict
 			info: contains the relation integer <-> actor name
+
+		validation:
+			type: dict
+			info: true labels, predicted labels and distances of the validation
+
+		verbose:
+			type: bool
+			info: whether every identified face is printed
 	"""
 
 
 
 
-	def __init__(self, algorithm):
+	def __init__(self, algorithm, **params):
 
 		""" Initiates a classifier object with a model type
 
@@ -44,23 +101,29 @@ class FaceClassifier(object):
 		----------
 			algorithm:
 				type: string
-				info: name of the algorithm {Eigen, Fisher, LBPH}
+				info: name of the algorithm {Eigen, Fisher, LBPH, NumpyEigen, NumpyFisher} or a registered one
+
+			params:
+				type: dict (optional)
+				info: constructor parameters of the model (see 'ALGORITHM_PARAMS')
 		"""
 
-		try:
-			self.model = ALGORITHMS[algorithm]
-			self.properties = {
-				'algorithm': algorithm,
-				'labels': {}
-			}
+		self.model = create_model(algorithm, **params)
+		self.properties = {
+			'algorithm': algorithm,
+			'params': params,
+			'labels': {}
+		}
+		self.validation = None
+		self.verbose = True
 
-		except KeyError:
-			exit('Invalid algorithm name')
+		# Model whose subspace matrices were extracted, and the matrices
+		self.__subspace = (None, None)
 
 
 
 
-	def __prepare_samples(self, datasets_info):
+	def __prepare_samples(self, datasets_info, readers=4):
 
 		""" Builds the feature and label vectors from the specified datasets
 
@@ -72,6 +135,10 @@ class FaceClassifier(object):
 					- label (string)
 					- folder (string)
 
+			readers:
+				type: int (optional)
+				info: number of threads decoding images at the same time
+
 		Returns:
 		----------
 			feats:
@@ -83,30 +150,168 @@ class FaceClassifier(object):
 				info: contains all the integer-encoded labels
 		"""
 
-		feats, labels = [], []
+		paths, labels = [], []
 
-		for i, dataset in enumerate(datasets_info):
+		for dataset in datasets_info:
 
 			images_paths = get_file_paths(
 				folder_name=dataset['folder'],
 				file_type='dataset'
 			)
 
-			feats += [cv2.imread(path, 0) for path in images_paths]
-			labels += [i] * len(images_paths)
+			label = self.__encode_label(dataset['label'])
 
-			# Updates the corresponding ints <-> labels dict
-			self.properties['labels'][i] = dataset['label']
+			paths += images_paths
+			labels += [label] * len(images_paths)
 
 
-		return feats, numpy.array(labels)
+		# The images that could not be decoded are left out
+		feats, valid = read_images(paths, readers)
+		labels = numpy.array(labels)
 
+		if not valid.all():
+			feats, labels = feats[valid], labels[valid]
 
+		return feats, labels
 
 
-	def predict(self, image, clf_th):
 
-		""" Predicts a label (name) for a given face image
+
+	def __prepare_pack(self, images, datasets_info):
+
+		""" Builds the label vector of a packed dataset, keeping its images mapped
+
+		Arguments:
+		----------
+			images:
+				type: numpy memmap
+				info: packed images of the datasets (see 'read_pack')
+
+			datasets_info:
+				type: list
+				info: list of dictionaries containing:
+					- label (string)
+					- start (int)
+					- end (int)
+
+		Returns:
+		----------
+			feats:
+				type: numpy memmap
+				info: contains all the images, not read yet
+
+			labels:
+				type: numpy.array
+				info: contains all the integer-encoded labels
+		"""
+
+		labels = numpy.empty(len(images), dtype=numpy.int32)
+
+		for dataset in datasets_info:
+			label = self.__encode_label(dataset['label'])
+			labels[dataset['start']: dataset['end']] = label
+
+
+		return images, labels
+
+
+
+
+	def __encode_label(self, name):
+
+		""" Obtains the integer of an actor name, adding it if it is new
+
+		Arguments:
+		----------
+			name:
+				type: string
+				info: name of the actor
+
+		Returns:
+		----------
+			label:
+				type: int
+				info: integer of the actor in the ints <-> labels dict
+		"""
+
+		for key, value in self.properties['labels'].items():
+			if value == name:
+				return int(key)
+
+		# New actors take the integer following the highest one
+		label = max([int(k) for k in self.properties['labels']], default=-1) + 1
+		self.properties['labels'][str(label)] = name
+
+		return label
+
+
+
+
+	def __get_subspace(self):
+
+		""" Obtains the subspace matrices of the model, extracting them once
+
+		Returns:
+		----------
+			subspace:
+				type: dict / None
+				info: matrices of the model (None if it is not Eigen / Fisher)
+		"""
+
+		if not is_subspace_model(self.model):
+			return None
+
+		model, subspace = self.__subspace
+		if model is not self.model:
+			self.__subspace = (self.model, extract_subspace(self.model))
+
+		return self.__subspace[1]
+
+
+
+
+	def __name_label(self, label, conf, clf_th):
+
+		""" Translates an integer label into the actor name given a threshold
+
+		Arguments:
+		----------
+			label:
+				type: int
+				info: label predicted by the model
+
+			conf:
+				type: float
+				info: confidence returned by the model
+
+			clf_th:
+				type: float
+				info: confidence percentage threshold
+
+		Returns:
+		----------
+			label:
+				type: string
+				info: name of the actor
+		"""
+
+		# Models with a threshold return -1 when no sample is close enough
+		if conf >= clf_th and label != -1:
+			label = self.properties['labels'][str(label)]
+		else:
+			label = 'Unknown'
+
+		if self.verbose:
+			print(label, round(conf, 4))
+
+		return label
+
+
+
+
+	def identify(self, image, clf_th):
+
+		""" Predicts a label (name) and its confidence for a given face image
 
 		Arguments:
 		----------
@@ -123,22 +328,146 @@ class FaceClassifier(object):
 			label:
 				type: string
 				info: name of the actor
+
+			conf:
+				type: float
+				info: confidence returned by the model
 		"""
 
 		label, conf = self.model.predict(image)
+		label = self.__name_label(label, conf, clf_th)
+
+		return label, conf
+
+
+
+
+	def identify_batch(self, images, clf_th):
+
+		""" Predicts the labels (names) and confidences of a stack of images
+
+		Arguments:
+		----------
+			images:
+				type: list / numpy.array
+				info: normalized greyscale and sized images
+
+			clf_th:
+				type: float
+				info: confidence percentage threshold
+
+		Returns:
+		----------
+			results:
+				type: list
+				info: (label, confidence) tuples, one per image
+		"""
+
+		labels, confs = batch_predict(self.model, images, self.__get_subspace())
+
+		return [
+			(self.__name_label(label, conf, clf_th), float(conf))
+			for label, conf in zip(labels, confs)
+		]
 
-		if conf >= clf_th:
-			label = self.properties['labels'][str(label)]
-		else:
-			label = 'Unknown'
 
-		print(label, round(conf, 4))
+
+
+	def predict(self, image, clf_th):
+
+		""" Predicts a label (name) for a given face image
+
+		Arguments:
+		----------
+			frame:
+				type: numpy.array
+				info: normalized greyscale and sized image
+
+			clf_th:
+				type: float
+				info: confidence percentage threshold
+
+		Returns:
+		----------
+			label:
+				type: string
+				info: name of the actor
+		"""
+
+		label, _ = self.identify(image, clf_th)
 		return label
 
 
 
 
-	def train(self, datasets_info, validate = True):
+	def predict_batch(self, images, clf_th):
+
+		""" Predicts the labels (names) of a stack of face images
+
+		Eigen and Fisher models project and match the whole stack at once,
+		using the model matrices extracted the first time it is needed.
+
+		Arguments:
+		----------
+			images:
+				type: list / numpy.array
+				info: normalized greyscale and sized images
+
+			clf_th:
+				type: float
+				info: confidence percentage threshold
+
+		Returns:
+		----------
+			labels:
+				type: list
+				info: names of the actors
+		"""
+
+		return [label for label, _ in self.identify_batch(images, clf_th)]
+
+
+
+
+	def read_samples(self, datasets_info, images = None, readers = 4):
+
+		""" Obtains the images and integer labels of some datasets
+
+		Arguments:
+		----------
+			datasets_info:
+				type: list
+				info: dictionaries containing datasets labels and folder
+
+			images:
+				type: numpy memmap (optional)
+				info: packed images of the datasets (see 'read_pack')
+
+			readers:
+				type: int (optional)
+				info: number of threads decoding images (when not packed)
+
+		Returns:
+		----------
+			samples:
+				type: numpy array / numpy memmap
+				info: contains all the images
+
+			labels:
+				type: numpy array
+				info: contains all the integer-encoded labels
+		"""
+
+		if images is None:
+			return self.__prepare_samples(datasets_info, readers)
+		else:
+			return self.__prepare_pack(images, datasets_info)
+
+
+
+
+	def train(self, datasets_info, validate = True, folds = 10, workers = 1, seed = None,
+		images = None, readers = 4):
 
 		""" Trains the specified OpenCV Recognizer algorithm
 
@@ -151,15 +480,405 @@ class FaceClassifier(object):
 			validate
 				type: bool
 				info: indicates if the model should be validated
+
+			folds:
+				type: int (optional)
+				info: number of cross validation folds
+
+			workers:
+				type: int (optional)
+				info: number of processes validating folds at the same time
+
+			seed:
+				type: int (optional)
+				info: seed of the samples shuffle, to reproduce the fold scores
+
+			images:
+				type: numpy memmap (optional)
+				info: packed images of the datasets (see 'read_pack')
+
+			readers:
+				type: int (optional)
+				info: number of threads decoding images (when not packed)
 		"""
 
-		samples, labels = self.__prepare_samples(datasets_info)
-		self.model.train(samples, labels)
+		samples, labels = self.read_samples(datasets_info, images, readers)
+
+		# Packed images are given as views, so they are not copied
+		self.model.train(list(samples), labels)
+		self.__subspace = (None, None)
 
 		# Validation process
 		if validate:
-			crossValidation(
-				model=ALGORITHMS[self.properties['algorithm']],
+			_, self.validation = crossValidation(
+				model_factory=partial(
+					create_model,
+					self.properties['algorithm'],
+					**self.properties['params']
+				),
 				samples=samples,
-				labels=labels
+				labels=labels,
+				folds=folds,
+				workers=workers,
+				seed=seed
+			)
+
+
+
+
+	def build_index(self, cells = None, nprobe = 8):
+
+		""" Groups the histograms of a LBPH model into cells, to search only a few
+
+		Arguments:
+		----------
+			cells:
+				type: int (optional)
+				info: number of cells (None for 4 x sqrt(samples))
+
+			nprobe:
+				type: int (optional)
+				info: number of cells searched per face
+		"""
+
+		if not is_lbph_model(self.model):
+			exit('Only LBPH models can be indexed')
+
+		# Previous cells are discarded
+		gallery = extract_gallery(self.model)
+		for key in ('centroids', 'cells', 'nprobe'):
+			gallery.pop(key, None)
+
+		self.model = LBPHIndex(gallery, cells, nprobe)
+
+
+
+
+	def update(self, datasets_info, readers = 4):
+
+		""" Trains the model with new images, keeping the ones already learned
+
+		Eigen and Fisher OpenCV models cannot be updated, so they are first
+		converted into their NumPy equivalents (see 'UPDATE_CONVERSIONS').
+
+		Arguments:
+		----------
+			datasets_info:
+				type: list
+				info: dictionaries containing datasets labels and folder
+
+			readers:
+				type: int (optional)
+				info: number of threads decoding images at the same time
+		"""
+
+		algorithm = self.properties['algorithm']
+
+		if algorithm in UPDATE_CONVERSIONS:
+			numpy_algorithm = UPDATE_CONVERSIONS[algorithm]
+			self.model = import_subspace(
+				extract_subspace(self.model),
+				create_model(numpy_algorithm)
 			)
+			self.properties['algorithm'] = numpy_algorithm
+
+			print('The', algorithm, 'model was converted into', numpy_algorithm)
+
+		if not hasattr(self.model, 'update'):
+			exit('The ' + algorithm + ' algorithm does not support updates')
+
+		samples, labels = self.__prepare_samples(datasets_info, readers)
+
+		try:
+			self.model.update(list(samples), labels)
+		except ValueError as error:
+			exit(str(error))
+
+		self.__subspace = (None, None)
+
+
+
+
+def save_classifier(clf, model_name, model_format='npz'):
+
+	""" Stores a trained classifier inside the models folder
+
+	Arguments:
+	----------
+		clf:
+			type: FaceClassifier
+			info: classifier containing the trained model
+
+		model_name:
+			type: string
+			info: name of the output model
+
+		model_format:
+			type: string (optional)
+			info: format of the stored model {npz, xml}
+	"""
+
+	if model_format not in MODEL_FORMATS:
+		exit('Invalid model format')
+
+	# Models loaded from the binary format are not OpenCV objects anymore,
+	# unless their algorithm is already one of the NumPy recognizers
+	algorithm = clf.properties['algorithm']
+	factory = ALGORITHMS.get(algorithm)
+
+	imported = isinstance(clf.model, (SubspaceRecognizer, LBPHGallery))
+	native = isinstance(factory, type) and isinstance(clf.model, factory)
+
+	if model_format == 'xml' and imported and not native:
+		exit('The ' + algorithm + ' model can only be saved in the npz format')
+
+	validation_path = compute_path(model_name + '_validation.npz', 'model')
+
+	# Validation predictions, used to calibrate the threshold
+	if clf.validation is not None:
+		write_arrays(
+			arrays=clf.validation,
+			file_name=model_name + '_validation.npz',
+			file_type='model'
+		)
+
+	# The predictions of a previous model with the same name are not valid
+	elif os.path.exists(validation_path):
+		os.remove(validation_path)
+
+	# Binary format: properties and model arrays in a single file
+	if model_format == 'npz':
+		arrays = export_model(clf.model)
+		arrays['properties'] = numpy.array(json.dumps(clf.properties))
+
+		write_arrays(
+			arrays=arrays,
+			file_name=model_name + '.npz',
+			file_type='model'
+		)
+		return
+
+	# Saving FaceClassifier int <-> label dict as JSON
+	write_json(
+		dictionary=clf.properties,
+		file_name=model_name + '.json',
+		file_type='model'
+	)
+
+	# Saving FaceClassifier trained model as XML (pickle not working)
+	write_clf(
+		clf=clf.model,
+		file_name=model_name + '.xml',
+		file_type='model'
+	)
+
+
+
+
+def export_model(model):
+
+	""" Obtains the arrays defining a trained model, stored as float32
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: trained classifier model object
+
+	Returns:
+	----------
+		arrays:
+			type: dict
+			info: matrices and parameters of the model
+	"""
+
+	if is_subspace_model(model):
+		subspace = extract_subspace(model)
+
+		arrays = {
+			'mean': subspace['mean'].astype(numpy.float32),
+			'eigenvectors': subspace['eigenvectors'].astype(numpy.float32),
+			'projections': subspace['projections'].astype(numpy.float32),
+			'labels': subspace['labels'].astype(numpy.int32),
+			'threshold': subspace['threshold']
+		}
+
+		# Incrementally updated models also keep their scatter factor
+		if getattr(model, 'scatter', None) is not None:
+			arrays['scatter'] = model.scatter.astype(numpy.float32)
+
+		return arrays
+
+	if is_lbph_model(model):
+		return extract_gallery(model)
+
+	exit('The model can only be saved in the xml format')
+
+
+
+
+def is_exportable(model):
+
+	""" Checks if the arrays of a model can be exported (see 'export_model')
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: classifier model object
+
+	Returns:
+	----------
+		exportable:
+			type: bool
+			info: whether the model can be saved in the npz format
+	"""
+
+	return is_subspace_model(model) or is_lbph_model(model)
+
+
+
+
+def import_model(algorithm, arrays):
+
+	""" Builds a NumPy model predicting as the one whose arrays were exported
+
+	Arguments:
+	----------
+		algorithm:
+			type: string
+			info: name of the algorithm of the exported model
+
+		arrays:
+			type: dict
+			info: matrices and parameters of the model (see 'export_model')
+
+	Returns:
+	----------
+		model:
+			type: SubspaceRecognizer / LBPHGallery / LBPHIndex
+			info: trained classifier model object
+	"""
+
+	if 'eigenvectors' in arrays:
+		recognizer = create_model(UPDATE_CONVERSIONS.get(algorithm, algorithm))
+		return import_subspace(arrays, recognizer)
+
+	if 'centroids' in arrays:
+		return LBPHIndex(arrays)
+
+	return LBPHGallery(arrays)
+
+
+
+
+def register_algorithm(name, factory, params=()):
+
+	""" Registers an extra recognizer backend under an algorithm name
+
+	Arguments:
+	----------
+		name:
+			type: string
+			info: name of the algorithm
+
+		factory:
+			type: picklable callable
+			info: builds an untrained model with the OpenCV Recognizer methods
+				(train, predict, read and write)
+
+		params:
+			type: tuple (optional)
+			info: names of the constructor parameters the factory accepts
+	"""
+
+	ALGORITHMS[name] = factory
+	ALGORITHM_PARAMS[name] = tuple(params)
+
+
+
+
+def create_model(algorithm, **params):
+
+	""" Builds a new untrained OpenCV Recognizer
+
+	Arguments:
+	----------
+		algorithm:
+			type: string
+			info: name of the algorithm {Eigen, Fisher, LBPH, NumpyEigen, NumpyFisher} or a registered one
+
+		params:
+			type: dict (optional)
+			info: constructor parameters of the model (see 'ALGORITHM_PARAMS')
+
+	Returns:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: untrained classifier model object
+	"""
+
+	try:
+		factory = ALGORITHMS[algorithm]
+	except KeyError:
+		exit('Invalid algorithm name')
+
+	for param in params:
+		if param not in ALGORITHM_PARAMS[algorithm]:
+			exit('Invalid parameter ' + param + ' for the ' + algorithm + ' algorithm')
+
+	return factory(**params)
+
+
+
+
+def load_classifier(model_name):
+
+	""" Creates a classifier object and loads a trained model into it
+
+	Models in the binary format are preferred over the legacy JSON + XML.
+
+	Arguments:
+	----------
+		model_name:
+			type: string
+			info: name of the trained model inside the models folder
+
+	Returns:
+	----------
+		clf:
+			type: FaceClassifier
+			info: classifier containing the trained model
+	"""
+
+	if os.path.exists(compute_path(model_name + '.npz', 'model')):
+		arrays = read_arrays(
+			file_name=model_name + '.npz',
+			file_type='model'
+		)
+
+		clf_props = json.loads(str(arrays.pop('properties')))
+	else:
+		arrays = None
+		clf_props = read_json(
+			file_name=model_name + '.json',
+			file_type='model'
+		)
+
+	# Models saved before the parameters were stored use the defaults
+	clf_props.setdefault('params', {})
+
+	clf = FaceClassifier(clf_props['algorithm'], **clf_props['params'])
+	clf.properties = clf_props
+
+	if arrays is not None:
+		clf.model = import_model(clf_props['algorithm'], arrays)
+	else:
+		clf.model = read_clf(
+			clf=clf,
+			file_name=model_name + '.xml',
+			file_type='model'
+		)
+
+	return clf
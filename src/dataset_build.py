@@ -1,17 +1,26 @@
 # Created by Sinclert Pérez & Silvia Barbero
 
 
+import multiprocessing
 import os
+import queue
+import threading
+import time
 
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
+from dataset_index import DatasetIndex
+
 from dataset_miner import build_url
-from dataset_miner import get_page
-from dataset_miner import get_next_page
-from dataset_miner import get_images
+from dataset_miner import create_session
+
+from dataset_pipeline import StageStats
+from dataset_pipeline import detect_stage
+from dataset_pipeline import fetch_stage
+from dataset_pipeline import run_stage
 
-from image_process import check_faces
-from image_process import normalize_face
+from image_process import difference_hash
 
 from utils import compute_path
 
@@ -27,19 +36,24 @@ SEARCH_ENGINE = {
 
 
 
-def create_dataset(query, pics_num, search_engine=SEARCH_ENGINE):
+def create_dataset(query, pics_num, search_engine=SEARCH_ENGINE, downloads=8, per_host=4,
+	detectors=2, queue_size=64, cache=None):
 
 	""" Downloads, transforms and stores pictures given a query and an engine
 
+	The building is a pipeline of three stages connected by bounded
+	queues: a thread downloading pages and images, a pool of processes
+	detecting and normalizing faces, and this function storing them.
+
 	Arguments:
 	----------
 		query:
 			type: string
 			info: query that fill be plot into the search engine
 
-		num:
+		pics_num:
 			type: int
-			info: number of pictures to obtain
+			info: number of pictures the dataset must contain
 
 		search_engine:
 			type: dict (optional)
@@ -47,42 +61,221 @@ def create_dataset(query, pics_num, search_engine=SEARCH_ENGINE):
 				- domain (string)
 				- path (string)
 				- params (dict)
+
+		downloads:
+			type: int (optional)
+			info: number of images downloaded at the same time
+
+		per_host:
+			type: int (optional)
+			info: maximum number of images downloaded at the same time from a host
+
+		detectors:
+			type: int (optional)
+			info: number of processes detecting faces at the same time
+
+		queue_size:
+			type: int (optional)
+			info: maximum number of images waiting between two stages
+
+		cache:
+			type: ResponseCache (optional)
+			info: responses stored on disk, reused by the next builds
 	"""
 
-	# Unwrapping search engine properties
+	if detectors < 1:
+		exit('The number of detection processes must be greater than 0')
+
+	folder = query.replace(' ', '_')
+	index = DatasetIndex(folder)
+
+	if len(index.faces) >= pics_num:
+		print('The dataset', folder, 'is complete')
+		return
+
+	if len(index.pages) > 0 and index.next_page is None:
+		print('No more results for', query, '(' + str(len(index.faces)), 'pictures)')
+		return
+
+	# Unwrapping search engine properties (the first page is
+	# skipped if the building was interrupted before)
 	domain = search_engine['domain']
-	path = search_engine['path']
-	params = search_engine['params']
-	params['q'] = query
+	url = index.next_page or build_url(
+		domain,
+		search_engine['path'],
+		dict(search_engine['params'], q=query)
+	)
+
+	index.next_page = url
+
+	downloaded = queue.Queue(maxsize=queue_size)
+	detected = queue.Queue(maxsize=queue_size)
+	stop = threading.Event()
+	failures = []
+
+	stats = [StageStats('fetch'), StageStats('detect'), StageStats('write')]
+
+	# The processes are not forked from the threads of the other stages
+	executor = ProcessPoolExecutor(
+		max_workers=detectors,
+		mp_context=multiprocessing.get_context('spawn')
+	)
+
+	stages = [
+		threading.Thread(target=run_stage, args=(
+			fetch_stage, failures, url, domain, index, downloaded, stop, stats[0],
+			create_session(pool_size=downloads), downloads, per_host, cache
+		)),
+		threading.Thread(target=run_stage, args=(
+			detect_stage, failures, downloaded, detected, stop, stats[1],
+			executor, 2 * detectors
+		))
+	]
 
-	stored = 0
+	start = time.perf_counter()
+	for stage in stages:
+		stage.start()
 
-	# Until the number of pictures is not reached
-	while stored < pics_num:
-		if path:
-			url = build_url(domain, path, params)
-		page = get_page(url)
+	# The manifest is stored even if the process is interrupted
+	try:
+		write_stage(index, pics_num, detected, stats[2])
 
-		path = get_next_page(page, 'fl')
-		params = None
+		if len(index.faces) < pics_num and len(failures) == 0:
+			print('No more results for', query, '(' + str(len(index.faces)), 'pictures)')
 
-		# Each image is saved if a face is detected
-		for image in get_images(page, url):
+	finally:
+		stop.set()
+		index.save()
 
-			for face, _ in check_faces(image):
+		# The detection stage cancels its queued images before ending
+		for stage in stages:
+			stage.join()
+
+		executor.shutdown(wait=True)
+
+		for stage_stats in stats:
+			stage_stats.report(time.perf_counter() - start)
+
+	if len(failures) > 0:
+		raise failures[0]
+
+
+
+
+def write_stage(index, pics_num, source, stats):
+
+	""" Stores the new faces and keeps the manifest up to date
+
+	Arguments:
+	----------
+		index:
+			type: DatasetIndex
+			info: manifest of the dataset
+
+		pics_num:
+			type: int
+			info: number of pictures the dataset must contain
+
+		source:
+			type: Queue
+			info: queue of the detected faces (see 'detect_stage')
+
+		stats:
+			type: StageStats
+			info: statistics of the stage
+	"""
+
+	folder = index.folder
+	pages = {}
+	current = 0
+
+	# The new pictures never overwrite the ones already in the folder
+	picture = next_picture(folder)
+
+	while len(index.faces) < pics_num:
+		item = source.get()
+
+		if item is None:
+			break
+
+		if item[0] == 'page':
+			_, number, url, next_url, count = item
+			pages.setdefault(number, {'done': 0})
+			pages[number].update({'url': url, 'next_url': next_url, 'count': count})
+
+		else:
+			_, number, image_url, digest, faces = item
+			stats.record(source.qsize())
+
+			for face in faces or []:
+				face_hash = difference_hash(face)
+
+				# Resized or recompressed copies of a stored face are dropped
+				if index.is_duplicate(face_hash):
+					continue
 
-				# Normalizes and stores the image
-				face = Image.fromarray(normalize_face(face))
 				save_image(
-					image=face,
-					output_folder=query.replace(' ', '_'),
-					output_name=str(stored)
+					image=Image.fromarray(face),
+					output_folder=folder,
+					output_name=str(picture)
 				)
 
-				stored += 1
-				if stored == pics_num:
+				picture += 1
+
+				index.add_face(face_hash)
+				index.save()
+
+				if len(index.faces) == pics_num:
 					break
 
+			# The image is processed again if the building is resumed
+			else:
+				if faces is not None:
+					index.contents.add(digest)
+
+				# Inlined images are not remembered, as their url is their content
+				if not image_url.startswith('data:'):
+					index.urls.add(image_url)
+
+				pages.setdefault(number, {'done': 0})['done'] += 1
+
+		# Pages are completed in order, once all their images were processed
+		while current in pages and pages[current]['done'] == pages[current].get('count'):
+			index.pages.append(pages[current]['url'])
+			index.next_page = pages.pop(current)['next_url']
+			index.save()
+
+			current += 1
+
+
+
+
+def next_picture(folder):
+
+	""" Obtains the number following the greatest picture name of a dataset
+
+	Arguments:
+	----------
+		folder:
+			type: string
+			info: name of the dataset folder
+
+	Returns:
+	----------
+		number:
+			type: int
+			info: name of the next picture (0 if the folder is empty)
+	"""
+
+	folder_path = compute_path(folder, 'dataset')
+	if not os.path.isdir(folder_path):
+		return 0
+
+	names = [os.path.splitext(file)[0] for file in os.listdir(folder_path)]
+	numbers = [int(name) for name in names if name.isdigit()]
+
+	return max(numbers, default=-1) + 1
+
 
 
 
@@ -109,4 +302,7 @@ def save_image(image, output_folder, output_name):
 	os.makedirs(folder_path, exist_ok=True)
 
 	file_path = os.path.join(folder_path, output_name + '.png')
-	image.save(file_path)
+
+	# The image is renamed once written, so a kill never leaves it truncated
+	image.save(file_path + '.tmp', format='PNG')
+	os.replace(file_path + '.tmp', file_path)
@@ -0,0 +1,206 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import cv2
+import hashlib
+import numpy
+import os
+
+from image_process import difference_hash
+
+from utils import compute_path
+from utils import read_json
+from utils import write_json
+
+
+
+
+class DatasetIndex(object):
+
+
+	""" Represents the progress of a dataset building, to resume it
+
+	Attributes:
+	----------
+		folder:
+			type: string
+			info: name of the dataset folder
+
+		pages:
+			type: list
+			info: urls of the completely processed results pages
+
+		next_page:
+			type: string / None
+			info: url of the results page to process next
+
+		urls:
+			type: set
+			info: urls of the processed images
+
+		contents:
+			type: set
+			info: SHA-1 of the bytes of every downloaded picture
+
+		faces:
+			type: numpy array
+			info: difference hash of every stored face (see 'difference_hash')
+	"""
+
+
+
+
+	def __init__(self, folder):
+
+		""" Loads the manifest of a dataset, or starts one from its pictures
+
+		Arguments:
+		----------
+			folder:
+				type: string
+				info: name of the dataset folder
+		"""
+
+		self.folder = folder
+		self.pages = []
+		self.next_page = None
+		self.urls = set()
+		self.contents = set()
+		self.faces = numpy.array([], dtype=numpy.uint64)
+
+		if os.path.exists(compute_path(folder + '.json', 'index')):
+			index = read_json(folder + '.json', 'index')
+
+			self.pages = index.get('pages', [])
+			self.next_page = index.get('next_page')
+			self.urls = set(index.get('urls', []))
+			self.contents = set(index['contents'])
+			self.faces = numpy.array([int(h, 16) for h in index['faces']], dtype=numpy.uint64)
+
+		# Datasets built without a manifest keep their pictures
+		elif os.path.isdir(compute_path(folder, 'dataset')):
+			self.faces = numpy.array(stored_hashes(folder), dtype=numpy.uint64)
+
+
+
+
+	def is_duplicate(self, face_hash, max_distance=4):
+
+		""" Checks if a face is a near-duplicate of a stored one
+
+		Arguments:
+		----------
+			face_hash:
+				type: int
+				info: difference hash of the face
+
+			max_distance:
+				type: int (optional)
+				info: maximum number of different bits of two copies
+
+		Returns:
+		----------
+			duplicate:
+				type: bool
+				info: whether a stored face has an almost equal hash
+		"""
+
+		if len(self.faces) == 0:
+			return False
+
+		# Different bits of every stored hash, counted byte by byte
+		diff = numpy.bitwise_xor(self.faces, numpy.uint64(face_hash))
+		distances = numpy.unpackbits(diff.view(numpy.uint8)).reshape(len(diff), -1).sum(axis=1)
+
+		return bool(distances.min() <= max_distance)
+
+
+
+
+	def add_face(self, face_hash):
+
+		""" Adds the hash of a stored face
+
+		Arguments:
+		----------
+			face_hash:
+				type: int
+				info: difference hash of the face
+		"""
+
+		self.faces = numpy.append(self.faces, numpy.uint64(face_hash))
+
+
+
+
+	def save(self):
+
+		""" Stores the manifest inside the indexes folder """
+
+		write_json(
+			dictionary={
+				'stored': len(self.faces),
+				'pages': self.pages,
+				'next_page': self.next_page,
+				'urls': sorted(self.urls),
+				'contents': sorted(self.contents),
+				'faces': [format(int(h), '016x') for h in self.faces]
+			},
+			file_name=self.folder + '.json',
+			file_type='index'
+		)
+
+
+
+
+def content_hash(content):
+
+	""" Computes the SHA-1 of some bytes
+
+	Arguments:
+	----------
+		content:
+			type: bytes
+			info: content of a downloaded picture
+
+	Returns:
+	----------
+		hash:
+			type: string
+			info: hexadecimal digest
+	"""
+
+	return hashlib.sha1(content).hexdigest()
+
+
+
+
+def stored_hashes(folder):
+
+	""" Computes the difference hash of every picture of a dataset folder
+
+	Arguments:
+	----------
+		folder:
+			type: string
+			info: name of the dataset folder
+
+	Returns:
+	----------
+		hashes:
+			type: list
+			info: difference hash of each readable picture (see 'difference_hash')
+	"""
+
+	folder_path = compute_path(folder, 'dataset')
+	hashes = []
+
+	for file in sorted(os.listdir(folder_path)):
+		if file.endswith('.tmp'):
+			continue
+
+		face = cv2.imread(os.path.join(folder_path, file), cv2.IMREAD_GRAYSCALE)
+		if face is not None:
+			hashes.append(difference_hash(face))
+
+	return hashes
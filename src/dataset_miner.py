@@ -2,11 +2,16 @@
 
 
 import base64
-import io
 import requests
+import threading
 
 from bs4 import BeautifulSoup
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
 
 
 
@@ -49,7 +54,7 @@ def build_url(domain, path, parameters=None):
 
 
 
-def get_page(url):
+def get_page(url, session=None, timeout=10, cache=None):
 
 	""" Request a specific url content and returns its html
 
@@ -59,6 +64,18 @@ def get_page(url):
 			type: string
 			info: link to a specific web page
 
+		session:
+			type: requests Session (optional)
+			info: session whose connections are reused (see 'create_session')
+
+		timeout:
+			type: float (optional)
+			info: seconds to wait for the server before giving up
+
+		cache:
+			type: ResponseCache (optional)
+			info: responses stored on disk (see 'http_cache')
+
 	Returns:
 	----------
 		page:
@@ -66,8 +83,12 @@ def get_page(url):
 			info: html of the page in soup format
 	"""
 
-	response = requests.get(url)
-	page = BeautifulSoup(response.text, 'lxml')
+	if cache is None:
+		content = (session or requests).get(url, timeout=timeout).content
+	else:
+		content = cache.fetch(url, session or requests, timeout)
+
+	page = BeautifulSoup(content, 'lxml')
 
 	return page
 
@@ -104,41 +125,197 @@ def get_next_page(page, class_name):
 
 
 
-def get_images(page, url):
+def create_session(pool_size=16, retries=3):
+
+	""" Builds a session whose connections are pooled and retried
+
+	Arguments:
+	----------
+		pool_size:
+			type: int (optional)
+			info: maximum number of connections kept open per host
+
+		retries:
+			type: int (optional)
+			info: number of retries of a failed or throttled request
+
+	Returns:
+	----------
+		session:
+			type: requests Session
+			info: session to share between all the requests
+	"""
+
+	retry = Retry(
+		total=retries,
+		backoff_factor=0.5,
+		status_forcelist=(429, 500, 502, 503, 504)
+	)
+
+	adapter = HTTPAdapter(
+		pool_connections=pool_size,
+		pool_maxsize=pool_size,
+		max_retries=retry
+	)
+
+	session = requests.Session()
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+
+	return session
+
 
-	""" Yields each page image bytes as a PIL Image (Generator)
+
+
+def get_image_urls(page, url):
+
+	""" Obtains the absolute url of every image of a page
 
 	Arguments:
 	----------
 		page:
 			type: string (html format)
 			info: html of the page containing the images
+
 		url:
 			type: string
 			info: url of the page containing the images
 
+	Returns:
+	----------
+		urls:
+			type: list
+			info: links (or data URIs) of the images, in the page order and without repetitions
+	"""
+
+	urls = [urljoin(url, img['src']) for img in page.findAll('img') if img.get('src')]
+
+	# Repeated sources are downloaded once
+	return list(dict.fromkeys(urls))
+
+
+
+
+def fetch_images(urls, session=None, workers=8, per_host=4, timeout=10, cache=None):
+
+	""" Yields the bytes of several urls as their downloads finish (Generator)
+
+	Arguments:
+	----------
+		urls:
+			type: list
+			info: links (or data URIs) of the images
+
+		session:
+			type: requests Session (optional)
+			info: session whose connections are reused (see 'create_session')
+
+		workers:
+			type: int (optional)
+			info: number of downloads at the same time
+
+		per_host:
+			type: int (optional)
+			info: maximum number of downloads at the same time from a host
+
+		timeout:
+			type: float (optional)
+			info: seconds to wait for a server before giving up
+
+		cache:
+			type: ResponseCache (optional)
+			info: responses stored on disk (see 'http_cache')
+
 	Yields:
 	----------
-		img:
-			type: PIL Image
-			info: image from the given url
+		url:
+			type: string
+			info: link of the downloaded image
+
+		image_bytes:
+			type: bytes
+			info: content of the image
 	"""
 
-	images = page.findAll('img')
-	for img in images:
+	if session is None:
+		session = create_session(pool_size=workers)
 
+	# A semaphore per host, so no site receives too many requests
+	hosts = {urlparse(url).netloc for url in urls}
+	limits = {host: threading.BoundedSemaphore(per_host) for host in hosts}
+
+	executor = ThreadPoolExecutor(max_workers=workers)
+
+	futures = {
+		executor.submit(fetch_image, url, session, limits[urlparse(url).netloc], timeout, cache): url
+		for url in urls
+	}
+
+	# The pending downloads are cancelled if the images are no longer needed
+	try:
+		for future in as_completed(futures):
+			image_bytes = future.result()
+
+			if image_bytes is not None:
+				yield futures[future], image_bytes
+
+	finally:
+		for future in futures:
+			future.cancel()
+
+		executor.shutdown(wait=False)
+
+
+
+
+def fetch_image(url, session, limit, timeout, cache=None):
+
+	""" Downloads the bytes of an image, decoding them if they are inlined
+
+	Arguments:
+	----------
+		url:
+			type: string
+			info: link (or data URI) of the image
+
+		session:
+			type: requests Session
+			info: session whose connections are reused
+
+		limit:
+			type: threading Semaphore
+			info: downloads allowed at the same time from the url host
+
+		timeout:
+			type: float
+			info: seconds to wait for the server before giving up
+
+		cache:
+			type: ResponseCache (optional)
+			info: responses stored on disk (see 'http_cache')
+
+	Returns:
+	----------
+		image_bytes:
+			type: bytes / None
+			info: content of the image (None if it could not be downloaded)
+	"""
+
+	if url.startswith('data:'):
 		try:
-			if img.get('src'):
-				image_bytes = requests.get(img['src']).content
-			else:
-				continue
-		except Exception:
-			image_bytes = requests.get(url + img['src']).content
-
-		image = base64.b64encode(image_bytes)
-		image = base64.b64decode(image)
-		try:
-			image = Image.open(io.BytesIO(image))
-			yield image
-		except Exception:
-			continue
+			return base64.b64decode(url.split(',', 1)[1])
+		except (IndexError, ValueError):
+			return None
+
+	try:
+		with limit:
+			if cache is not None:
+				return cache.fetch(url, session, timeout)
+
+			response = session.get(url, timeout=timeout)
+			response.raise_for_status()
+
+		return response.content
+
+	except requests.RequestException:
+		return None
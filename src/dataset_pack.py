@@ -0,0 +1,266 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import numpy
+import os
+
+from numpy.lib.format import open_memmap
+
+from utils import compute_path
+from utils import read_images
+from utils import read_json
+from utils import write_json
+
+
+# Size of the normalized faces (see 'image_trans.resize')
+PACK_SHAPE = (100, 100)
+
+
+
+
+def pack_name(training_config):
+
+	""" Obtains the name of the pack of a training configuration
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+	Returns:
+	----------
+		name:
+			type: string
+			info: name of the pack files (without extension)
+	"""
+
+	return os.path.splitext(training_config)[0]
+
+
+
+
+def folder_fingerprint(folder_name):
+
+	""" Obtains the size and modification time of every image of a dataset
+
+	Arguments:
+	----------
+		folder_name:
+			type: string
+			info: name of the dataset folder
+
+	Returns:
+	----------
+		files:
+			type: dict
+			info: [size, modification time] of each file name
+	"""
+
+	folder_path = compute_path(folder_name, 'dataset')
+	files = {}
+
+	for entry in sorted(os.scandir(folder_path), key=lambda e: e.name):
+		stats = entry.stat()
+		files[entry.name] = [stats.st_size, stats.st_mtime_ns]
+
+	return files
+
+
+
+
+def read_pack(name):
+
+	""" Memory-maps a packed dataset without reading its images
+
+	Arguments:
+	----------
+		name:
+			type: string
+			info: name of the pack files (without extension)
+
+	Returns:
+	----------
+		images:
+			type: numpy memmap
+			info: read-only images of every dataset (images x height x width)
+
+		datasets:
+			type: list
+			info: dictionaries containing:
+				- label (string)
+				- folder (string)
+				- start (int)
+				- end (int)
+				- files (dict)
+	"""
+
+	datasets = read_json(name + '.json', 'pack')
+	images = numpy.load(compute_path(name + '.npy', 'pack'), mmap_mode='r')
+
+	return images, datasets
+
+
+
+
+def create_pack(training_config, readers=4):
+
+	""" Packs the datasets of a training configuration into a single array
+
+	Only the images added or modified since the previous pack are decoded,
+	the rest are copied from it. The pack is not written if nothing changed.
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		readers:
+			type: int (optional)
+			info: number of threads decoding images at the same time
+
+	Returns:
+	----------
+		images:
+			type: numpy memmap
+			info: read-only images of every dataset (see 'read_pack')
+
+		datasets:
+			type: list
+			info: datasets of the pack (see 'read_pack')
+	"""
+
+	name = pack_name(training_config)
+	pack_path = compute_path(name + '.npy', 'pack')
+	sidecar_path = compute_path(name + '.json', 'pack')
+
+	old_images, old_datasets = None, []
+	if os.path.exists(pack_path) and os.path.exists(sidecar_path):
+		old_images, old_datasets = read_pack(name)
+
+	# Position of every previously packed image, and the skipped ones
+	old_positions, old_skipped = {}, {}
+	for dataset in old_datasets:
+		for i, (file, stats) in enumerate(dataset['files'].items()):
+			old_positions[(dataset['folder'], file)] = (dataset['start'] + i, stats)
+		for file, stats in dataset.get('skipped', {}).items():
+			old_skipped[(dataset['folder'], file)] = stats
+
+	current = [
+		(dataset, folder_fingerprint(dataset['folder']))
+		for dataset in read_json(training_config, 'training_c')
+	]
+
+	if is_up_to_date(current, old_datasets):
+		print('The pack', name, 'is up to date')
+		return old_images, old_datasets
+
+	# Files neither packed nor skipped before are decoded all at once
+	new_files = [
+		(dataset['folder'], file)
+		for dataset, files in current
+		for file, stats in files.items()
+		if old_positions.get((dataset['folder'], file), (None, None))[1] != stats
+		and old_skipped.get((dataset['folder'], file)) != stats
+	]
+
+	decoded, valid = read_images(
+		[compute_path(os.path.join(*key), 'dataset') for key in new_files],
+		readers,
+		PACK_SHAPE
+	)
+
+	new_positions = {key: i for i, key in enumerate(new_files) if valid[i]}
+	datasets, total = [], 0
+
+	for dataset, files in current:
+		packed, skipped = {}, {}
+
+		for file, stats in files.items():
+			key = (dataset['folder'], file)
+
+			if key in new_positions or old_positions.get(key, (None, None))[1] == stats:
+				packed[file] = stats
+			else:
+				skipped[file] = stats
+
+		datasets.append({
+			'label': dataset['label'],
+			'folder': dataset['folder'],
+			'start': total,
+			'end': total + len(packed),
+			'files': packed,
+			'skipped': skipped
+		})
+
+		total += len(packed)
+
+	os.makedirs(os.path.dirname(pack_path), exist_ok=True)
+	temp_path = pack_path + '.tmp.npy'
+
+	images = open_memmap(temp_path, mode='w+', dtype=numpy.uint8, shape=(total,) + PACK_SHAPE)
+
+	for dataset in datasets:
+		for i, file in enumerate(dataset['files']):
+			key = (dataset['folder'], file)
+
+			if key in new_positions:
+				images[dataset['start'] + i] = decoded[new_positions[key]]
+			else:
+				images[dataset['start'] + i] = old_images[old_positions[key][0]]
+
+	images.flush()
+	del images, old_images
+
+	# The previous pack is only replaced once the new one is complete,
+	# and without its sidecar in between, so an interruption is not trusted
+	if os.path.exists(sidecar_path):
+		os.remove(sidecar_path)
+
+	os.replace(temp_path, pack_path)
+	write_json(datasets, name + '.json', 'pack')
+
+	print(
+		'Packed', total, 'images of', name,
+		'(' + str(len(new_positions)), 'decoded,',
+		sum(len(d['skipped']) for d in datasets), 'skipped)'
+	)
+
+	return read_pack(name)
+
+
+
+
+def is_up_to_date(current, old_datasets):
+
+	""" Checks if the datasets of a pack are the same as the current ones
+
+	Arguments:
+	----------
+		current:
+			type: list
+			info: (dataset, files) tuples of the training configuration
+
+		old_datasets:
+			type: list
+			info: datasets of the previous pack (see 'read_pack')
+
+	Returns:
+	----------
+		up_to_date:
+			type: bool
+			info: whether the pack has the same datasets, labels and files
+	"""
+
+	if len(current) != len(old_datasets):
+		return False
+
+	for (dataset, files), old in zip(current, old_datasets):
+		old_files = dict(old['files'], **old.get('skipped', {}))
+
+		if (dataset['label'], dataset['folder'], files) != \
+			(old['label'], old['folder'], old_files):
+			return False
+
+	return True
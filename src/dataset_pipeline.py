@@ -0,0 +1,366 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import io
+import queue
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
+from PIL import Image
+
+from dataset_index import content_hash
+
+from dataset_miner import build_url
+from dataset_miner import fetch_images
+from dataset_miner import get_image_urls
+from dataset_miner import get_next_page
+from dataset_miner import get_page
+
+from image_process import check_faces
+from image_process import normalize_face
+
+
+
+
+class StageStats(object):
+
+
+	""" Represents the work done by a stage of the dataset building pipeline
+
+	Attributes:
+	----------
+		name:
+			type: string
+			info: name of the stage
+
+		items:
+			type: int
+			info: number of images processed by the stage
+
+		depths:
+			type: list
+			info: sizes of the stage input queue, sampled at every image
+	"""
+
+
+
+
+	def __init__(self, name):
+
+		""" Initiates the statistics of a stage
+
+		Arguments:
+		----------
+			name:
+				type: string
+				info: name of the stage
+		"""
+
+		self.name = name
+		self.items = 0
+		self.depths = []
+
+
+
+
+	def record(self, depth=None):
+
+		""" Counts a processed image
+
+		Arguments:
+		----------
+			depth:
+				type: int (optional)
+				info: size of the stage input queue
+		"""
+
+		self.items += 1
+
+		if depth is not None:
+			self.depths.append(depth)
+
+
+
+
+	def report(self, elapsed):
+
+		""" Prints the throughput and queue depths of the stage
+
+		Arguments:
+		----------
+			elapsed:
+				type: float
+				info: seconds since the pipeline started
+		"""
+
+		depth = '-'
+		if len(self.depths) > 0:
+			depth = str(round(sum(self.depths) / len(self.depths), 1)) + ' / ' + str(max(self.depths))
+
+		print(
+			self.name, '->',
+			self.items, 'images,',
+			round(self.items / max(elapsed, 1e-9), 2), 'images/s,',
+			'input queue (mean / max):', depth
+		)
+
+
+
+
+def put_item(output, item, stop):
+
+	""" Puts an item in a bounded queue, unless the pipeline is stopped
+
+	Arguments:
+	----------
+		output:
+			type: Queue
+			info: queue of the next stage
+
+		item:
+			type: tuple / None
+			info: item to put (None to signal the end of the stage)
+
+		stop:
+			type: threading Event
+			info: set when the pipeline must stop
+
+	Returns:
+	----------
+		put:
+			type: bool
+			info: whether the item was put
+	"""
+
+	while not stop.is_set():
+		try:
+			output.put(item, timeout=0.1)
+			return True
+		except queue.Full:
+			continue
+
+	return False
+
+
+
+
+def run_stage(stage, failures, *args):
+
+	""" Runs a stage of the pipeline, keeping its error (thread)
+
+	Arguments:
+	----------
+		stage:
+			type: function
+			info: stage to run {fetch_stage, detect_stage}
+
+		failures:
+			type: list
+			info: errors of the stages, raised once the pipeline stops
+
+		args:
+			type: tuple
+			info: arguments of the stage
+	"""
+
+	try:
+		stage(*args)
+	except Exception as error:
+		failures.append(error)
+
+
+
+
+def fetch_stage(url, domain, index, output, stop, stats, session, downloads, per_host, cache):
+
+	""" Downloads the results pages and their images (thread)
+
+	Puts ('image', page number, url, SHA-1, bytes) items, with None
+	bytes for duplicated files, and a ('page', page number, url, next
+	url, images) item once every image of a page was put.
+
+	Arguments:
+	----------
+		url:
+			type: string
+			info: link of the first results page
+
+		domain:
+			type: string
+			info: search engine domain
+
+		index:
+			type: DatasetIndex
+			info: manifest of the dataset (only read)
+
+		output:
+			type: Queue
+			info: queue of the detection stage
+
+		stop:
+			type: threading Event
+			info: set when the pipeline must stop
+
+		stats:
+			type: StageStats
+			info: statistics of the stage
+
+		session:
+			type: requests Session
+			info: session whose connections are reused
+
+		downloads:
+			type: int
+			info: number of images downloaded at the same time
+
+		per_host:
+			type: int
+			info: maximum number of images downloaded at the same time from a host
+
+		cache:
+			type: ResponseCache / None
+			info: responses stored on disk
+	"""
+
+	number = 0
+	queued = set()
+
+	try:
+		while url is not None and not stop.is_set():
+			page = get_page(url, session, cache=cache)
+			urls = [u for u in get_image_urls(page, url) if u not in index.urls]
+
+			images = fetch_images(urls, session, downloads, per_host, cache=cache)
+			count = 0
+
+			for image_url, image_bytes in images:
+				digest = content_hash(image_bytes)
+
+				# Identical copies are not decoded
+				if digest in index.contents or digest in queued:
+					image_bytes = None
+				else:
+					queued.add(digest)
+
+				if not put_item(output, ('image', number, image_url, digest, image_bytes), stop):
+					break
+
+				stats.record()
+				count += 1
+
+			images.close()
+
+			path = get_next_page(page, 'fl')
+			next_url = None
+
+			if path is not None and build_url(domain, path) not in index.pages:
+				next_url = build_url(domain, path)
+
+			put_item(output, ('page', number, url, next_url, count), stop)
+
+			url = next_url
+			number += 1
+
+	finally:
+		put_item(output, None, stop)
+
+
+
+
+def detect_stage(source, output, stop, stats, executor, window):
+
+	""" Sends the downloaded images to the detection processes (thread)
+
+	Puts the image items with their normalized faces instead of their
+	bytes, as they complete, and passes the rest of items through.
+
+	Arguments:
+	----------
+		source:
+			type: Queue
+			info: queue of the downloaded images
+
+		output:
+			type: Queue
+			info: queue of the writer stage
+
+		stop:
+			type: threading Event
+			info: set when the pipeline must stop
+
+		stats:
+			type: StageStats
+			info: statistics of the stage
+
+		executor:
+			type: ProcessPoolExecutor
+			info: processes detecting the faces
+
+		window:
+			type: int
+			info: maximum number of images being detected at the same time
+	"""
+
+	pending = {}
+	finished = False
+
+	try:
+		while not (finished and len(pending) == 0) and not stop.is_set():
+
+			for future in [f for f in pending if f.done()]:
+				kind, number, image_url, digest, _ = pending.pop(future)
+				put_item(output, (kind, number, image_url, digest, future.result()), stop)
+				stats.record(source.qsize())
+
+			if finished or len(pending) >= window:
+				wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+				continue
+
+			try:
+				item = source.get(timeout=0.1)
+			except queue.Empty:
+				continue
+
+			if item is None:
+				finished = True
+
+			# Page ends and duplicated files have nothing to detect
+			elif item[0] == 'page' or item[4] is None:
+				put_item(output, item, stop)
+
+			else:
+				pending[executor.submit(detect_faces, item[4])] = item
+
+	# The images not being detected yet are dropped if the pipeline stops
+	finally:
+		for future in pending:
+			future.cancel()
+
+		put_item(output, None, stop)
+
+
+
+
+def detect_faces(image_bytes):
+
+	""" Decodes an image and obtains its normalized faces (process)
+
+	Arguments:
+	----------
+		image_bytes:
+			type: bytes
+			info: content of the image
+
+	Returns:
+	----------
+		faces:
+			type: list
+			info: normalized greyscale and sized faces
+	"""
+
+	try:
+		image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+		return [normalize_face(face) for face, _ in check_faces(image)]
+
+	except Exception:
+		return []
@@ -0,0 +1,719 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import collections
+import cv2
+import numpy
+
+from image_process import FACE_DETECTOR
+
+from image_trans import detect_face
+from image_trans import greyscale_array
+
+
+
+
+class FlowTracker(object):
+
+
+	""" Represents a face tracker based on sparse optical flow
+
+	Attributes:
+	----------
+		box:
+			type: tuple
+			info: X, Y, width and height of the tracked face
+
+		grey:
+			type: numpy array
+			info: greyscale version of the last processed frame
+
+		points:
+			type: numpy array
+			info: corner points being followed inside the box
+
+		min_points:
+			type: int
+			info: minimum number of points to consider the track reliable
+
+		min_ratio:
+			type: float
+			info: minimum ratio of points that must be followed between frames
+	"""
+
+
+
+
+	def __init__(self, min_points=8, min_ratio=0.6):
+
+		""" Initiates a tracker object with its confidence requirements
+
+		Arguments:
+		----------
+			min_points:
+				type: int (optional)
+				info: minimum number of points to consider the track reliable
+
+			min_ratio:
+				type: float (optional)
+				info: minimum ratio of points that must be followed between frames
+		"""
+
+		self.box = None
+		self.grey = None
+		self.points = None
+		self.min_points = min_points
+		self.min_ratio = min_ratio
+
+
+
+
+	def init(self, frame, box):
+
+		""" Selects the points to follow inside the given box
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame where the face was detected
+
+			box:
+				type: tuple
+				info: X, Y, width and height of the detected face
+
+		Returns:
+		----------
+			success:
+				type: bool
+				info: whether enough points were found to follow the face
+		"""
+
+		x, y, w, h = [int(v) for v in box]
+
+		self.box = box
+		self.grey = greyscale_array(frame, 'BGR')
+
+		mask = numpy.zeros_like(self.grey)
+		mask[y: (y+h), x: (x+w)] = 255
+
+		self.points = cv2.goodFeaturesToTrack(
+			image=self.grey,
+			maxCorners=50,
+			qualityLevel=0.01,
+			minDistance=3,
+			mask=mask
+		)
+
+		return self.points is not None and len(self.points) >= self.min_points
+
+
+
+
+	def update(self, frame):
+
+		""" Moves the box following the median displacement of its points
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame where the face should be followed
+
+		Returns:
+		----------
+			success:
+				type: bool
+				info: whether the face could be confidently followed
+
+			box:
+				type: tuple
+				info: X, Y, width and height of the followed face
+		"""
+
+		if self.points is None or len(self.points) < self.min_points:
+			return False, self.box
+
+		grey = greyscale_array(frame, 'BGR')
+		points, status, _ = cv2.calcOpticalFlowPyrLK(self.grey, grey, self.points, None)
+
+		followed = status.ravel() == 1
+		if followed.sum() < self.min_points or followed.mean() < self.min_ratio:
+			return False, self.box
+
+		shift = numpy.median(points[followed] - self.points[followed], axis=0).ravel()
+
+		x, y, w, h = self.box
+		self.box = (x + shift[0], y + shift[1], w, h)
+		self.grey = grey
+		self.points = points[followed].reshape(-1, 1, 2)
+
+		return True, self.box
+
+
+
+
+class RegionTracker(object):
+
+
+	""" Represents a face tracker re-detecting the face around its last box
+
+	Attributes:
+	----------
+		box:
+			type: tuple
+			info: X, Y, width and height of the tracked face
+
+		padding:
+			type: float
+			info: ratio of the box size added around it to search the face
+
+		size_margin:
+			type: float
+			info: ratio the face size may change between frames
+
+		face_detector:
+			type: CascadeClassifier object
+			info: face detector classifier
+	"""
+
+
+
+
+	def __init__(self, padding=0.5, size_margin=0.3, face_detector=FACE_DETECTOR):
+
+		""" Initiates a tracker object with its search region parameters
+
+		Arguments:
+		----------
+			padding:
+				type: float (optional)
+				info: ratio of the box size added around it to search the face
+
+			size_margin:
+				type: float (optional)
+				info: ratio the face size may change between frames
+
+			face_detector:
+				type: CascadeClassifier object (optional)
+				info: face detector classifier
+		"""
+
+		self.box = None
+		self.padding = padding
+		self.size_margin = size_margin
+		self.face_detector = face_detector
+
+
+
+
+	def init(self, frame, box):
+
+		""" Stores the box where the face was detected
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame where the face was detected
+
+			box:
+				type: tuple
+				info: X, Y, width and height of the detected face
+
+		Returns:
+		----------
+			success:
+				type: bool
+				info: always True
+		"""
+
+		self.box = box
+		return True
+
+
+
+
+	def update(self, frame):
+
+		""" Searches the face only inside a padded region around its last box
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame where the face should be found
+
+		Returns:
+		----------
+			success:
+				type: bool
+				info: whether the face was found inside the region
+
+			box:
+				type: tuple
+				info: X, Y, width and height of the found face
+		"""
+
+		x, y, w, h = [int(v) for v in self.box]
+		pad_w, pad_h = int(w * self.padding), int(h * self.padding)
+
+		frame_h, frame_w = frame.shape[:2]
+		x1, y1 = max(x - pad_w, 0), max(y - pad_h, 0)
+		x2, y2 = min(x + w + pad_w, frame_w), min(y + h + pad_h, frame_h)
+
+		region = greyscale_array(frame[y1:y2, x1:x2], 'BGR')
+
+		# Only faces of a similar size to the last one are searched
+		min_side = int(min(w, h) * (1 - self.size_margin))
+		max_side = int(max(w, h) * (1 + self.size_margin))
+
+		results = list(detect_face(
+			region,
+			self.face_detector,
+			scaleFactor=1.1,
+			minNeighbors=4,
+			minSize=(min_side, min_side),
+			maxSize=(max_side, max_side)
+		))
+
+		if len(results) == 0:
+			return False, self.box
+
+		last = box_to_coords(self.box)
+		found = [
+			{
+				'X_coord': c['X_coord'] + x1,
+				'Y_coord': c['Y_coord'] + y1,
+				'width': c['width'],
+				'height': c['height']
+			}
+			for c in results
+		]
+
+		coords = max(found, key=lambda c: iou(c, last))
+		self.box = coords_to_box(coords)
+
+		return True, self.box
+
+
+
+
+TRACKERS = {
+	'CSRT': cv2.TrackerCSRT_create,
+	'Flow': FlowTracker,
+	'KCF': cv2.TrackerKCF_create,
+	'MOSSE': cv2.TrackerMOSSE_create,
+	'ROI': RegionTracker,
+}
+
+
+
+
+class FaceTrack(object):
+
+
+	""" Represents a face followed along consecutive frames
+
+	Attributes:
+	----------
+		coords:
+			type: dict
+			info: contains the following keys:
+				- X_coord:  int
+				- Y_coord:  int
+				- width:    int
+				- height:   int
+
+		tracker:
+			type: OpenCV Tracker / FlowTracker
+			info: object following the face between detections
+	"""
+
+
+
+
+	def __init__(self, frame, coords, tracker_name):
+
+		""" Initiates a track object from a detected face
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame where the face was detected
+
+			coords:
+				type: dict
+				info: X, Y, width and height of the detected face
+
+			tracker_name:
+				type: string
+				info: name of the tracker {CSRT, Flow, KCF, MOSSE, ROI}
+		"""
+
+		self.coords = coords
+		self.tracker = TRACKERS[tracker_name]()
+		self.tracker.init(frame, coords_to_box(coords))
+
+
+
+
+	def update(self, frame):
+
+		""" Follows the face into a new frame
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame where the face should be followed
+
+		Returns:
+		----------
+			success:
+				type: bool
+				info: whether the face could be confidently followed
+		"""
+
+		success, box = self.tracker.update(frame)
+		if not success:
+			return False
+
+		frame_h, frame_w = frame.shape[:2]
+		coords = clip_coords(box_to_coords(box), frame_w, frame_h)
+
+		if coords is None:
+			return False
+
+		self.coords = coords
+		return True
+
+
+
+
+def box_to_coords(box):
+
+	""" Transforms an (X, Y, width, height) tuple into a coordinates dict
+
+	Arguments:
+	----------
+		box:
+			type: tuple
+			info: X, Y, width and height (may be floats)
+
+	Returns:
+	----------
+		coords:
+			type: dict
+			info: contains the keys X_coord, Y_coord, width and height
+	"""
+
+	x, y, w, h = [int(round(v)) for v in box]
+	return {'X_coord': x, 'Y_coord': y, 'width': w, 'height': h}
+
+
+
+
+def coords_to_box(coords):
+
+	""" Transforms a coordinates dict into an (X, Y, width, height) tuple
+
+	Arguments:
+	----------
+		coords:
+			type: dict
+			info: contains the keys X_coord, Y_coord, width and height
+
+	Returns:
+	----------
+		box:
+			type: tuple
+			info: X, Y, width and height
+	"""
+
+	return (
+		int(coords['X_coord']),
+		int(coords['Y_coord']),
+		int(coords['width']),
+		int(coords['height'])
+	)
+
+
+
+
+def clip_coords(coords, frame_w, frame_h, min_size=10):
+
+	""" Clips some coordinates so that they lay inside the frame
+
+	Arguments:
+	----------
+		coords:
+			type: dict
+			info: contains the keys X_coord, Y_coord, width and height
+
+		frame_w:
+			type: int
+			info: width of the frame
+
+		frame_h:
+			type: int
+			info: height of the frame
+
+		min_size:
+			type: int (optional)
+			info: minimum width and height of the clipped box
+
+	Returns:
+	----------
+		coords:
+			type: dict / None
+			info: clipped coordinates (None if the box is too small)
+	"""
+
+	x, y, w, h = coords_to_box(coords)
+
+	x1, y1 = max(x, 0), max(y, 0)
+	x2, y2 = min(x + w, frame_w), min(y + h, frame_h)
+
+	if (x2 - x1) < min_size or (y2 - y1) < min_size:
+		return None
+
+	return {'X_coord': x1, 'Y_coord': y1, 'width': x2 - x1, 'height': y2 - y1}
+
+
+
+
+def iou(coords_a, coords_b):
+
+	""" Computes the intersection over union of two boxes
+
+	Arguments:
+	----------
+		coords_a:
+			type: dict
+			info: contains the keys X_coord, Y_coord, width and height
+
+		coords_b:
+			type: dict
+			info: contains the keys X_coord, Y_coord, width and height
+
+	Returns:
+	----------
+		iou:
+			type: float
+			info: overlapping ratio between 0 and 1
+	"""
+
+	ax, ay, aw, ah = coords_to_box(coords_a)
+	bx, by, bw, bh = coords_to_box(coords_b)
+
+	inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+	inter_h = min(ay + ah, by + bh) - max(ay, by)
+
+	if inter_w <= 0 or inter_h <= 0:
+		return 0.0
+
+	inter = inter_w * inter_h
+	return inter / (aw * ah + bw * bh - inter)
+
+
+
+
+def match_boxes(coords_a, coords_b, min_iou=0.3):
+
+	""" Greedily pairs the boxes of two lists by their intersection over union
+
+	Arguments:
+	----------
+		coords_a:
+			type: list
+			info: coordinates dicts of the first list
+
+		coords_b:
+			type: list
+			info: coordinates dicts of the second list
+
+		min_iou:
+			type: float (optional)
+			info: minimum overlapping ratio to pair two boxes
+
+	Returns:
+	----------
+		matches:
+			type: list
+			info: (index in A, index in B, iou) tuples
+	"""
+
+	candidates = [
+		(iou(a, b), i, j)
+		for i, a in enumerate(coords_a)
+		for j, b in enumerate(coords_b)
+	]
+
+	candidates.sort(reverse=True)
+	used_a, used_b, matches = set(), set(), []
+
+	for overlap, i, j in candidates:
+		if overlap < min_iou:
+			break
+		if i in used_a or j in used_b:
+			continue
+
+		used_a.add(i)
+		used_b.add(j)
+		matches.append((i, j, overlap))
+
+	return matches
+
+
+
+
+class IdentityTrack(object):
+
+
+	""" Represents the identity of a face along consecutive frames
+
+	Attributes:
+	----------
+		coords:
+			type: dict
+			info: X, Y, width and height of the face in the last frame
+
+		predicted_coords:
+			type: dict
+			info: X, Y, width and height of the face in the last prediction
+
+		since_predict:
+			type: int
+			info: number of frames since the last prediction
+
+		misses:
+			type: int
+			info: number of consecutive frames where the face was not found
+
+		votes:
+			type: collections.deque
+			info: latest (label, confidence) predictions of the face
+	"""
+
+
+
+
+	def __init__(self, coords, votes=15):
+
+		""" Initiates an identity track from the first box of a face
+
+		Arguments:
+		----------
+			coords:
+				type: dict
+				info: X, Y, width and height of the face
+
+			votes:
+				type: int (optional)
+				info: number of latest predictions taking part in the vote
+		"""
+
+		self.coords = coords
+		self.predicted_coords = None
+		self.since_predict = 0
+		self.misses = 0
+		self.votes = collections.deque(maxlen=votes)
+
+
+
+
+	def move(self, coords):
+
+		""" Updates the box of the face with the one found in a new frame
+
+		Arguments:
+		----------
+			coords:
+				type: dict
+				info: X, Y, width and height of the face
+		"""
+
+		self.coords = coords
+		self.since_predict += 1
+		self.misses = 0
+
+
+
+
+	def needs_predict(self, predict_every, min_iou=0.5):
+
+		""" Checks if the face identity must be predicted again
+
+		Arguments:
+		----------
+			predict_every:
+				type: int
+				info: maximum number of frames between two predictions
+
+			min_iou:
+				type: float (optional)
+				info: minimum overlap with the last predicted box
+
+		Returns:
+		----------
+			needed:
+				type: bool
+				info: whether the classifier must be run over the face
+		"""
+
+		return \
+			self.predicted_coords is None or \
+			self.since_predict >= predict_every or \
+			iou(self.coords, self.predicted_coords) < min_iou
+
+
+
+
+	def vote(self, label, conf):
+
+		""" Adds a new prediction of the face identity
+
+		Arguments:
+		----------
+			label:
+				type: string
+				info: predicted name of the actor
+
+			conf:
+				type: float
+				info: confidence returned by the model
+		"""
+
+		self.votes.append((label, conf))
+		self.predicted_coords = self.coords
+		self.since_predict = 0
+
+
+
+
+	def identity(self):
+
+		""" Obtains the most voted label and its mean confidence
+
+		Returns:
+		----------
+			label:
+				type: string
+				info: most voted name of the actor (latest one on ties)
+
+			conf:
+				type: float
+				info: mean confidence of the label predictions
+		"""
+
+		counts = collections.Counter(label for label, _ in self.votes)
+		best = max(counts.values())
+
+		for label, _ in reversed(self.votes):
+			if counts[label] == best:
+				break
+
+		confs = [c for l, c in self.votes if l == label]
+		return label, sum(confs) / len(confs)
@@ -0,0 +1,421 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+from face_tracking import FaceTrack
+from face_tracking import IdentityTrack
+from face_tracking import TRACKERS
+from face_tracking import match_boxes
+
+from image_process import check_faces
+from image_process import frame_difference
+from image_process import normalize_face
+from image_process import thumbnail
+
+from image_trans import cut_face
+from image_trans import greyscale_array
+
+
+# Options whose default values keep every frame independent from the rest
+STATELESS_OPTIONS = {
+	'detect_every': 1,
+	'predict_every': 1,
+	'static_th': None,
+}
+
+
+
+
+class FrameAnalyser(object):
+
+
+	""" Represents the face analysis of the consecutive frames of a video
+
+	Attributes:
+	----------
+		clf:
+			type: FaceClassifier object
+			info: trained classifier to identify faces
+
+		clf_th:
+			type: int / float
+			info: threshold to identify a face as 'Unknown'
+
+		detect_every:
+			type: int
+			info: number of frames between two full face detections
+
+		tracker:
+			type: string
+			info: name of the tracker following faces between detections
+
+		cut_th:
+			type: float
+			info: frames difference (0 - 255) considered a scene cut
+
+		detect_width:
+			type: int
+			info: width of the downscaled copy where faces are searched
+
+		predict_every:
+			type: int
+			info: maximum number of frames between two predictions of a face
+
+		static_th:
+			type: float
+			info: difference (0 - 255) with the last analysed frame to reuse it
+
+		tracks:
+			type: list
+			info: FaceTrack objects followed since the last detection
+
+		identities:
+			type: list
+			info: IdentityTrack objects of the faces in the latest frames
+
+		stats:
+			type: dict
+			info: number of frames, full detections, predictions and skipped frames
+	"""
+
+
+
+
+	def __init__(self, clf, clf_th, detect_every=1, tracker='KCF',
+		cut_th=30.0, detect_width=None, predict_every=1, static_th=None):
+
+		""" Initiates an analyser object with its detection strategy
+
+		Arguments:
+		----------
+			clf:
+				type: FaceClassifier object
+				info: trained classifier to identify faces
+
+			clf_th:
+				type: int / float
+				info: threshold to identify a face as 'Unknown'
+
+			detect_every:
+				type: int (optional)
+				info: number of frames between two full face detections
+
+			tracker:
+				type: string (optional)
+				info: name of the tracker {CSRT, Flow, KCF, MOSSE, ROI}
+
+			cut_th:
+				type: float (optional)
+				info: frames difference (0 - 255) considered a scene cut
+
+			detect_width:
+				type: int (optional)
+				info: width of the downscaled copy where faces are searched
+
+			predict_every:
+				type: int (optional)
+				info: maximum number of frames between two predictions of a face
+
+			static_th:
+				type: float (optional)
+				info: difference (0 - 255) with the last analysed frame to reuse it
+		"""
+
+		if detect_every < 1:
+			exit('The detection interval must be greater than 0')
+		if predict_every < 1:
+			exit('The prediction interval must be greater than 0')
+		if tracker not in TRACKERS:
+			exit('Invalid tracker name')
+
+		self.clf = clf
+		self.clf_th = clf_th
+		self.detect_every = detect_every
+		self.tracker = tracker
+		self.cut_th = cut_th
+		self.detect_width = detect_width
+		self.predict_every = predict_every
+		self.static_th = static_th
+
+		self.tracks = []
+		self.identities = []
+		self.stats = {'frames': 0, 'detections': 0, 'predictions': 0, 'skipped': 0}
+
+		self.__since_detection = 0
+		self.__thumb = None
+		self.__last_thumb = None
+		self.__last_detections = None
+
+
+
+
+	def __compare(self, frame):
+
+		""" Compares a tiny version of the frame with the previous frames
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame to compare
+
+		Returns:
+		----------
+			thumb:
+				type: numpy array
+				info: tiny greyscale version of the frame
+
+			cut:
+				type: bool
+				info: whether the frame is too different from the previous one
+
+			static:
+				type: bool
+				info: whether the frame is almost equal to the last analysed one
+		"""
+
+		thumb = thumbnail(frame)
+		cut = self.__thumb is None or frame_difference(self.__thumb, thumb) > self.cut_th
+		self.__thumb = thumb
+
+		static = \
+			self.static_th is not None and not cut and \
+			self.__last_detections is not None and \
+			frame_difference(self.__last_thumb, thumb) < self.static_th
+
+		return thumb, cut, static
+
+
+
+
+	def __detect(self, frame):
+
+		""" Performs a full face detection over the frame
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame to search for faces
+
+		Returns:
+		----------
+			faces:
+				type: list
+				info: (face, coords) tuples (see 'check_faces')
+		"""
+
+		faces = list(check_faces(frame, detect_width=self.detect_width))
+
+		if self.detect_every > 1:
+			self.tracks = [FaceTrack(frame, c, self.tracker) for _, c in faces]
+
+		self.stats['detections'] += 1
+		self.__since_detection = 0
+
+		return faces
+
+
+
+
+	def __track(self, frame):
+
+		""" Follows the faces of the last detection into the frame
+
+		Arguments:
+		----------
+			frame:
+				type: numpy array
+				info: BGR frame to follow the faces into
+
+		Returns:
+		----------
+			faces:
+				type: list / None
+				info: (face, coords) tuples (None if any face was lost)
+		"""
+
+		if not all(track.update(frame) for track in self.tracks):
+			return None
+
+		grey = greyscale_array(frame, 'BGR')
+		self.__since_detection += 1
+
+		return [(cut_face(grey, t.coords), t.coords) for t in self.tracks]
+
+
+
+
+	def __predict(self, faces):
+
+		""" Normalizes some faces and predicts their labels in a single batch
+
+		Arguments:
+		----------
+			faces:
+				type: list
+				info: cut face images in greyscale
+
+		Returns:
+		----------
+			results:
+				type: list
+				info: (label, confidence) tuples, one per face
+		"""
+
+		if len(faces) == 0:
+			return []
+
+		self.stats['predictions'] += len(faces)
+
+		faces = [normalize_face(face) for face in faces]
+		return self.clf.identify_batch(faces, self.clf_th)
+
+
+
+
+	def __identify(self, faces, max_misses=5):
+
+		""" Assigns the faces to identity tracks, predicting only when needed
+
+		Arguments:
+		----------
+			faces:
+				type: list
+				info: (face, coords) tuples (see 'check_faces')
+
+			max_misses:
+				type: int (optional)
+				info: frames a track is kept without its face being found
+
+		Returns:
+		----------
+			detections:
+				type: list
+				info: dictionaries containing:
+					- coords (dict)
+					- label (string)
+					- conf (float)
+		"""
+
+		coords = [c for _, c in faces]
+		matches = match_boxes([t.coords for t in self.identities], coords)
+		matched = {j: self.identities[i] for i, j, _ in matches}
+
+		identities = []
+
+		for j, (face, coords) in enumerate(faces):
+			track = matched.get(j)
+
+			if track is None:
+				track = IdentityTrack(coords)
+			else:
+				track.move(coords)
+
+			identities.append(track)
+
+		# Only the tracks due for a prediction are classified, all at once
+		due = [
+			(track, face)
+			for track, (face, _) in zip(identities, faces)
+			if track.needs_predict(self.predict_every)
+		]
+
+		results = self.__predict([face for _, face in due])
+		for (track, _), (label, conf) in zip(due, results):
+			track.vote(label, conf)
+
+		detections = []
+
+		for track in identities:
+			label, conf = track.identity()
+			detections.append({'coords': track.coords, 'label': label, 'conf': conf})
+
+		# Tracks whose face was not found survive a few frames
+		for track in self.identities:
+			if track not in matched.values():
+				track.misses += 1
+				if track.misses <= max_misses:
+					identities.append(track)
+
+		self.identities = identities
+		return detections
+
+
+
+
+	def analyse(self, frame):
+
+		""" Detects and identifies the faces of the next video frame
+
+		Arguments:
+		----------
+			frame:
+				type: numpy.array
+				info: array of frame pixels
+
+		Returns:
+		----------
+			detections:
+				type: list
+				info: dictionaries containing:
+					- coords (dict)
+					- label (string)
+					- conf (float)
+		"""
+
+		self.stats['frames'] += 1
+		faces, cut = None, False
+
+		if self.detect_every > 1 or self.static_th is not None:
+			thumb, cut, static = self.__compare(frame)
+
+			# Near duplicates reuse the last analysed frame detections
+			if static:
+				self.stats['skipped'] += 1
+				return self.__last_detections
+
+			self.__last_thumb = thumb
+
+		if self.detect_every > 1:
+			due = (self.__since_detection + 1) >= self.detect_every
+
+			if not (cut or due):
+				faces = self.__track(frame)
+
+		# Full detection: keyframes, scene cuts or lost faces
+		if faces is None:
+			faces = self.__detect(frame)
+
+		if self.predict_every > 1:
+			detections = self.__identify(faces)
+		else:
+			results = self.__predict([face for face, _ in faces])
+			detections = [
+				{'coords': coords, 'label': label, 'conf': conf}
+				for (_, coords), (label, conf) in zip(faces, results)
+			]
+
+		self.__last_detections = detections
+		return detections
+
+
+
+
+def is_stateful(options):
+
+	""" Checks if some analysis options make frames depend on the previous ones
+
+	Arguments:
+	----------
+		options:
+			type: dict
+			info: keyword arguments of the FrameAnalyser object
+
+	Returns:
+	----------
+		stateful:
+			type: bool
+			info: whether the frames must be analysed in order
+	"""
+
+	return any(options.get(k, v) != v for k, v in STATELESS_OPTIONS.items())
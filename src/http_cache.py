@@ -0,0 +1,339 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import hashlib
+import os
+import threading
+import time
+
+from utils import compute_path
+from utils import read_json
+from utils import write_json
+
+
+
+
+class ResponseCache(object):
+
+
+	""" Represents the bodies of previous HTTP responses stored on disk
+
+	Every body is stored in a file named after the SHA-256 of its url,
+	and listed in an index with its validators and times of use.
+
+	Attributes:
+	----------
+		name:
+			type: string
+			info: name of the cache folder
+
+		ttl:
+			type: float
+			info: seconds a response is used without revalidating it
+
+		max_size:
+			type: int
+			info: maximum number of bytes of all the stored bodies
+
+		entries:
+			type: dict
+			info: dictionaries containing, per url hash:
+				- url (string)
+				- etag (string)
+				- last_modified (string)
+				- stored (float)
+				- used (float)
+				- size (int)
+
+		stats:
+			type: dict
+			info: number of hits, revalidations and downloads
+
+		save_every:
+			type: int
+			info: number of stored bodies between two automatic saves of the index
+	"""
+
+
+
+
+	def __init__(self, name='http', ttl=7*24*3600, max_size=2**30, save_every=64):
+
+		""" Loads the index of the cache, dropping the bodies not listed
+
+		Arguments:
+		----------
+			name:
+				type: string (optional)
+				info: name of the cache folder
+
+			ttl:
+				type: float (optional)
+				info: seconds a response is used without revalidating it
+
+			max_size:
+				type: int (optional)
+				info: maximum number of bytes of all the stored bodies
+
+			save_every:
+				type: int (optional)
+				info: number of stored bodies between two automatic saves of the index
+		"""
+
+		self.name = name
+		self.ttl = ttl
+		self.max_size = max_size
+		self.entries = {}
+		self.stats = {'hits': 0, 'revalidated': 0, 'downloads': 0}
+		self.save_every = save_every
+
+		self.__lock = threading.Lock()
+		self.__unsaved = 0
+
+		index_path = self.__path('index.json')
+		cache_dir = os.path.dirname(index_path)
+
+		if os.path.exists(index_path):
+			self.entries = read_json(os.path.join(name, 'index.json'), 'cache')
+
+		# Bodies stored after the last saved index are not trusted
+		if os.path.isdir(cache_dir):
+			for file in os.listdir(cache_dir):
+				if file != 'index.json' and file not in self.entries:
+					os.remove(os.path.join(cache_dir, file))
+
+		self.entries = {
+			key: entry for key, entry in self.entries.items()
+			if os.path.exists(self.__path(key))
+		}
+
+
+
+
+	def __path(self, file):
+
+		""" Builds the path of a file of the cache folder
+
+		Arguments:
+		----------
+			file:
+				type: string
+				info: url hash or index file name
+
+		Returns:
+		----------
+			path:
+				type: string
+				info: absolute path of the file
+		"""
+
+		return compute_path(os.path.join(self.name, file), 'cache')
+
+
+
+
+	def fetch(self, url, session, timeout=10):
+
+		""" Obtains the body of a url, from disk if it is fresh or not modified
+
+		Arguments:
+		----------
+			url:
+				type: string
+				info: link to download
+
+			session:
+				type: requests Session
+				info: session whose connections are reused
+
+			timeout:
+				type: float (optional)
+				info: seconds to wait for the server before giving up
+
+		Returns:
+		----------
+			content:
+				type: bytes
+				info: body of the response (a requests exception is raised on errors)
+		"""
+
+		key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+		entry = self.entries.get(key)
+
+		if entry is not None and time.time() - entry['stored'] < self.ttl:
+			content = self.__read(key, entry)
+
+			if content is not None:
+				self.__count('hits')
+				return content
+
+		# Stale responses are only downloaded again if they changed
+		headers = {}
+		if entry is not None:
+			if entry['etag']:
+				headers['If-None-Match'] = entry['etag']
+			if entry['last_modified']:
+				headers['If-Modified-Since'] = entry['last_modified']
+
+		response = session.get(url, headers=headers, timeout=timeout)
+
+		if response.status_code == 304 and entry is not None:
+			content = self.__read(key, entry)
+
+			if content is not None:
+				entry['stored'] = time.time()
+				self.__count('revalidated')
+				return content
+
+			response = session.get(url, timeout=timeout)
+
+		response.raise_for_status()
+		self.__write(key, url, response)
+		self.__count('downloads')
+
+		return response.content
+
+
+
+
+	def __count(self, stat):
+
+		""" Increases one of the cache statistics
+
+		Arguments:
+		----------
+			stat:
+				type: string
+				info: name of the statistic {hits, revalidated, downloads}
+		"""
+
+		with self.__lock:
+			self.stats[stat] += 1
+
+
+
+
+	def __read(self, key, entry):
+
+		""" Reads a stored body, marking it as recently used
+
+		Arguments:
+		----------
+			key:
+				type: string
+				info: hash of the url
+
+			entry:
+				type: dict
+				info: index entry of the url
+
+		Returns:
+		----------
+			content:
+				type: bytes / None
+				info: stored body (None if it was evicted)
+		"""
+
+		try:
+			with open(self.__path(key), 'rb') as file:
+				content = file.read()
+
+		except IOError:
+			return None
+
+		entry['used'] = time.time()
+		return content
+
+
+
+
+	def __write(self, key, url, response):
+
+		""" Stores a body and its validators, evicting the least recently used
+
+		Arguments:
+		----------
+			key:
+				type: string
+				info: hash of the url
+
+			url:
+				type: string
+				info: downloaded link
+
+			response:
+				type: requests Response
+				info: successful response of the url
+		"""
+
+		content = response.content
+		if len(content) > self.max_size:
+			return
+
+		file_path = self.__path(key)
+		os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+		# Each thread writes its own temporary file
+		temp_path = file_path + '.' + str(threading.get_ident()) + '.tmp'
+		with open(temp_path, 'wb') as file:
+			file.write(content)
+
+		with self.__lock:
+			os.replace(temp_path, file_path)
+
+			now = time.time()
+			self.entries[key] = {
+				'url': url,
+				'etag': response.headers.get('ETag'),
+				'last_modified': response.headers.get('Last-Modified'),
+				'stored': now,
+				'used': now,
+				'size': len(content)
+			}
+
+			self.__evict()
+
+			# A killed process only loses the bodies stored since the last save
+			self.__unsaved += 1
+			if self.__unsaved >= self.save_every:
+				self.__save()
+
+
+
+
+	def __evict(self):
+
+		""" Removes the least recently used bodies until the cache fits its size """
+
+		total = sum(entry['size'] for entry in self.entries.values())
+
+		for key in sorted(self.entries, key=lambda k: self.entries[k]['used']):
+			if total <= self.max_size:
+				break
+
+			total -= self.entries.pop(key)['size']
+
+			try:
+				os.remove(self.__path(key))
+			except OSError:
+				pass
+
+
+
+
+	def save(self):
+
+		""" Stores the index of the cache """
+
+		with self.__lock:
+			self.__save()
+
+
+
+
+	def __save(self):
+
+		""" Stores the index of the cache, once the lock is held """
+
+		write_json(dict(self.entries), os.path.join(self.name, 'index.json'), 'cache')
+		self.__unsaved = 0
@@ -8,6 +8,7 @@ from image_trans import detect_face
 from image_trans import cut_face
 from image_trans import normalize_colors
 from image_trans import resize
+from image_trans import scale_coords
 
 
 FACE_DETECTOR = cv2.CascadeClassifier('../resources/face_models/frontal_face.xml')
@@ -15,7 +16,7 @@ FACE_DETECTOR = cv2.CascadeClassifier('../resources/face_models/frontal_face.xml
 
 
 
-def check_faces(image, face_detector=FACE_DETECTOR):
+def check_faces(image, face_detector=FACE_DETECTOR, detect_width=None):
 
 	""" Checks if an image has a face and cuts it if it does
 
@@ -29,6 +30,10 @@ def check_faces(image, face_detector=FACE_DETECTOR):
 			type: CascadeClassifier object
 			info: face detector classifier
 
+		detect_width:
+			type: int (optional)
+			info: width of the downscaled copy where faces are searched
+
 	Yields:
 	----------
 		face:
@@ -45,9 +50,24 @@ def check_faces(image, face_detector=FACE_DETECTOR):
 	"""
 
 	image = greyscale_array(image, 'BGR') # TODO: CHECK
-	results = detect_face(image, face_detector, scaleFactor=1.3, minNeighbors=4)
+	image_h, image_w = image.shape
+	scale = 1
+
+	# Faces are searched in a smaller copy, but cut from the original
+	if detect_width is not None and image_w > detect_width:
+		scale = image_w / detect_width
+		detect_image = cv2.resize(
+			src=image,
+			dsize=(detect_width, int(round(image_h / scale))),
+			interpolation=cv2.INTER_AREA
+		)
+	else:
+		detect_image = image
+
+	results = detect_face(detect_image, face_detector, scaleFactor=1.3, minNeighbors=4)
 
 	for coords in results:
+		coords = scale_coords(coords, scale)
 		face = cut_face(image, coords)
 		yield face, coords
 
@@ -162,3 +182,91 @@ def normalize_face(image):
 	image = resize(image)
 
 	return image
+
+
+
+
+def thumbnail(image, size=(32, 18)):
+
+	""" Builds a tiny greyscale version of an image to compare it cheaply
+
+	Arguments:
+	----------
+		image:
+			type: numpy array
+			info: BGR colored image
+
+		size:
+			type: tuple (optional)
+			info: X and Y number of pixels
+
+	Returns:
+	----------
+		image:
+			type: numpy array
+			info: tiny greyscale image
+	"""
+
+	image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+	image = greyscale_array(image, 'BGR')
+
+	return image
+
+
+
+
+def frame_difference(thumb_a, thumb_b):
+
+	""" Computes the mean absolute difference between two thumbnails
+
+	Arguments:
+	----------
+		thumb_a:
+			type: numpy array
+			info: tiny greyscale image
+
+		thumb_b:
+			type: numpy array
+			info: tiny greyscale image of the same size
+
+	Returns:
+	----------
+		difference:
+			type: float
+			info: mean absolute difference of the grey values (0 - 255)
+	"""
+
+	return float(cv2.absdiff(thumb_a, thumb_b).mean())
+
+
+
+
+def difference_hash(face, size=8):
+
+	""" Computes the perceptual difference hash (dHash) of a face
+
+	Each bit tells if a pixel of a tiny version of the face is brighter
+	than its right neighbour, so resized or recompressed copies of the
+	same picture get the same (or an almost equal) hash.
+
+	Arguments:
+	----------
+		face:
+			type: numpy array
+			info: normalized greyscale and sized image
+
+		size:
+			type: int (optional)
+			info: number of rows and columns compared (size x size bits)
+
+	Returns:
+	----------
+		hash:
+			type: int
+			info: bits of the comparisons
+	"""
+
+	tiny = cv2.resize(face, (size + 1, size), interpolation=cv2.INTER_AREA)
+	bits = (tiny[:, 1:] > tiny[:, :-1]).flatten()
+
+	return int(''.join('1' if bit else '0' for bit in bits), 2)
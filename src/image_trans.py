@@ -115,6 +115,35 @@ def cut_face(image, face_properties):
 
 
 
+def scale_coords(coords, scale):
+
+	""" Scales the coordinates of a detected face by a given factor
+
+	Arguments:
+	----------
+		coords:
+			type: dict
+			info: X, Y, width and height of the detected face
+
+		scale:
+			type: float
+			info: factor to multiply the coordinates by
+
+	Returns:
+	----------
+		coords:
+			type: dict
+			info: X, Y, width and height of the face in the new scale
+	"""
+
+	if scale == 1:
+		return coords
+
+	return {key: int(round(value * scale)) for key, value in coords.items()}
+
+
+
+
 def normalize_colors(image):
 
 	""" Normalize the histogram of grey values to use all of them
@@ -0,0 +1,728 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import cv2
+import numpy
+
+
+
+
+def is_lbph_model(model):
+
+	""" Checks if a model compares LBP histograms (LBPH)
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: trained classifier model object
+
+	Returns:
+	----------
+		lbph:
+			type: bool
+			info: whether the model exposes its training histograms
+	"""
+
+	return hasattr(model, 'getHistograms')
+
+
+
+
+def reject_far(labels, dists, threshold):
+
+	""" Labels as -1 the predictions not closer than a threshold, as OpenCV
+
+	Arguments:
+	----------
+		labels:
+			type: numpy array
+			info: label of the nearest training sample of each image
+
+		dists:
+			type: numpy array
+			info: distance to the nearest training sample of each image
+
+		threshold:
+			type: float
+			info: maximum distance to accept a prediction
+
+	Returns:
+	----------
+		labels:
+			type: numpy array
+			info: labels of the accepted predictions (-1 for the rest)
+
+		dists:
+			type: numpy array
+			info: distances of the accepted predictions (max float for the rest)
+	"""
+
+	rejected = dists >= threshold
+	labels[rejected] = -1
+	dists[rejected] = numpy.finfo(numpy.float64).max
+
+	return labels, dists
+
+
+
+
+def extract_gallery(model):
+
+	""" Extracts the histograms and parameters defining a trained LBPH model
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer / LBPHGallery
+			info: trained LBPH model object
+
+	Returns:
+	----------
+		gallery:
+			type: dict
+			info: contains the following keys:
+				- histograms:  numpy array (samples x bins)
+				- labels:      numpy array (samples)
+				- radius:      int
+				- neighbors:   int
+				- grid_x:      int
+				- grid_y:      int
+				- threshold:   float
+	"""
+
+	histograms = model.getHistograms()
+
+	# OpenCV returns a list of row matrices, NumPy models a single matrix
+	if not isinstance(histograms, numpy.ndarray):
+		histograms = numpy.vstack([h.reshape(1, -1) for h in histograms])
+
+	gallery = {
+		'histograms': histograms.astype(numpy.float32),
+		'labels': model.getLabels().ravel().astype(numpy.int32),
+		'radius': model.getRadius(),
+		'neighbors': model.getNeighbors(),
+		'grid_x': model.getGridX(),
+		'grid_y': model.getGridY(),
+		'threshold': float(model.getThreshold())
+	}
+
+	# Indexed galleries also keep their cells
+	if isinstance(model, LBPHIndex):
+		gallery['centroids'] = model.centroids
+		gallery['cells'] = model.cells
+		gallery['nprobe'] = model.nprobe
+
+	return gallery
+
+
+
+
+def chi_square(queries, histograms, chunk_cells=2**24):
+
+	""" Computes the alternative Chi-Square distances used by OpenCV LBPH
+
+	Arguments:
+	----------
+		queries:
+			type: numpy array
+			info: histograms to compare (queries x bins)
+
+		histograms:
+			type: numpy array
+			info: histograms to compare with (samples x bins)
+
+		chunk_cells:
+			type: int (optional)
+			info: maximum number of bins compared at once
+
+	Returns:
+	----------
+		dists:
+			type: numpy array
+			info: distance of every pair (queries x samples)
+	"""
+
+	dists = numpy.empty((len(queries), len(histograms)))
+	step = max(1, chunk_cells // max(histograms.shape[1], 1))
+
+	for i, query in enumerate(queries):
+		for start in range(0, len(histograms), step):
+			chunk = histograms[start: start+step]
+
+			sums = chunk + query
+			diffs = (chunk - query) ** 2
+
+			# Empty bins in both histograms do not add any distance
+			ratios = numpy.divide(diffs, sums, out=numpy.zeros_like(sums), where=sums > 0)
+			dists[i, start: start+step] = 2 * ratios.sum(axis=1)
+
+	return dists
+
+
+
+
+class LBPHGallery(object):
+
+
+	""" Represents LBPH training histograms compared with NumPy
+
+	The histograms of the images are computed by an OpenCV LBPH model with
+	the same parameters, so the distances are the same as the OpenCV ones.
+
+	Attributes:
+	----------
+		radius:
+			type: int
+			info: radius of the LBP operator
+
+		neighbors:
+			type: int
+			info: number of neighbors of the LBP operator
+
+		grid_x:
+			type: int
+			info: number of horizontal cells of the histograms
+
+		grid_y:
+			type: int
+			info: number of vertical cells of the histograms
+
+		threshold:
+			type: float
+			info: maximum distance to accept a prediction
+
+		histograms:
+			type: numpy array
+			info: training samples histograms (samples x bins)
+
+		labels:
+			type: numpy array
+			info: training samples labels
+	"""
+
+
+
+
+	def __init__(self, gallery):
+
+		""" Initiates a gallery with the histograms of a trained model
+
+		Arguments:
+		----------
+			gallery:
+				type: dict
+				info: histograms and parameters (see 'extract_gallery')
+		"""
+
+		self.radius = int(gallery['radius'])
+		self.neighbors = int(gallery['neighbors'])
+		self.grid_x = int(gallery['grid_x'])
+		self.grid_y = int(gallery['grid_y'])
+		self.threshold = float(gallery['threshold'])
+
+		self.histograms = gallery['histograms']
+		self.labels = gallery['labels']
+
+
+
+
+	def compute_histograms(self, images):
+
+		""" Computes the LBP histograms of some images
+
+		Arguments:
+		----------
+			images:
+				type: list / numpy array
+				info: normalized greyscale and sized images
+
+		Returns:
+		----------
+			histograms:
+				type: numpy array
+				info: one histogram per image (images x bins)
+		"""
+
+		model = cv2.face.LBPHFaceRecognizer_create(
+			radius=self.radius,
+			neighbors=self.neighbors,
+			grid_x=self.grid_x,
+			grid_y=self.grid_y
+		)
+
+		# Training stores the histogram of every image, whatever the labels
+		model.train(list(images), numpy.zeros(len(images), dtype=numpy.int32))
+		return extract_gallery(model)['histograms']
+
+
+
+
+	def train(self, samples, labels):
+
+		""" Replaces the training histograms with the ones of some images
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		self.histograms = self.compute_histograms(samples)
+		self.labels = numpy.asarray(labels).ravel().astype(numpy.int32)
+
+
+
+
+	def update(self, samples, labels):
+
+		""" Adds the histograms of some images to the training ones
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		labels = numpy.asarray(labels).ravel().astype(numpy.int32)
+
+		self.histograms = numpy.vstack([self.histograms, self.compute_histograms(samples)])
+		self.labels = numpy.concatenate([self.labels, labels])
+
+
+
+
+	def predict_batch(self, images):
+
+		""" Predicts the labels of a stack of images
+
+		Arguments:
+		----------
+			images:
+				type: list / numpy array
+				info: normalized greyscale and sized images
+
+		Returns:
+		----------
+			labels:
+				type: numpy array
+				info: label of the nearest training sample (-1 if too far)
+
+			dists:
+				type: numpy array
+				info: distance to the nearest training sample
+		"""
+
+		dists = chi_square(self.compute_histograms(images), self.histograms)
+		nearest = numpy.argmin(dists, axis=1)
+
+		labels = self.labels[nearest]
+		dists = dists[numpy.arange(len(nearest)), nearest]
+
+		return reject_far(labels, dists, self.threshold)
+
+
+
+
+	def predict(self, image):
+
+		""" Predicts the label of an image
+
+		Arguments:
+		----------
+			image:
+				type: numpy array
+				info: normalized greyscale and sized image
+
+		Returns:
+		----------
+			label:
+				type: int
+				info: label of the nearest training sample (-1 if too far)
+
+			dist:
+				type: float
+				info: distance to the nearest training sample
+		"""
+
+		labels, dists = self.predict_batch([image])
+		return int(labels[0]), float(dists[0])
+
+
+
+
+	def getGridX(self):
+
+		""" Returns the number of horizontal cells, as the OpenCV recognizers """
+
+		return self.grid_x
+
+
+
+
+	def getGridY(self):
+
+		""" Returns the number of vertical cells, as the OpenCV recognizers """
+
+		return self.grid_y
+
+
+
+
+	def getHistograms(self):
+
+		""" Returns the training samples histograms, as the OpenCV recognizers """
+
+		return self.histograms
+
+
+
+
+	def getLabels(self):
+
+		""" Returns the training samples labels, as the OpenCV recognizers """
+
+		return self.labels
+
+
+
+
+	def getNeighbors(self):
+
+		""" Returns the number of LBP neighbors, as the OpenCV recognizers """
+
+		return self.neighbors
+
+
+
+
+	def getRadius(self):
+
+		""" Returns the radius of the LBP operator, as the OpenCV recognizers """
+
+		return self.radius
+
+
+
+
+	def getThreshold(self):
+
+		""" Returns the maximum prediction distance, as the OpenCV recognizers """
+
+		return self.threshold
+
+
+
+
+
+class LBPHIndex(LBPHGallery):
+
+
+	""" Represents LBPH training histograms grouped into cells (inverted file)
+
+	The histograms are clustered with k-means over their square roots, so
+	the Euclidean distance approximates the Chi-Square one. A query is only
+	compared exactly with the histograms of its 'nprobe' nearest cells.
+
+	Attributes:
+	----------
+		nprobe:
+			type: int
+			info: number of cells searched per query
+
+		centroids:
+			type: numpy array
+			info: centre of each cell (cells x bins)
+
+		cells:
+			type: numpy array
+			info: cell of each training histogram
+	"""
+
+
+
+
+	def __init__(self, gallery, cells=None, nprobe=8, seed=0):
+
+		""" Initiates an index, clustering the histograms if it is not built
+
+		Arguments:
+		----------
+			gallery:
+				type: dict
+				info: histograms and parameters (see 'extract_gallery')
+
+			cells:
+				type: int (optional)
+				info: number of cells (None for 4 x sqrt(samples))
+
+			nprobe:
+				type: int (optional)
+				info: number of cells searched per query
+
+			seed:
+				type: int (optional)
+				info: seed of the k-means initialization
+		"""
+
+		super().__init__(gallery)
+
+		if 'centroids' in gallery:
+			self.nprobe = int(gallery['nprobe'])
+			self.centroids = gallery['centroids']
+			self.cells = gallery['cells']
+			self.__group_cells()
+
+		else:
+			if cells is None:
+				cells = int(4 * numpy.sqrt(len(self.histograms)))
+
+			self.nprobe = nprobe
+			self.build(cells, seed)
+
+
+
+
+	def build(self, cells, seed=0):
+
+		""" Clusters the training histograms into cells
+
+		Arguments:
+		----------
+			cells:
+				type: int
+				info: number of cells
+
+			seed:
+				type: int (optional)
+				info: seed of the k-means initialization
+		"""
+
+		points = numpy.sqrt(self.histograms)
+		cells = min(max(cells, 1), len(points))
+
+		self.centroids = kmeans(points, cells, seed=seed)
+		self.cells = nearest_centroids(points, self.centroids, 1)[:, 0]
+		self.__group_cells()
+
+
+
+
+	def __group_cells(self):
+
+		""" Groups the positions of the training histograms by cell, dropping the empty ones """
+
+		# Duplicated histograms leave some k-means centroids without members
+		filled = numpy.bincount(self.cells, minlength=len(self.centroids)) > 0
+
+		if not filled.all():
+			self.centroids = self.centroids[filled]
+			self.cells = (numpy.cumsum(filled) - 1)[self.cells]
+
+		order = numpy.argsort(self.cells, kind='stable')
+		bounds = numpy.searchsorted(self.cells[order], numpy.arange(len(self.centroids) + 1))
+
+		self.__members = [order[bounds[i]: bounds[i+1]] for i in range(len(self.centroids))]
+
+
+
+
+	def train(self, samples, labels):
+
+		""" Replaces the training histograms, clustering them again
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		super().train(samples, labels)
+		self.build(len(self.centroids))
+
+
+
+
+	def update(self, samples, labels):
+
+		""" Adds the histograms of some images to their nearest cells
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		start = len(self.histograms)
+		super().update(samples, labels)
+
+		cells = nearest_centroids(numpy.sqrt(self.histograms[start:]), self.centroids, 1)[:, 0]
+		self.cells = numpy.concatenate([self.cells, cells])
+		self.__group_cells()
+
+
+
+
+	def predict_batch(self, images):
+
+		""" Predicts the labels of a stack of images, searching a few cells
+
+		Arguments:
+		----------
+			images:
+				type: list / numpy array
+				info: normalized greyscale and sized images
+
+		Returns:
+		----------
+			labels:
+				type: numpy array
+				info: label of the nearest searched sample (-1 if too far)
+
+			dists:
+				type: numpy array
+				info: distance to the nearest searched sample
+		"""
+
+		queries = self.compute_histograms(images)
+		probes = nearest_centroids(numpy.sqrt(queries), self.centroids, self.nprobe)
+
+		labels = numpy.empty(len(queries), dtype=numpy.int32)
+		dists = numpy.empty(len(queries))
+
+		for i, (query, cells) in enumerate(zip(queries, probes)):
+			candidates = numpy.concatenate([self.__members[c] for c in cells])
+
+			candidate_dists = chi_square(query[None, :], self.histograms[candidates])[0]
+			nearest = numpy.argmin(candidate_dists)
+
+			labels[i] = self.labels[candidates[nearest]]
+			dists[i] = candidate_dists[nearest]
+
+		return reject_far(labels, dists, self.threshold)
+
+
+
+
+def nearest_centroids(points, centroids, k, chunk_cells=2**24):
+
+	""" Finds the k nearest centroids of each point (Euclidean distance)
+
+	Arguments:
+	----------
+		points:
+			type: numpy array
+			info: points to assign (points x dimensions)
+
+		centroids:
+			type: numpy array
+			info: centroids to compare with (centroids x dimensions)
+
+		k:
+			type: int
+			info: number of centroids per point
+
+		chunk_cells:
+			type: int (optional)
+			info: maximum number of distances computed at once
+
+	Returns:
+	----------
+		nearest:
+			type: numpy array
+			info: positions of the nearest centroids, closest first (points x k)
+	"""
+
+	k = min(k, len(centroids))
+	norms = numpy.sum(centroids ** 2, axis=1)[None, :]
+
+	step = max(1, chunk_cells // max(len(centroids), 1))
+	nearest = numpy.empty((len(points), k), dtype=numpy.int64)
+
+	for start in range(0, len(points), step):
+		chunk = points[start: start+step]
+		dists = norms - 2 * chunk.dot(centroids.T)
+
+		chunk_nearest = numpy.argpartition(dists, k-1, axis=1)[:, :k]
+		chunk_dists = numpy.take_along_axis(dists, chunk_nearest, axis=1)
+		order = numpy.argsort(chunk_dists, axis=1)
+
+		nearest[start: start+step] = numpy.take_along_axis(chunk_nearest, order, axis=1)
+
+	return nearest
+
+
+
+
+def kmeans(points, clusters, iterations=10, max_points=20000, seed=0):
+
+	""" Computes the centroids of some points with the k-means algorithm
+
+	Arguments:
+	----------
+		points:
+			type: numpy array
+			info: points to cluster (points x dimensions)
+
+		clusters:
+			type: int
+			info: number of centroids
+
+		iterations:
+			type: int (optional)
+			info: number of assignment and update steps
+
+		max_points:
+			type: int (optional)
+			info: maximum number of points (randomly chosen) to cluster
+
+		seed:
+			type: int (optional)
+			info: seed of the points sample and the initial centroids
+
+	Returns:
+	----------
+		centroids:
+			type: numpy array
+			info: centre of each cluster (clusters x dimensions)
+	"""
+
+	random = numpy.random.RandomState(seed)
+
+	if len(points) > max_points:
+		points = points[random.choice(len(points), max_points, replace=False)]
+
+	centroids = points[random.choice(len(points), clusters, replace=False)].copy()
+
+	for _ in range(iterations):
+		assigned = nearest_centroids(points, centroids, 1)[:, 0]
+
+		sums = numpy.zeros_like(centroids)
+		numpy.add.at(sums, assigned, points)
+		counts = numpy.bincount(assigned, minlength=clusters)
+
+		# Empty clusters keep their previous centroid
+		filled = counts > 0
+		centroids[filled] = sums[filled] / counts[filled, None]
+
+	return centroids
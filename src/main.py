@@ -1,32 +1,62 @@
 # Created by Sinclert Pérez & Silvia Barbero
 
 
+import os
+
 from argparse import ArgumentParser as Parser
 from argparse import RawDescriptionHelpFormatter
 
+from calibration import suggest_threshold
+from calibration import threshold_curves
+from calibration import write_curves
+
 from clf_train import FaceClassifier
+from clf_train import MODEL_FORMATS
+from clf_train import is_exportable
+from clf_train import load_classifier
+from clf_train import save_classifier
 
 from dataset_build import create_dataset
 
+from dataset_pack import create_pack
+
+from face_tracking import TRACKERS
+
+from http_cache import ResponseCache
+
+from model_tuning import print_report
+from model_tuning import read_grid
+from model_tuning import tune_models
+
+from records import RECORD_FORMATS
+
+from utils import compute_path
+from utils import read_arrays
 from utils import read_json
 from utils import write_json
-from utils import read_clf
-from utils import write_clf
 
 from video_process import identify_actors
+from video_process import stream_actors
 
 
 # Default CLI modes
 modes = (
 	'analyse_video',
 	'build_datasets',
-	'train_model'
+	'calibrate_model',
+	'index_model',
+	'pack_datasets',
+	'stream_video',
+	'train_model',
+	'tune_model',
+	'update_model'
 )
 
 
 
 
-def analyse_video(video_path, model_name, clf_th, output):
+def analyse_video(video_path, model_name, clf_th, output, workers=1, segments=1,
+	video_output=True, records=None, **options):
 
 	""" Identifies actors in a video and generates one with their names
 
@@ -47,29 +77,46 @@ def analyse_video(video_path, model_name, clf_th, output):
 		output:
 			type: string
 			info: name of the generated video
-	"""
 
-	clf_props = read_json(
-		file_name=model_name + '.json',
-		file_type='model'
-	)
+		workers:
+			type: int (optional)
+			info: number of processes analysing frames (1 = serial)
 
-	# Creating and loading the trained classifier
-	clf = FaceClassifier(clf_props['algorithm'])
-	clf.properties = clf_props
-	clf.model = read_clf(
-		clf=clf,
-		file_name=model_name + '.xml',
-		file_type='model'
-	)
+		segments:
+			type: int (optional)
+			info: number of frame ranges analysed independently (1 = none)
+
+		video_output:
+			type: bool (optional)
+			info: whether to generate the annotated video
+
+		records:
+			type: string (optional)
+			info: format of the detections records file {csv, jsonl}
+
+		options:
+			type: keyword arguments
+			info: options of the frames analysis (see 'FrameAnalyser')
+	"""
 
 	# Generating a similar video with the names on it
-	identify_actors(video_path, clf, clf_th, output)
+	identify_actors(
+		video_path,
+		model_name,
+		clf_th,
+		output,
+		workers,
+		segments,
+		video_output,
+		records,
+		**options
+	)
 
 
 
 
-def build_datasets(dataset_config):
+def build_datasets(dataset_config, downloads=8, per_host=4, detectors=2, queue_size=64,
+	cache_ttl=168, cache_size=1024):
 
 	""" Builds datasets of pictures given a configuration file
 
@@ -78,6 +125,30 @@ def build_datasets(dataset_config):
 		dataset_config:
 			type: string
 			info: name of the JSON with the dataset configuration
+
+		downloads:
+			type: int (optional)
+			info: number of images downloaded at the same time
+
+		per_host:
+			type: int (optional)
+			info: maximum number of images downloaded at the same time from a host
+
+		detectors:
+			type: int (optional)
+			info: number of processes detecting faces at the same time
+
+		queue_size:
+			type: int (optional)
+			info: maximum number of images waiting between two building stages
+
+		cache_ttl:
+			type: float (optional)
+			info: hours a cached response is used without revalidating it
+
+		cache_size:
+			type: float (optional)
+			info: maximum megabytes of the cached responses (0 to disable the cache)
 	"""
 
 	datasets = read_json(
@@ -85,13 +156,166 @@ def build_datasets(dataset_config):
 		file_type='scraping_c'
 	)
 
-	for data in datasets:
-		create_dataset(data['actor_query'], data['pics_number'])
+	cache = None
+	if cache_size > 0:
+		cache = ResponseCache(ttl=cache_ttl * 3600, max_size=int(cache_size * 2**20))
+
+	try:
+		for data in datasets:
+			create_dataset(
+				query=data['actor_query'],
+				pics_num=data['pics_number'],
+				downloads=downloads,
+				per_host=per_host,
+				detectors=detectors,
+				queue_size=queue_size,
+				cache=cache
+			)
+
+			if cache is not None:
+				cache.save()
+
+	finally:
+		if cache is not None:
+			cache.save()
+			print('Cache:', cache.stats)
+
+
+
+
+def calibrate_model(model_name, output=None, min_precision=None):
+
+	""" Computes the metrics of every threshold from the validation predictions
+
+	Arguments:
+	----------
+		model_name:
+			type: string
+			info: name of the trained (and validated) model
+
+		output:
+			type: string (optional)
+			info: name of the curves CSV (None to use the model name)
+
+		min_precision:
+			type: float (optional)
+			info: minimum precision of the suggested threshold
+	"""
+
+	if not os.path.exists(compute_path(model_name + '_validation.npz', 'model')):
+		exit('The model ' + model_name + ' has no validation predictions')
+
+	predictions = read_arrays(model_name + '_validation.npz', 'model')
+	curves = threshold_curves(
+		true_labels=predictions['true'],
+		pred_labels=predictions['pred'],
+		dists=predictions['dist']
+	)
+
+	write_curves(curves, (output or model_name + '_calibration') + '.csv')
+	best = suggest_threshold(curves, min_precision)
 
+	print('Suggested threshold:', round(float(curves['threshold'][best]), 4))
+	print('Precision:', round(float(curves['precision'][best]), 4))
+	print('Recall:', round(float(curves['recall'][best]), 4))
+	print('Unknown rate:', round(float(curves['unknown_rate'][best]), 4))
 
 
 
-def train_model(algorithm, training_config, output):
+
+def index_model(model_name, cells=None, nprobe=8, output=None):
+
+	""" Groups the histograms of a LBPH model into cells, to predict faster
+
+	Arguments:
+	----------
+		model_name:
+			type: string
+			info: name of the trained model
+
+		cells:
+			type: int (optional)
+			info: number of cells (None for 4 x sqrt(samples))
+
+		nprobe:
+			type: int (optional)
+			info: number of cells searched per face
+
+		output:
+			type: string (optional)
+			info: name of the output model (None to overwrite the trained one)
+	"""
+
+	classifier = load_classifier(model_name)
+	classifier.build_index(cells, nprobe)
+
+	save_classifier(classifier, output or model_name, 'npz')
+
+
+
+
+def pack_datasets(training_config, readers=4):
+
+	""" Packs the datasets of a training configuration into a single array
+
+	Arguments:
+	----------
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		readers:
+			type: int (optional)
+			info: number of threads decoding images at the same time
+	"""
+
+	create_pack(training_config, readers)
+
+
+
+
+def stream_video(source, model_name, clf_th, latency, realtime, display, **options):
+
+	""" Identifies actors in a live source, emitting the faces as they appear
+
+	Arguments:
+	----------
+		source:
+			type: string
+			info: device index, pipe / URL or path of the source
+
+		model_name:
+			type: string
+			info: name of the trained model
+
+		clf_th:
+			type: float
+			info: confidence threshold to identify an actor
+
+		latency:
+			type: float
+			info: maximum milliseconds between a frame capture and its analysis
+
+		realtime:
+			type: bool
+			info: replays a video file at its real speed
+
+		display:
+			type: bool
+			info: shows the annotated frames instead of printing the detections
+
+		options:
+			type: keyword arguments
+			info: options of the frames analysis (see 'FrameAnalyser')
+	"""
+
+	stream_actors(source, model_name, clf_th, latency / 1000, realtime, display, **options)
+
+
+
+
+def train_model(algorithm, training_config, output, folds=10, workers=1, seed=None,
+	params=None, packed=False, readers=4, model_format='npz'):
 
 	""" Trains a OpenCV classifier and stores it in the models folder
 
@@ -99,7 +323,7 @@ def train_model(algorithm, training_config, output):
 	----------
 		algorithm:
 			type: string
-			info: name of the classifier {Eigen, Fisher, LBPH}
+			info: name of the classifier {Eigen, Fisher, LBPH, NumpyEigen, NumpyFisher}
 
 		training_config:
 			type: string
@@ -108,6 +332,154 @@ def train_model(algorithm, training_config, output):
 		output:
 			type: string
 			info: name of the output model
+
+		folds:
+			type: int (optional)
+			info: number of cross validation folds
+
+		workers:
+			type: int (optional)
+			info: number of processes validating folds at the same time
+
+		seed:
+			type: int (optional)
+			info: seed of the cross validation shuffle
+
+		params:
+			type: dict (optional)
+			info: constructor parameters of the model (see 'model_params')
+
+		packed:
+			type: bool (optional)
+			info: whether to train from the (updated) datasets pack
+
+		readers:
+			type: int (optional)
+			info: number of threads decoding images at the same time
+
+		model_format:
+			type: string (optional)
+			info: format of the output model {npz, xml}
+	"""
+
+	images = None
+
+	if packed:
+		images, datasets = create_pack(training_config, readers)
+	else:
+		datasets = read_json(
+			file_name=training_config,
+			file_type='training_c'
+		)
+
+	classifier = FaceClassifier(algorithm, **(params or {}))
+	model_format = check_format(classifier, model_format)
+
+	classifier.train(
+		datasets,
+		folds=folds,
+		workers=workers,
+		seed=seed,
+		images=images,
+		readers=readers
+	)
+
+	save_classifier(classifier, output, model_format)
+
+
+
+
+def tune_model(tuning_config, training_config, output=None, folds=5, workers=1, seed=0,
+	packed=False, readers=4):
+
+	""" Cross validates a grid of model configurations and ranks them
+
+	Arguments:
+	----------
+		tuning_config:
+			type: string
+			info: name of the JSON with the parameter grids
+
+		training_config:
+			type: string
+			info: name of the JSON with the training configuration
+
+		output:
+			type: string (optional)
+			info: name of the report (None to use the tuning config name)
+
+		folds:
+			type: int (optional)
+			info: number of cross validation folds
+
+		workers:
+			type: int (optional)
+			info: number of processes validating folds at the same time
+
+		seed:
+			type: int (optional)
+			info: seed of the shuffle, shared by every configuration
+
+		packed:
+			type: bool (optional)
+			info: whether to read the samples from the (updated) datasets pack
+
+		readers:
+			type: int (optional)
+			info: number of threads decoding images at the same time
+	"""
+
+	grid = read_grid(tuning_config)
+	images = None
+
+	if packed:
+		images, datasets = create_pack(training_config, readers)
+	else:
+		datasets = read_json(
+			file_name=training_config,
+			file_type='training_c'
+		)
+
+	# The samples are loaded once for the whole grid
+	classifier = FaceClassifier(grid[0][0])
+	samples, labels = classifier.read_samples(datasets, images, readers)
+
+	results = tune_models(grid, samples, labels, folds, workers, seed)
+	print_report(results)
+
+	if output is None:
+		output = os.path.splitext(tuning_config)[0]
+
+	write_json(results, output + '.json', 'report')
+
+
+
+
+def update_model(model_name, training_config, output=None, readers=4, model_format='npz'):
+
+	""" Trains an existing classifier with new datasets, without retraining it
+
+	Arguments:
+	----------
+		model_name:
+			type: string
+			info: name of the trained model
+
+		training_config:
+			type: string
+			info: name of the JSON with the new datasets configuration
+
+		output:
+			type: string (optional)
+			info: name of the output model (None to overwrite the trained one)
+
+		readers:
+			type: int (optional)
+			info: number of threads decoding images at the same time
+
+		model_format:
+			type: string (optional)
+			info: format of the output model {npz, xml}
 	"""
 
 	datasets = read_json(
@@ -115,22 +487,106 @@ def train_model(algorithm, training_config, output):
 		file_type='training_c'
 	)
 
-	classifier = FaceClassifier(algorithm)
-	classifier.train(datasets)
+	classifier = load_classifier(model_name)
+	model_format = check_format(classifier, model_format)
 
-	# Saving FaceClassifier int <-> label dict as JSON
-	write_json(
-		dictionary=classifier.properties,
-		file_name=output + '.json',
-		file_type='model'
-	)
+	classifier.update(datasets, readers)
 
-	# Saving FaceClassifier trained model as XML (pickle not working)
-	write_clf(
-		clf=classifier.model,
-		file_name=output + '.xml',
-		file_type='model'
-	)
+	save_classifier(classifier, output or model_name, model_format)
+
+
+
+
+def check_format(classifier, model_format):
+
+	""" Chooses the xml format for the models whose arrays cannot be exported
+
+	Arguments:
+	----------
+		classifier:
+			type: FaceClassifier
+			info: classifier to store once trained
+
+		model_format:
+			type: string
+			info: requested format of the output model {npz, xml}
+
+	Returns:
+	----------
+		model_format:
+			type: string
+			info: format the model can be stored in
+	"""
+
+	if model_format == 'npz' and not is_exportable(classifier.model):
+		print('The', classifier.properties['algorithm'], 'model cannot be saved in the npz format, using xml')
+		return 'xml'
+
+	return model_format
+
+
+
+
+def analysis_options(args):
+
+	""" Gathers the frames analysis options from the parsed CLI arguments
+
+	Arguments:
+	----------
+		args:
+			type: argparse Namespace
+			info: parsed arguments of a video mode
+
+	Returns:
+	----------
+		options:
+			type: dict
+			info: keyword arguments of the FrameAnalyser object
+	"""
+
+	if args.detect_width is not None and args.detect_width < 1:
+		exit('The detection width must be greater than 0')
+
+	return {
+		'detect_every': args.detect_every,
+		'tracker': args.tracker,
+		'cut_th': args.cut_th,
+		'detect_width': args.detect_width,
+		'predict_every': args.predict_every,
+		'static_th': args.static_th
+	}
+
+
+
+
+def model_params(args):
+
+	""" Gathers the model constructor parameters from the parsed CLI arguments
+
+	Arguments:
+	----------
+		args:
+			type: argparse Namespace
+			info: parsed arguments of a training mode
+
+	Returns:
+	----------
+		params:
+			type: dict
+			info: keyword arguments of the recognizer (only the specified ones)
+	"""
+
+	params = {
+		'num_components': args.components,
+		'pca_components': args.pca_components,
+		'radius': args.radius,
+		'neighbors': args.neighbors,
+		'grid_x': args.grid_x,
+		'grid_y': args.grid_y,
+		'threshold': args.threshold
+	}
+
+	return {k: v for k, v in params.items() if v is not None}
 
 
 
@@ -147,17 +603,112 @@ if __name__ == '__main__':
 			'			-m <model name>\n'
 			'			-c <classifier threshold>\n'
 			'			-o <output name>\n'
+			'			--workers <number of processes> (optional)\n'
+			'			--segments <number of video segments> (optional)\n'
+			'			--records <records format> (optional)\n'
+			'			--no-video (only generates the records)\n'
+			'			<analysis options> (optional)\n'
 			'  \n'
 			'  build_datasets: builds several datasets of actors faces\n'
 			'			-d <datasets config file>\n'
+			'			--downloads <concurrent downloads> (optional)\n'
+			'			--per-host <concurrent downloads per host> (optional)\n'
+			'			--detectors <face detection processes> (optional)\n'
+			'			--queue-size <images between stages> (optional)\n'
+			'			--cache-ttl <hours without revalidating> (optional)\n'
+			'			--cache-size <megabytes, 0 disables it> (optional)\n'
+			'  \n'
+			'  calibrate_model: sweeps the thresholds over the validation predictions\n'
+			'			-m <model name>\n'
+			'			-o <curves name> (optional)\n'
+			'			--min-precision <minimum precision> (optional)\n'
+			'  \n'
+			'  index_model: groups the LBPH model histograms into cells\n'
+			'			-m <model name>\n'
+			'			--cells <number of cells> (optional)\n'
+			'			--nprobe <cells searched per face> (optional)\n'
+			'			-o <output name> (optional)\n'
+			'  \n'
+			'  pack_datasets: packs the datasets of a training config into one array\n'
+			'			-d <training config file>\n'
+			'			--readers <decoding threads> (optional)\n'
+			'  \n'
+			'  stream_video: identifies the actors faces of a live source\n'
+			'			-v <device index, pipe or video path>\n'
+			'			-m <model name>\n'
+			'			-c <classifier threshold>\n'
+			'			--latency <milliseconds budget> (optional)\n'
+			'			--realtime (replays a video file at its speed)\n'
+			'			--display (shows the frames instead of printing)\n'
+			'			<analysis options> (optional)\n'
 			'  \n'
 			'  train_model: trains a OpenCV model\n'
 			'			-a <algorithm name>\n'
 			'			-d <training config file>\n'
-			'			-o <output name>\n',
+			'			-o <output name>\n'
+			'			--folds <cross validation folds> (optional)\n'
+			'			--workers <parallel folds> (optional)\n'
+			'			--seed <shuffle seed> (optional)\n'
+			'			--packed (trains from the datasets pack)\n'
+			'			--readers <decoding threads> (optional)\n'
+			'			--format <model format> (optional)\n'
+			'			<model parameters> (optional)\n'
+			'  \n'
+			'  tune_model: cross validates a grid of model parameters\n'
+			'			-t <tuning config file>\n'
+			'			-d <training config file>\n'
+			'			-o <report name> (optional)\n'
+			'			--folds <cross validation folds> (optional)\n'
+			'			--workers <parallel folds> (optional)\n'
+			'			--seed <shuffle seed> (optional)\n'
+			'			--packed (reads the datasets pack)\n'
+			'			--readers <decoding threads> (optional)\n'
+			'  \n'
+			'  update_model: trains an existing model with new datasets\n'
+			'			-m <model name>\n'
+			'			-d <new datasets config file>\n'
+			'			-o <output name> (optional)\n'
+			'			--readers <decoding threads> (optional)\n'
+			'			--format <model format> (optional)\n'
+			'  \n'
+			'  analysis options:\n'
+			'			--detect-every <frames between detections>\n'
+			'			--tracker <tracker name>\n'
+			'			--cut-th <frames difference of a scene cut>\n'
+			'			--detect-width <detection width>\n'
+			'			--predict-every <frames between predictions>\n'
+			'			--static-th <frames difference to reuse detections>\n'
+			'  \n'
+			'  model parameters:\n'
+			'			--components <Eigen / Fisher number of components>\n'
+			'			--pca-components <NumpyFisher components before the LDA>\n'
+			'			--radius <LBPH radius>\n'
+			'			--neighbors <LBPH neighbors>\n'
+			'			--grid-x <LBPH horizontal cells>\n'
+			'			--grid-y <LBPH vertical cells>\n'
+			'			--threshold <maximum prediction distance>\n',
 		formatter_class=RawDescriptionHelpFormatter
 	)
 
+	# Frames analysis options, shared by the video modes
+	analysis_parser = Parser(add_help=False)
+	analysis_parser.add_argument('--detect-every', default=1, type=int)
+	analysis_parser.add_argument('--tracker', default='KCF', choices=TRACKERS.keys())
+	analysis_parser.add_argument('--cut-th', default=30.0, type=float)
+	analysis_parser.add_argument('--detect-width', default=None, type=int)
+	analysis_parser.add_argument('--predict-every', default=1, type=int)
+	analysis_parser.add_argument('--static-th', default=None, type=float)
+
+	# Recognizer constructor parameters
+	model_parser = Parser(add_help=False)
+	model_parser.add_argument('--components', default=None, type=int)
+	model_parser.add_argument('--pca-components', default=None, type=int)
+	model_parser.add_argument('--radius', default=None, type=int)
+	model_parser.add_argument('--neighbors', default=None, type=int)
+	model_parser.add_argument('--grid-x', default=None, type=int)
+	model_parser.add_argument('--grid-y', default=None, type=int)
+	model_parser.add_argument('--threshold', default=None, type=float)
+
 	# Parsing the arguments in order to check the mode
 	global_parser.add_argument('mode', choices=modes)
 	arg, func_args = global_parser.parse_known_args()
@@ -165,31 +716,153 @@ if __name__ == '__main__':
 
 	if arg.mode == 'analyse_video':
 
-		parser = Parser(usage="Use 'main.py -h' for help")
+		parser = Parser(usage="Use 'main.py -h' for help", parents=[analysis_parser])
 		parser.add_argument('-v', required=True)
 		parser.add_argument('-m', required=True)
 		parser.add_argument('-c', required=True, type=float)
 		parser.add_argument('-o', required=True)
+		parser.add_argument('--workers', default=1, type=int)
+		parser.add_argument('--segments', default=1, type=int)
+		parser.add_argument('--records', default=None, choices=RECORD_FORMATS)
+		parser.add_argument('--no-video', action='store_true')
 
 		args = parser.parse_args(func_args)
-		analyse_video(args.v, args.m, args.c, args.o)
+		analyse_video(
+			video_path=args.v,
+			model_name=args.m,
+			clf_th=args.c,
+			output=args.o,
+			workers=args.workers,
+			segments=args.segments,
+			video_output=not args.no_video,
+			records=args.records,
+			**analysis_options(args)
+		)
 
 
 	elif arg.mode == 'build_datasets':
 
 		parser = Parser(usage="Use 'main.py -h' for help")
 		parser.add_argument('-d', required=True)
+		parser.add_argument('--downloads', default=8, type=int)
+		parser.add_argument('--per-host', default=4, type=int)
+		parser.add_argument('--detectors', default=2, type=int)
+		parser.add_argument('--queue-size', default=64, type=int)
+		parser.add_argument('--cache-ttl', default=168, type=float)
+		parser.add_argument('--cache-size', default=1024, type=float)
 
 		args = parser.parse_args(func_args)
-		build_datasets(args.d)
+		build_datasets(
+			args.d, args.downloads, args.per_host,
+			args.detectors, args.queue_size,
+			args.cache_ttl, args.cache_size
+		)
 
 
-	elif arg.mode == 'train_model':
+	elif arg.mode == 'calibrate_model':
+
+		parser = Parser(usage="Use 'main.py -h' for help")
+		parser.add_argument('-m', required=True)
+		parser.add_argument('-o', default=None)
+		parser.add_argument('--min-precision', default=None, type=float)
+
+		args = parser.parse_args(func_args)
+		calibrate_model(args.m, args.o, args.min_precision)
+
+
+	elif arg.mode == 'index_model':
 
 		parser = Parser(usage="Use 'main.py -h' for help")
+		parser.add_argument('-m', required=True)
+		parser.add_argument('--cells', default=None, type=int)
+		parser.add_argument('--nprobe', default=8, type=int)
+		parser.add_argument('-o', default=None)
+
+		args = parser.parse_args(func_args)
+		index_model(args.m, args.cells, args.nprobe, args.o)
+
+
+	elif arg.mode == 'pack_datasets':
+
+		parser = Parser(usage="Use 'main.py -h' for help")
+		parser.add_argument('-d', required=True)
+		parser.add_argument('--readers', default=4, type=int)
+
+		args = parser.parse_args(func_args)
+		pack_datasets(args.d, args.readers)
+
+
+	elif arg.mode == 'stream_video':
+
+		parser = Parser(usage="Use 'main.py -h' for help", parents=[analysis_parser])
+		parser.add_argument('-v', required=True)
+		parser.add_argument('-m', required=True)
+		parser.add_argument('-c', required=True, type=float)
+		parser.add_argument('--latency', default=200, type=float)
+		parser.add_argument('--realtime', action='store_true')
+		parser.add_argument('--display', action='store_true')
+
+		args = parser.parse_args(func_args)
+		stream_video(
+			source=args.v,
+			model_name=args.m,
+			clf_th=args.c,
+			latency=args.latency,
+			realtime=args.realtime,
+			display=args.display,
+			**analysis_options(args)
+		)
+
+
+	elif arg.mode == 'train_model':
+
+		parser = Parser(usage="Use 'main.py -h' for help", parents=[model_parser])
 		parser.add_argument('-a', required=True)
 		parser.add_argument('-d', required=True)
 		parser.add_argument('-o', required=True)
+		parser.add_argument('--folds', default=10, type=int)
+		parser.add_argument('--workers', default=1, type=int)
+		parser.add_argument('--seed', default=None, type=int)
+		parser.add_argument('--packed', action='store_true')
+		parser.add_argument('--readers', default=4, type=int)
+		parser.add_argument('--format', default='npz', choices=MODEL_FORMATS)
+
+		args = parser.parse_args(func_args)
+		train_model(
+			args.a, args.d, args.o,
+			args.folds, args.workers, args.seed,
+			model_params(args), args.packed, args.readers, args.format
+		)
+
+
+	elif arg.mode == 'tune_model':
+
+		parser = Parser(usage="Use 'main.py -h' for help")
+		parser.add_argument('-t', required=True)
+		parser.add_argument('-d', required=True)
+		parser.add_argument('-o', default=None)
+		parser.add_argument('--folds', default=5, type=int)
+		parser.add_argument('--workers', default=1, type=int)
+		parser.add_argument('--seed', default=0, type=int)
+		parser.add_argument('--packed', action='store_true')
+		parser.add_argument('--readers', default=4, type=int)
+
+		args = parser.parse_args(func_args)
+		tune_model(
+			args.t, args.d, args.o,
+			args.folds, args.workers, args.seed,
+			args.packed, args.readers
+		)
+
+
+	elif arg.mode == 'update_model':
+
+		parser = Parser(usage="Use 'main.py -h' for help")
+		parser.add_argument('-m', required=True)
+		parser.add_argument('-d', required=True)
+		parser.add_argument('-o', default=None)
+		parser.add_argument('--readers', default=4, type=int)
+		parser.add_argument('--format', default='npz', choices=MODEL_FORMATS)
 
 		args = parser.parse_args(func_args)
-		train_model(args.a, args.d, args.o)
+		update_model(args.m, args.d, args.o, args.readers, args.format)
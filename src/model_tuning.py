@@ -0,0 +1,302 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import itertools
+import numpy
+import random
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+
+from clf_train import create_model
+from clf_train import export_model
+from clf_train import is_exportable
+
+from subspace import batch_predict
+
+from utils import crossValidation_init
+from utils import crossValidation_split
+from utils import fold_data
+from utils import read_json
+from utils import release_samples
+from utils import share_samples
+
+
+
+
+def read_grid(tuning_config):
+
+	""" Expands the parameter grids of a tuning configuration
+
+	Arguments:
+	----------
+		tuning_config:
+			type: string
+			info: name of the JSON with the tuning configuration
+
+	Returns:
+	----------
+		grid:
+			type: list
+			info: (algorithm, params) tuples, one per configuration
+	"""
+
+	grid = []
+
+	for search in read_json(tuning_config, 'tuning_c'):
+		names = sorted(search.get('params', {}))
+		values = [search['params'][name] for name in names]
+
+		for combination in itertools.product(*values):
+			params = dict(zip(names, combination))
+
+			# Invalid algorithms or parameters are found before any training
+			create_model(search['algorithm'], **params)
+			grid.append((search['algorithm'], params))
+
+	if len(grid) == 0:
+		exit('The tuning configuration has no models')
+
+	return grid
+
+
+
+
+def model_size(model):
+
+	""" Obtains the number of bytes of a trained model in the npz format
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: trained classifier model object
+
+	Returns:
+	----------
+		size:
+			type: int / None
+			info: bytes of the model arrays (None if it cannot be exported)
+	"""
+
+	if not is_exportable(model):
+		return None
+
+	return sum(numpy.asarray(array).nbytes for array in export_model(model).values())
+
+
+
+
+def tune_models(grid, samples, labels, folds=5, workers=1, seed=None):
+
+	""" Cross validates every configuration of a grid with the same folds
+
+	Arguments:
+	----------
+		grid:
+			type: list
+			info: (algorithm, params) tuples (see 'read_grid')
+
+		samples:
+			type: numpy array / numpy memmap
+			info: contains all the images (a packed dataset, see 'read_pack')
+
+		labels:
+			type: numpy array
+			info: contains all the integer-encoded labels
+
+		folds:
+			type: int (optional)
+			info: number of cross validation folds
+
+		workers:
+			type: int (optional)
+			info: number of processes validating folds at the same time
+
+		seed:
+			type: int (optional)
+			info: seed of the shuffle, shared by every configuration
+
+	Returns:
+	----------
+		results:
+			type: list
+			info: dictionaries ranked by accuracy, containing:
+				- algorithm (string)
+				- params (dict)
+				- accuracy (float)
+				- train_time (float)
+				- predict_latency (float)
+				- model_size (int)
+	"""
+
+	if folds < 2:
+		exit('The number of CV folds must be greater than 1')
+	if workers < 1:
+		exit('The number of CV workers must be greater than 0')
+
+	order = list(range(len(samples)))
+	random.Random(seed).shuffle(order)
+
+	cutoff = len(samples) // folds
+	tasks = [(c, i) for c in range(len(grid)) for i in range(folds)]
+	folds_results = [[] for _ in grid]
+
+	print('Validating', len(grid), 'configurations with', folds, 'folds each')
+
+	if workers == 1:
+		crossValidation_init(samples, labels, order)
+
+		for c, i in tasks:
+			folds_results[c].append(tune_task(*grid[c], cutoff, folds, i))
+			print_fold(grid[c], i, folds_results[c][-1])
+
+		fold_data.clear()
+
+	# Every (configuration, fold) pair is a task, so the
+	# processes keep busy until the whole grid is validated
+	else:
+		memory, shared = share_samples(samples)
+
+		try:
+			with ProcessPoolExecutor(
+				max_workers=min(workers, len(tasks)),
+				initializer=crossValidation_init,
+				initargs=(shared, labels, order)) as executor:
+
+				futures = {
+					executor.submit(tune_task, *grid[c], cutoff, folds, i): (c, i)
+					for c, i in tasks
+				}
+
+				for future in as_completed(futures):
+					c, i = futures[future]
+					folds_results[c].append(future.result())
+					print_fold(grid[c], i, folds_results[c][-1])
+
+		finally:
+			release_samples(memory)
+
+	results = []
+
+	for (algorithm, params), fold_results in zip(grid, folds_results):
+		sizes = [r['size'] for r in fold_results if r['size'] is not None]
+
+		results.append({
+			'algorithm': algorithm,
+			'params': params,
+			'accuracy': round(numpy.mean([r['score'] for r in fold_results]), 4),
+			'train_time': round(numpy.mean([r['train_time'] for r in fold_results]), 4),
+			'predict_latency': round(numpy.mean([r['predict_latency'] for r in fold_results]), 4),
+			'model_size': int(numpy.mean(sizes)) if sizes else None
+		})
+
+	# The fastest predictions break accuracy ties
+	results.sort(key=lambda r: (-r['accuracy'], r['predict_latency']))
+	return results
+
+
+
+
+def tune_task(algorithm, params, cutoff, folds, i):
+
+	""" Trains and tests a configuration over a fold of the shared samples
+
+	Arguments:
+	----------
+		algorithm:
+			type: string
+			info: name of the algorithm
+
+		params:
+			type: dict
+			info: constructor parameters of the model
+
+		cutoff
+			type: int
+			info: number of samples per fold
+
+		folds:
+			type: int
+			info: total number of folds
+
+		i:
+			type: int
+			info: fold iteration number
+
+	Returns:
+	----------
+		result:
+			type: dict
+			info: fold score, train time (s), predict latency (ms / face) and model size (bytes)
+	"""
+
+	samples = fold_data['samples']
+	labels = numpy.asarray(fold_data['labels'])
+
+	train_index, test_index = crossValidation_split(fold_data['order'], cutoff, folds, i)
+	model = create_model(algorithm, **params)
+
+	start = time.perf_counter()
+	model.train([samples[j] for j in train_index], labels[train_index])
+	train_time = time.perf_counter() - start
+
+	start = time.perf_counter()
+	pred_labels, _ = batch_predict(model, [samples[j] for j in test_index])
+	predict_time = time.perf_counter() - start
+
+	return {
+		'score': float(numpy.mean(pred_labels == labels[test_index])),
+		'train_time': train_time,
+		'predict_latency': 1000 * predict_time / len(test_index),
+		'size': model_size(model)
+	}
+
+
+
+
+def print_fold(config, i, result):
+
+	""" Prints the score of a configuration fold
+
+	Arguments:
+	----------
+		config:
+			type: tuple
+			info: (algorithm, params) of the configuration
+
+		i:
+			type: int
+			info: fold iteration number
+
+		result:
+			type: dict
+			info: fold results (see 'tune_task')
+	"""
+
+	print(config[0], config[1], 'fold', i, 'completed with score:', round(result['score'], 4))
+
+
+
+
+def print_report(results):
+
+	""" Prints the ranked results of a tuning process
+
+	Arguments:
+	----------
+		results:
+			type: list
+			info: ranked configurations (see 'tune_models')
+	"""
+
+	print('\nRank | Accuracy | Train (s) | Predict (ms/face) | Size (KB) | Model')
+
+	for rank, r in enumerate(results, 1):
+		size = '-' if r['model_size'] is None else round(r['model_size'] / 1024, 1)
+
+		print(
+			rank, '|', r['accuracy'], '|', r['train_time'], '|',
+			r['predict_latency'], '|', size, '|', r['algorithm'], r['params']
+		)
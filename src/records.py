@@ -0,0 +1,194 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import csv
+import json
+import os
+
+from utils import compute_path
+
+
+RECORD_FIELDS = [
+	'frame',
+	'timestamp',
+	'X_coord',
+	'Y_coord',
+	'width',
+	'height',
+	'label',
+	'conf',
+]
+
+RECORD_FORMATS = (
+	'csv',
+	'jsonl',
+)
+
+
+
+
+class RecordsWriter(object):
+
+
+	""" Represents a file where the detected faces are streamed as records
+
+	Attributes:
+	----------
+		file:
+			type: file object
+			info: opened records file
+
+		writer:
+			type: csv DictWriter / None
+			info: CSV writer (None when writing JSON lines)
+	"""
+
+
+
+
+	def __init__(self, out_name, records_format):
+
+		""" Opens the records file inside the videos folder
+
+		Arguments:
+		----------
+			out_name:
+				type: string
+				info: name of the records file (without extension)
+
+			records_format:
+				type: string
+				info: format of the records {csv, jsonl}
+		"""
+
+		if records_format not in RECORD_FORMATS:
+			exit('Invalid records format')
+
+		file_name = out_name + '.' + records_format
+		file_path = compute_path(file_name, 'video')
+
+		file_dir = file_path.replace(file_name, '')
+		os.makedirs(file_dir, exist_ok=True)
+
+		self.file = open(file_path, 'w', encoding='utf-8', newline='')
+		self.writer = None
+
+		if records_format == 'csv':
+			self.writer = csv.DictWriter(self.file, fieldnames=RECORD_FIELDS)
+			self.writer.writeheader()
+
+
+
+
+	def write(self, index, timestamp, detections):
+
+		""" Writes a record for each of the faces detected in a frame
+
+		Arguments:
+		----------
+			index:
+				type: int
+				info: position of the frame
+
+			timestamp:
+				type: float
+				info: seconds since the beginning of the video
+
+			detections:
+				type: list
+				info: detected faces of the frame (see 'FrameAnalyser.analyse')
+		"""
+
+		for detection in detections:
+			record = detection_record(index, timestamp, detection)
+
+			if self.writer is None:
+				self.file.write(json.dumps(record) + '\n')
+			else:
+				self.writer.writerow(record)
+
+
+
+
+	def release(self):
+
+		""" Closes the records file """
+
+		self.file.close()
+
+
+
+
+def detection_record(index, timestamp, detection):
+
+	""" Builds a serializable record from a detected face
+
+	Arguments:
+	----------
+		index:
+			type: int
+			info: position of the frame
+
+		timestamp:
+			type: float
+			info: seconds since the beginning of the video
+
+		detection:
+			type: dict
+			info: detected face (see 'FrameAnalyser.analyse')
+
+	Returns:
+	----------
+		record:
+			type: dict
+			info: contains the following keys:
+				- frame:      int
+				- timestamp:  float
+				- X_coord:    int
+				- Y_coord:    int
+				- width:      int
+				- height:     int
+				- label:      string
+				- conf:       float
+	"""
+
+	record = {'frame': int(index), 'timestamp': round(float(timestamp), 4)}
+
+	for key, value in detection['coords'].items():
+		record[key] = int(value)
+
+	record['label'] = detection['label']
+	record['conf'] = round(float(detection['conf']), 4)
+
+	return record
+
+
+
+
+def concat_records(part_names, out_name):
+
+	""" Joins several partial records files of the same format into one
+
+	Arguments:
+	----------
+		part_names:
+			type: list
+			info: names of the partial records files, in order
+
+		out_name:
+			type: string
+			info: name of the joined records file
+	"""
+
+	out_path = compute_path(out_name, 'video')
+
+	with open(out_path, 'w', encoding='utf-8', newline='') as out:
+		for i, name in enumerate(part_names):
+			with open(compute_path(name, 'video'), 'r', encoding='utf-8', newline='') as part:
+
+				# The CSV header is only kept from the first part
+				if i > 0 and name.endswith('.csv'):
+					part.readline()
+
+				for line in part:
+					out.write(line)
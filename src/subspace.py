@@ -0,0 +1,1004 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import cv2
+import numpy
+
+from abc import ABC
+from abc import abstractmethod
+
+
+
+
+def is_subspace_model(model):
+
+	""" Checks if a model projects the images into a subspace (Eigen / Fisher)
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: trained classifier model object
+
+	Returns:
+	----------
+		subspace:
+			type: bool
+			info: whether the model exposes its eigenvectors and projections
+	"""
+
+	return hasattr(model, 'getEigenVectors') and hasattr(model, 'getProjections')
+
+
+
+
+def extract_subspace(model):
+
+	""" Extracts the matrices defining a trained Eigen / Fisher model
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: trained Eigenfaces or Fisherfaces model object
+
+	Returns:
+	----------
+		subspace:
+			type: dict
+			info: contains the following keys:
+				- mean:          numpy array (1 x pixels)
+				- eigenvectors:  numpy array (pixels x components)
+				- projections:   numpy array (samples x components)
+				- labels:        numpy array (samples)
+	"""
+
+	projections = model.getProjections()
+
+	# OpenCV returns a list of row matrices, NumPy models a single matrix
+	if not isinstance(projections, numpy.ndarray):
+		projections = numpy.vstack([p.reshape(1, -1) for p in projections])
+
+	return {
+		'mean': model.getMean().reshape(1, -1).astype(numpy.float64),
+		'eigenvectors': model.getEigenVectors().astype(numpy.float64),
+		'projections': projections.astype(numpy.float64),
+		'labels': model.getLabels().ravel(),
+		'threshold': float(model.getThreshold())
+	}
+
+
+
+
+def project(subspace, images):
+
+	""" Projects a stack of images into the subspace
+
+	Arguments:
+	----------
+		subspace:
+			type: dict
+			info: matrices of the model (see 'extract_subspace')
+
+		images:
+			type: list / numpy array
+			info: normalized greyscale and sized images
+
+	Returns:
+	----------
+		projections:
+			type: numpy array
+			info: one row per image (images x components)
+	"""
+
+	samples = numpy.asarray(images, dtype=numpy.float64)
+	samples = samples.reshape(len(samples), -1)
+
+	return (samples - subspace['mean']).dot(subspace['eigenvectors'])
+
+
+
+
+def subspace_predict(subspace, images, chunk_cells=2**22):
+
+	""" Predicts the nearest training sample of each image in a single pass
+
+	The Euclidean distances to every training projection are computed at
+	once, as |q|^2 + |p|^2 - 2 q·p, instead of one image at a time. Large
+	stacks are split so the distances matrix stays within 'chunk_cells'.
+
+	Arguments:
+	----------
+		subspace:
+			type: dict
+			info: matrices of the model (see 'extract_subspace')
+
+		images:
+			type: list / numpy array
+			info: normalized greyscale and sized images
+
+		chunk_cells:
+			type: int (optional)
+			info: maximum number of distances computed at once
+
+	Returns:
+	----------
+		labels:
+			type: numpy array
+			info: integer label of the nearest training sample of each image
+
+		dists:
+			type: numpy array
+			info: distance to the nearest training sample of each image
+	"""
+
+	queries = project(subspace, images)
+	projections = subspace['projections']
+	proj_norms = numpy.sum(projections ** 2, axis=1)[None, :]
+
+	step = max(1, chunk_cells // max(len(projections), 1))
+	nearest = numpy.empty(len(queries), dtype=numpy.int64)
+	dists = numpy.empty(len(queries))
+
+	for start in range(0, len(queries), step):
+		chunk = queries[start: start+step]
+
+		chunk_dists = \
+			numpy.sum(chunk ** 2, axis=1)[:, None] + proj_norms - \
+			2 * chunk.dot(projections.T)
+
+		chunk_nearest = numpy.argmin(chunk_dists, axis=1)
+		nearest[start: start+step] = chunk_nearest
+		dists[start: start+step] = chunk_dists[numpy.arange(len(chunk)), chunk_nearest]
+
+	labels = subspace['labels'][nearest]
+	dists = numpy.sqrt(numpy.maximum(dists, 0))
+
+	rejected = dists >= subspace.get('threshold', numpy.inf)
+	labels[rejected] = -1
+	dists[rejected] = numpy.finfo(numpy.float64).max
+
+	return labels, dists
+
+
+
+
+def batch_predict(model, images, subspace=None):
+
+	""" Predicts the labels of a stack of images with any trained model
+
+	Arguments:
+	----------
+		model:
+			type: OpenCV Recognizer
+			info: trained classifier model object
+
+		images:
+			type: list / numpy array
+			info: normalized greyscale and sized images
+
+		subspace:
+			type: dict (optional)
+			info: matrices already extracted from the model
+
+	Returns:
+	----------
+		labels:
+			type: numpy array
+			info: integer label predicted for each image
+
+		dists:
+			type: numpy array
+			info: confidence (distance) of each prediction
+	"""
+
+	if len(images) == 0:
+		return numpy.array([], dtype=numpy.int32), numpy.array([])
+
+	if subspace is None and is_subspace_model(model):
+		subspace = extract_subspace(model)
+
+	if subspace is not None:
+		return subspace_predict(subspace, images)
+
+	# Models comparing all the images at once (LBPHGallery)
+	if hasattr(model, 'predict_batch'):
+		return model.predict_batch(images)
+
+	# Models without a subspace (LBPH) predict one image at a time
+	results = [model.predict(image) for image in images]
+	labels, dists = zip(*results)
+
+	return numpy.array(labels), numpy.array(dists)
+
+
+
+
+def sample_chunks(samples, mean, chunk_rows=1024):
+
+	""" Iterates over a stack of images as centered rows, a few at a time
+
+	Arguments:
+	----------
+		samples:
+			type: list / numpy array
+			info: greyscale and sized images
+
+		mean:
+			type: numpy array / None
+			info: mean row to subtract (None to keep the samples as they are)
+
+		chunk_rows:
+			type: int (optional)
+			info: maximum number of images converted to floats at once
+
+	Yields:
+	----------
+		start:
+			type: int
+			info: position of the first image of the chunk
+
+		chunk:
+			type: numpy array
+			info: one row per image (images x pixels)
+	"""
+
+	for start in range(0, len(samples), chunk_rows):
+		chunk = numpy.asarray(samples[start: start+chunk_rows], dtype=numpy.float64)
+		chunk = chunk.reshape(len(chunk), -1)
+
+		if mean is not None:
+			chunk = chunk - mean
+
+		yield start, chunk
+
+
+
+
+def randomized_pca(samples, components, oversamples=10, iterations=2, seed=0):
+
+	""" Computes the main principal components of a stack of images
+
+	The randomized SVD only keeps matrices of (images x components) and
+	(pixels x components) values, and reads the images in chunks, so the
+	full covariance matrix and a float copy of the samples are never built.
+
+	Arguments:
+	----------
+		samples:
+			type: list / numpy array
+			info: greyscale and sized images
+
+		components:
+			type: int
+			info: number of principal components to keep
+
+		oversamples:
+			type: int (optional)
+			info: extra random directions improving the approximation
+
+		iterations:
+			type: int (optional)
+			info: number of power iterations improving the approximation
+
+		seed:
+			type: int (optional)
+			info: seed of the random directions, to reproduce the model
+
+	Returns:
+	----------
+		mean:
+			type: numpy array
+			info: mean image (1 x pixels)
+
+		eigenvectors:
+			type: numpy array
+			info: principal components (pixels x components)
+	"""
+
+	pixels = numpy.asarray(samples[0]).size
+	width = min(components + oversamples, len(samples), pixels)
+
+	mean = numpy.zeros((1, pixels))
+	for _, chunk in sample_chunks(samples, None):
+		mean += chunk.sum(axis=0)
+	mean /= len(samples)
+
+	# Range of the samples matrix (images x width)
+	directions = numpy.random.RandomState(seed).standard_normal((pixels, width))
+	basis = numpy.empty((len(samples), width))
+
+	for i in range(iterations + 1):
+		for start, chunk in sample_chunks(samples, mean):
+			basis[start: start+len(chunk)] = chunk.dot(directions)
+
+		basis, _ = numpy.linalg.qr(basis)
+		if i == iterations:
+			break
+
+		# Power iteration: directions = samples^T · basis
+		directions = numpy.zeros((pixels, width))
+		for start, chunk in sample_chunks(samples, mean):
+			directions += chunk.T.dot(basis[start: start+len(chunk)])
+
+		directions, _ = numpy.linalg.qr(directions)
+
+	# Small (width x pixels) projection of the samples, decomposed exactly
+	small = numpy.zeros((width, pixels))
+	for start, chunk in sample_chunks(samples, mean):
+		small += basis[start: start+len(chunk)].T.dot(chunk)
+
+	_, _, vt = numpy.linalg.svd(small, full_matrices=False)
+	return mean, vt[:components].T
+
+
+
+
+def scatter_factor(projections):
+
+	""" Computes a triangular factor R of the projections scatter (R^T R = P^T P)
+
+	Arguments:
+	----------
+		projections:
+			type: numpy array
+			info: centred projections of the samples (samples x components)
+
+	Returns:
+	----------
+		scatter:
+			type: numpy array
+			info: upper triangular factor (components x components at most)
+	"""
+
+	return numpy.linalg.qr(projections, mode='r')
+
+
+
+
+def fisher_directions(projections, labels, components):
+
+	""" Computes the LDA directions separating the classes of some projections
+
+	Arguments:
+	----------
+		projections:
+			type: numpy array
+			info: centered PCA projections (samples x PCA components)
+
+		labels:
+			type: numpy array
+			info: integer label of each sample
+
+		components:
+			type: int
+			info: number of discriminant directions to keep
+
+	Returns:
+	----------
+		directions:
+			type: numpy array
+			info: discriminant directions (PCA components x components)
+	"""
+
+	dims = projections.shape[1]
+	within = numpy.zeros((dims, dims))
+	between = numpy.zeros((dims, dims))
+
+	for label in numpy.unique(labels):
+		members = projections[labels == label]
+		class_mean = members.mean(axis=0)
+		centered = members - class_mean
+
+		within += centered.T.dot(centered)
+		between += len(members) * numpy.outer(class_mean, class_mean)
+
+	# Whitening the within scatter turns it into a standard eigenproblem
+	values, vectors = numpy.linalg.eigh(within)
+	values = numpy.maximum(values, values.max() * 1e-12)
+	whitening = vectors / numpy.sqrt(values)
+
+	values, vectors = numpy.linalg.eigh(whitening.T.dot(between).dot(whitening))
+	order = numpy.argsort(values)[::-1][:components]
+
+	return whitening.dot(vectors[:, order])
+
+
+
+
+class SubspaceRecognizer(ABC):
+
+
+	""" Represents a NumPy Eigen / Fisher recognizer with the OpenCV interface
+
+	Attributes:
+	----------
+		num_components:
+			type: int
+			info: number of components to keep (0 for the default of each model)
+
+		threshold:
+			type: float
+			info: maximum distance to accept a prediction
+
+		mean:
+			type: numpy array
+			info: mean image (1 x pixels)
+
+		eigenvectors:
+			type: numpy array
+			info: subspace directions (pixels x components)
+
+		projections:
+			type: numpy array
+			info: training samples projections (samples x components)
+
+		labels:
+			type: numpy array
+			info: training samples labels
+	"""
+
+
+
+
+	def __init__(self, num_components=0, threshold=numpy.finfo(numpy.float64).max):
+
+		""" Initiates an untrained recognizer
+
+		Arguments:
+		----------
+			num_components:
+				type: int (optional)
+				info: number of components to keep (0 for the default)
+
+			threshold:
+				type: float (optional)
+				info: maximum distance to accept a prediction
+		"""
+
+		self.num_components = num_components
+		self.threshold = threshold
+
+		self.mean = None
+		self.eigenvectors = None
+		self.projections = None
+		self.labels = None
+
+
+
+
+	@abstractmethod
+	def fit(self, samples, labels):
+
+		""" Computes the subspace mean and directions (defined by each recognizer)
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: numpy array
+				info: integer label of each image
+
+		Returns:
+		----------
+			mean:
+				type: numpy array
+				info: mean image (1 x pixels)
+
+			eigenvectors:
+				type: numpy array
+				info: subspace directions (pixels x components)
+		"""
+
+
+
+
+	def train(self, samples, labels):
+
+		""" Trains the recognizer with a stack of images
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		labels = numpy.asarray(labels).ravel().astype(numpy.int32)
+		self.mean, self.eigenvectors = self.fit(samples, labels)
+
+		self.projections = numpy.empty((len(samples), self.eigenvectors.shape[1]))
+		for start, chunk in sample_chunks(samples, self.mean):
+			self.projections[start: start+len(chunk)] = chunk.dot(self.eigenvectors)
+
+		self.labels = labels
+
+
+
+
+	def update(self, samples, labels):
+
+		""" Adds new images to the recognizer keeping its subspace directions
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		labels = numpy.asarray(labels).ravel().astype(numpy.int32)
+
+		projections = numpy.empty((len(samples), self.eigenvectors.shape[1]))
+		for start, chunk in sample_chunks(samples, self.mean):
+			projections[start: start+len(chunk)] = chunk.dot(self.eigenvectors)
+
+		self.projections = numpy.vstack([self.projections, projections])
+		self.labels = numpy.concatenate([self.labels, labels])
+
+
+
+
+	def predict(self, image):
+
+		""" Predicts the label of an image
+
+		Arguments:
+		----------
+			image:
+				type: numpy array
+				info: normalized greyscale and sized image
+
+		Returns:
+		----------
+			label:
+				type: int
+				info: label of the nearest training sample (-1 if too far)
+
+			dist:
+				type: float
+				info: distance to the nearest training sample
+		"""
+
+		subspace = {
+			'mean': self.mean,
+			'eigenvectors': self.eigenvectors,
+			'projections': self.projections,
+			'labels': self.labels,
+			'threshold': self.threshold
+		}
+
+		labels, dists = subspace_predict(subspace, [image])
+		return int(labels[0]), float(dists[0])
+
+
+
+
+	def read(self, file_path):
+
+		""" Loads a trained recognizer from an OpenCV XML file
+
+		Arguments:
+		----------
+			file_path:
+				type: string
+				info: path of the XML file
+		"""
+
+		storage = cv2.FileStorage(file_path, cv2.FILE_STORAGE_READ)
+		if not storage.isOpened():
+			raise IOError('The file ' + file_path + ' cannot be opened')
+
+		self.num_components = int(storage.getNode('num_components').real())
+		self.threshold = storage.getNode('threshold').real()
+		self.mean = storage.getNode('mean').mat()
+		self.eigenvectors = storage.getNode('eigenvectors').mat()
+		self.projections = storage.getNode('projections').mat()
+		self.labels = storage.getNode('labels').mat().ravel()
+
+		storage.release()
+
+
+
+
+	def write(self, file_path):
+
+		""" Saves the trained recognizer as an OpenCV XML file
+
+		Arguments:
+		----------
+			file_path:
+				type: string
+				info: path of the XML file
+		"""
+
+		storage = cv2.FileStorage(file_path, cv2.FILE_STORAGE_WRITE)
+		if not storage.isOpened():
+			raise IOError('The file ' + file_path + ' cannot be opened')
+
+		storage.write('num_components', self.num_components)
+		storage.write('threshold', self.threshold)
+		storage.write('mean', self.mean)
+		storage.write('eigenvectors', self.eigenvectors)
+		storage.write('projections', self.projections)
+		storage.write('labels', self.labels.reshape(-1, 1))
+
+		storage.release()
+
+
+
+
+	def getEigenVectors(self):
+
+		""" Returns the subspace directions, as the OpenCV recognizers """
+
+		return self.eigenvectors
+
+
+
+
+	def getLabels(self):
+
+		""" Returns the training samples labels, as the OpenCV recognizers """
+
+		return self.labels
+
+
+
+
+	def getMean(self):
+
+		""" Returns the mean image, as the OpenCV recognizers """
+
+		return self.mean
+
+
+
+
+	def getProjections(self):
+
+		""" Returns the training samples projections, as the OpenCV recognizers """
+
+		return self.projections
+
+
+
+
+	def getThreshold(self):
+
+		""" Returns the maximum prediction distance, as the OpenCV recognizers """
+
+		return self.threshold
+
+
+
+
+class EigenRecognizer(SubspaceRecognizer):
+
+
+	""" Represents a NumPy Eigenfaces recognizer trained with randomized SVD
+
+	When 'num_components' is 0, the first 100 principal components are kept.
+
+	Attributes:
+	----------
+		scatter:
+			type: numpy array / None
+			info: triangular factor of the projections scatter (components x components)
+	"""
+
+
+
+
+	def __init__(self, num_components=0, threshold=numpy.finfo(numpy.float64).max):
+
+		""" Initiates an untrained recognizer
+
+		Arguments:
+		----------
+			num_components:
+				type: int (optional)
+				info: number of principal components (0 for 100)
+
+			threshold:
+				type: float (optional)
+				info: maximum distance to accept a prediction
+		"""
+
+		super().__init__(num_components, threshold)
+		self.scatter = None
+
+
+
+
+	def fit(self, samples, labels):
+
+		""" Computes the main principal components of the images
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: numpy array
+				info: integer label of each image
+
+		Returns:
+		----------
+			mean:
+				type: numpy array
+				info: mean image (1 x pixels)
+
+			eigenvectors:
+				type: numpy array
+				info: principal components (pixels x components)
+		"""
+
+		components = self.num_components or 100
+		components = min(components, len(samples))
+
+		return randomized_pca(samples, components)
+
+
+
+
+	def train(self, samples, labels):
+
+		""" Trains the recognizer with a stack of images
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		super().train(samples, labels)
+		self.scatter = scatter_factor(self.projections)
+
+
+
+
+	def update(self, samples, labels, chunk_rows=500):
+
+		""" Adds new images to the recognizer updating its principal components
+
+		The components are updated one chunk at a time (incremental PCA),
+		representing the previous samples by their scatter factor instead of
+		their pixels, so each chunk costs the same however many images the
+		model already has. The previous projections are moved into the new
+		subspace once, with a components x components product each.
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+
+			chunk_rows:
+				type: int (optional)
+				info: maximum number of images added at once
+		"""
+
+		labels = numpy.asarray(labels).ravel().astype(numpy.int32)
+
+		# Models converted from OpenCV or saved without it
+		if self.scatter is None:
+			self.scatter = scatter_factor(self.projections)
+
+		previous = self.projections
+		components = previous.shape[1]
+
+		transform = numpy.eye(components)
+		offset = numpy.zeros((1, components))
+		projections = numpy.empty((0, components))
+
+		for _, chunk in sample_chunks(samples, None, chunk_rows):
+			seen, added = len(previous) + len(projections), len(chunk)
+			total = seen + added
+
+			chunk_mean = chunk.mean(axis=0, keepdims=True)
+			mean = (seen * self.mean + added * chunk_mean) / total
+
+			# Rows with the same scatter as the previous samples
+			rows = numpy.vstack([
+				self.scatter.dot(self.eigenvectors.T),
+				chunk - chunk_mean,
+				numpy.sqrt(seen * added / total) * (self.mean - chunk_mean)
+			])
+
+			_, singular, vt = numpy.linalg.svd(rows, full_matrices=False)
+			components = min(self.num_components or 100, total, len(vt))
+			eigenvectors = vt[:components].T
+
+			# Change from the previous subspace coordinates into the new ones
+			change = self.eigenvectors.T.dot(eigenvectors)
+			shift = (self.mean - mean).dot(eigenvectors)
+
+			transform = transform.dot(change)
+			offset = offset.dot(change) + shift
+
+			projections = numpy.vstack([
+				projections.dot(change) + shift,
+				(chunk - mean).dot(eigenvectors)
+			])
+
+			self.mean = mean
+			self.eigenvectors = eigenvectors
+			self.scatter = numpy.diag(singular[:components])
+
+		self.projections = numpy.vstack([previous.dot(transform) + offset, projections])
+		self.labels = numpy.concatenate([self.labels, labels])
+
+
+
+
+class FisherRecognizer(SubspaceRecognizer):
+
+
+	""" Represents a NumPy Fisherfaces recognizer (randomized PCA plus LDA)
+
+	Attributes:
+	----------
+		pca_components:
+			type: int
+			info: number of principal components before the LDA
+	"""
+
+
+
+
+	def __init__(self, num_components=0, pca_components=200,
+		threshold=numpy.finfo(numpy.float64).max):
+
+		""" Initiates an untrained recognizer
+
+		Arguments:
+		----------
+			num_components:
+				type: int (optional)
+				info: number of discriminant components (0 for classes - 1)
+
+			pca_components:
+				type: int (optional)
+				info: number of principal components before the LDA
+
+			threshold:
+				type: float (optional)
+				info: maximum distance to accept a prediction
+		"""
+
+		super().__init__(num_components, threshold)
+		self.pca_components = pca_components
+
+
+
+
+	def fit(self, samples, labels):
+
+		""" Computes the discriminant directions of the images
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: numpy array
+				info: integer label of each image
+
+		Returns:
+		----------
+			mean:
+				type: numpy array
+				info: mean image (1 x pixels)
+
+			eigenvectors:
+				type: numpy array
+				info: PCA and LDA combined directions (pixels x components)
+		"""
+
+		classes = len(numpy.unique(labels))
+		if classes < 2:
+			raise ValueError('At least two classes are needed to train Fisherfaces')
+
+		# As OpenCV, the PCA keeps at most (samples - classes) components
+		pca_components = min(self.pca_components, len(samples) - classes)
+
+		if pca_components < 1:
+			raise ValueError('Fisherfaces needs more images than classes to be trained')
+		mean, pca_vectors = randomized_pca(samples, pca_components)
+
+		projections = numpy.empty((len(samples), pca_vectors.shape[1]))
+		for start, chunk in sample_chunks(samples, mean):
+			projections[start: start+len(chunk)] = chunk.dot(pca_vectors)
+
+		components = self.num_components or classes - 1
+		components = min(components, classes - 1)
+
+		return mean, pca_vectors.dot(fisher_directions(projections, labels, components))
+
+
+
+
+	def update(self, samples, labels):
+
+		""" Adds new images of already known actors to the recognizer
+
+		The discriminant directions cannot separate classes they were not
+		computed with, so the new images must belong to the known labels.
+
+		Arguments:
+		----------
+			samples:
+				type: list / numpy array
+				info: greyscale and sized images
+
+			labels:
+				type: list / numpy array
+				info: integer label of each image
+		"""
+
+		if not numpy.isin(labels, self.labels).all():
+			raise ValueError('Fisherfaces models must be retrained to add new actors')
+
+		super().update(samples, labels)
+
+
+
+
+def import_subspace(subspace, recognizer):
+
+	""" Copies the matrices of a trained Eigen / Fisher model into a recognizer
+
+	Arguments:
+	----------
+		subspace:
+			type: dict
+			info: matrices of the model (see 'extract_subspace')
+
+		recognizer:
+			type: SubspaceRecognizer
+			info: untrained NumPy recognizer of the same kind
+
+	Returns:
+	----------
+		recognizer:
+			type: SubspaceRecognizer
+			info: NumPy recognizer equivalent to the model
+	"""
+
+	recognizer.num_components = subspace['eigenvectors'].shape[1]
+	recognizer.threshold = float(subspace['threshold'])
+	recognizer.mean = subspace['mean']
+	recognizer.eigenvectors = subspace['eigenvectors']
+	recognizer.projections = subspace['projections']
+	recognizer.labels = subspace['labels'].astype(numpy.int32)
+
+	# Eigen recognizers keep updating from their stored scatter factor
+	if 'scatter' in subspace:
+		recognizer.scatter = subspace['scatter'].astype(numpy.float64)
+
+	return recognizer
@@ -1,22 +1,38 @@
 # Created by Sinclert Pérez & Silvia Barbero
 
 
+import cv2
 import json
 import math
 import numpy
 import os
 import random
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from subspace import batch_predict
 
 
 project_paths = {
+	'cache': ['resources', 'cache'],
 	'dataset': ['resources', 'datasets'],
 	'face_model': ['resources', 'face_models'],
+	'index': ['resources', 'indexes'],
 	'model': ['models'],
+	'pack': ['resources', 'packs'],
+	'report': ['reports'],
 	'scraping_c': ['configs', 'scraping'],
 	'training_c': ['configs', 'training'],
+	'tuning_c': ['configs', 'tuning'],
 	'video': ['videos']
 }
 
+# Samples of the cross validation, set once in every worker process
+fold_data = {}
+
 
 
 
@@ -112,6 +128,102 @@ def get_file_paths(folder_name, file_type):
 
 
 
+def read_images(file_paths, readers=4, shape=(100, 100)):
+
+	""" Decodes greyscale images in parallel into a preallocated array
+
+	OpenCV releases the GIL while decoding, so threads are enough.
+	Corrupt files, non-image files and images of other sizes are skipped.
+
+	Arguments:
+	----------
+		file_paths:
+			type: list
+			info: paths of the images
+
+		readers:
+			type: int (optional)
+			info: number of threads decoding images at the same time
+
+		shape:
+			type: tuple (optional)
+			info: expected size of the images
+
+	Returns:
+	----------
+		images:
+			type: numpy array
+			info: one image per path (the skipped ones are left empty)
+
+		valid:
+			type: numpy array
+			info: whether each image was decoded
+	"""
+
+	if readers < 1:
+		exit('The number of image readers must be greater than 0')
+
+	images = numpy.zeros((len(file_paths),) + tuple(shape), dtype=numpy.uint8)
+	valid = numpy.zeros(len(file_paths), dtype=bool)
+
+	start = time.perf_counter()
+
+	with ThreadPoolExecutor(max_workers=readers) as executor:
+		futures = [
+			executor.submit(read_image_into, path, images, valid, i)
+			for i, path in enumerate(file_paths)
+		]
+
+		# Undecodable images are skipped, any other error is raised
+		for future in futures:
+			future.result()
+
+	elapsed = max(time.perf_counter() - start, 1e-9)
+	decoded = int(valid.sum())
+
+	print(
+		'Loaded', decoded, 'images at',
+		round(decoded / elapsed, 2), 'images/s',
+		'(' + str(len(file_paths) - decoded), 'skipped)'
+	)
+
+	return images, valid
+
+
+
+
+def read_image_into(file_path, images, valid, i):
+
+	""" Decodes a greyscale image into a position of a preallocated array
+
+	Arguments:
+	----------
+		file_path:
+			type: string
+			info: path of the image
+
+		images:
+			type: numpy array
+			info: array where the image is copied
+
+		valid:
+			type: numpy array
+			info: array where the image is marked as decoded
+
+		i:
+			type: int
+			info: position of the image in both arrays
+	"""
+
+	image = cv2.imread(file_path, 0)
+
+	if image is not None and image.shape == images.shape[1:]:
+		images[i] = image
+		valid[i] = True
+
+
+
+
 def read_clf(clf, file_name, file_type):
 
 	""" Reads a classifier object with the specified name
@@ -182,6 +294,72 @@ def write_clf(clf, file_name, file_type):
 
 
 
+def read_arrays(file_name, file_type):
+
+	""" Reads the arrays of a NumPy '.npz' file
+
+	Arguments:
+	----------
+		file_name:
+			type: string
+			info: readable file name
+
+		file_type:
+			type: string
+			info: used to determine the proper path
+
+	Returns:
+	----------
+		arrays:
+			type: dict
+			info: arrays stored in the file, by name
+	"""
+
+	file_path = compute_path(file_name, file_type)
+
+	try:
+		with numpy.load(file_path) as archive:
+			return dict(archive)
+
+	except IOError:
+		exit('The file ' + file_name + ' cannot be opened')
+
+
+
+
+def write_arrays(arrays, file_name, file_type):
+
+	""" Writes several arrays as a single NumPy '.npz' file
+
+	Arguments:
+	----------
+		arrays:
+			type: dict
+			info: arrays to store, by name
+
+		file_name:
+			type: string
+			info: saved file name (with the '.npz' extension)
+
+		file_type:
+			type: string
+			info: used to determine the proper path
+	"""
+
+	file_path = compute_path(file_name, file_type)
+
+	file_dir = file_path.replace(file_name, '')
+	os.makedirs(file_dir, exist_ok=True)
+
+	try:
+		numpy.savez(file_path, **arrays)
+
+	except IOError:
+		exit('The file ' + file_name + ' cannot be saved')
+
+
+
+
 def read_json(file_name, file_type):
 
 	""" Reads a JSON file and returns it as a dictionary
@@ -242,70 +420,202 @@ def write_json(dictionary, file_name, file_type):
 	file_dir = file_path.replace(file_name, '')
 	os.makedirs(file_dir, exist_ok=True)
 
+	# The file is replaced at once, so an interruption never truncates it
 	try:
-		file = open(file_path, 'w', encoding='utf-8')
+		file = open(file_path + '.tmp', 'w', encoding='utf-8')
 		json.dump(dictionary, file, sort_keys=True, indent=4)
 		file.close()
 
+		os.replace(file_path + '.tmp', file_path)
+
 	except IOError:
 		exit('The file ' + file_name + ' cannot be opened')
 
 
 
 
-def crossValidation(model, samples, labels, folds=10):
+def crossValidation(model_factory, samples, labels, folds=10, workers=1, seed=None):
 
 	""" Tests the specified classifier applying cross validation
 
+	Every fold trains a freshly built recognizer, so the folds are
+	independent and can be run in parallel by several processes.
+
 	Arguments:
 	----------
-		model:
-			type: OpenCV Recognizer
-			info: object used to train and test
+		model_factory:
+			type: picklable callable
+			info: builds a new untrained OpenCV Recognizer
 
 		samples:
-			type: list
-			info: contains all the images
+			type: list / numpy memmap
+			info: contains all the images (a packed dataset, see 'read_pack')
 
 		labels:
-			type: list
+			type: list / numpy array
 			info: contains all the images labels
 
 		folds:
 			type: int (optional)
 			info: number of train-test iteration
+
+		workers:
+			type: int (optional)
+			info: number of processes running folds at the same time
+
+		seed:
+			type: int (optional)
+			info: seed of the shuffle, to reproduce the same folds
+
+	Returns:
+	----------
+		accuracy:
+			type: float
+			info: mean ratio of test samples correctly predicted
+
+		predictions:
+			type: dict
+			info: true label, predicted label and distance of every test sample
 	"""
 
 	if folds < 2:
 		exit('The number of CV folds must be greater than 1')
+	elif workers < 1:
+		exit('The number of CV workers must be greater than 0')
 	else:
 		print('Starting validation process')
 
-	# Shuffle the samples and the labels
-	comb_list = list(zip(samples, labels))
-	random.shuffle(comb_list)
-	samples, labels = zip(*comb_list)
+	# Shuffle the samples positions (the images are not copied)
+	order = list(range(len(samples)))
+	random.Random(seed).shuffle(order)
 
 	# Calculating cut offs in both features lists
 	cutoff = math.floor(len(samples) / folds)
-	results = 0
 
-	for i in range(folds):
-		results += crossValidation_fold(
-			model=model,
-			samples=samples,
-			labels=labels,
-			cutoff=cutoff,
-			folds=folds,
-			i=i
-		)
+	if workers == 1:
+		results = [
+			crossValidation_fold(model_factory(), samples, labels, order, cutoff, folds, i)
+			for i in range(folds)
+		]
+
+	# The samples are shared once with every process, not sent once per fold.
+	# Packed samples are memory-mapped by each process instead
+	else:
+		memory, shared = share_samples(samples)
+
+		try:
+			with ProcessPoolExecutor(
+				max_workers=min(workers, folds),
+				initializer=crossValidation_init,
+				initargs=(shared, labels, order)) as executor:
+
+				results = list(executor.map(
+					crossValidation_task,
+					[model_factory] * folds,
+					[cutoff] * folds,
+					[folds] * folds,
+					range(folds)
+				))
 
-	print("Accuracy:", round((results/folds), 4))
+		finally:
+			release_samples(memory)
 
+	scores, true_labels, pred_labels, dists = zip(*results)
 
+	accuracy = round((sum(scores)/folds), 4)
+	print("Accuracy:", accuracy)
 
+	# Every held-out prediction is kept, to calibrate the threshold later
+	predictions = {
+		'true': numpy.concatenate(true_labels),
+		'pred': numpy.concatenate(pred_labels),
+		'dist': numpy.concatenate(dists)
+	}
 
-def crossValidation_fold(model, samples, labels, cutoff, folds, i):
+	return accuracy, predictions
+
+
+
+
+def crossValidation_init(samples, labels, order):
+
+	""" Stores the cross validation samples inside a worker process
+
+	Arguments:
+	----------
+		samples:
+			type: list / string / tuple
+			info: contains all the images (or the path of their pack, or
+				their shared memory, see 'share_samples')
+
+		labels:
+			type: list / numpy array
+			info: contains all the images labels
+
+		order:
+			type: list
+			info: shuffled positions of the samples
+	"""
+
+	if isinstance(samples, str):
+		samples = numpy.load(samples, mmap_mode='r')
+
+	# The memory object is kept, so the buffer is not closed
+	elif isinstance(samples, tuple):
+		name, shape, dtype = samples
+		fold_data['memory'] = SharedMemory(name=name)
+		samples = numpy.ndarray(shape, dtype, buffer=fold_data['memory'].buf)
+
+	fold_data['samples'] = samples
+	fold_data['labels'] = labels
+	fold_data['order'] = order
+
+
+
+
+def crossValidation_task(model_factory, cutoff, folds, i):
+
+	""" Performs a fold inside a worker process with a new recognizer
+
+	Arguments:
+	----------
+		model_factory:
+			type: picklable callable
+			info: builds a new untrained OpenCV Recognizer
+
+		cutoff
+			type: int
+			info: number of samples per fold
+
+		folds:
+			type: int
+			info: total number of folds
+
+		i:
+			type: int
+			info: fold iteration number
+
+	Returns:
+	----------
+		result:
+			type: tuple
+			info: score, true labels, predicted labels and distances (see 'crossValidation_fold')
+	"""
+
+	return crossValidation_fold(
+		model=model_factory(),
+		samples=fold_data['samples'],
+		labels=fold_data['labels'],
+		order=fold_data['order'],
+		cutoff=cutoff,
+		folds=folds,
+		i=i
+	)
+
+
+
+
+def crossValidation_fold(model, samples, labels, order, cutoff, folds, i):
 
 	""" Performs a single iteration of the Cross Validation algorithm
 
@@ -313,7 +623,7 @@ def crossValidation_fold(model, samples, labels, cutoff, folds, i):
 	----------
 		model:
 			type: OpenCV Recognizer
-			info: object used to train and test
+			info: untrained object used to train and test
 
 		samples:
 			type: list
@@ -323,6 +633,10 @@ def crossValidation_fold(model, samples, labels, cutoff, folds, i):
 			type: list
 			info: contains all the images labels
 
+		order:
+			type: list
+			info: shuffled positions of the samples
+
 		cutoff
 			type: int
 			info: number of samples per fold
@@ -334,31 +648,140 @@ def crossValidation_fold(model, samples, labels, cutoff, folds, i):
 		i:
 			type: int
 			info: fold iteration number
+
+	Returns:
+	----------
+		score:
+			type: float
+			info: ratio of test samples correctly predicted
+
+		test_labels:
+			type: numpy array
+			info: true labels of the test samples
+
+		pred_labels:
+			type: numpy array
+			info: predicted labels of the test samples
+
+		dists:
+			type: numpy array
+			info: prediction distances of the test samples
 	"""
 
-	upper_cut = ((folds-i-1) * cutoff)
-	lower_cut = ((folds-i) * cutoff)
+	train_index, test_index = crossValidation_split(order, cutoff, folds, i)
 
-	# Split by the desired test percentage
-	test_samples = samples[upper_cut:lower_cut]
-	test_labels = numpy.array(labels[upper_cut:lower_cut])
-	train_samples = samples[:upper_cut] + samples[lower_cut:]
-	train_labels = numpy.array(labels[:upper_cut] + labels[lower_cut:])
+	# Split by the desired test percentage (views of the samples)
+	test_samples = [samples[j] for j in test_index]
+	test_labels = numpy.asarray(labels)[test_index]
+	train_samples = [samples[j] for j in train_index]
+	train_labels = numpy.asarray(labels)[train_index]
 
 	# Training partial model
-	partial_model = model
-	partial_model.train(train_samples, train_labels)
-	total, good = len(test_samples), 0
+	model.train(train_samples, train_labels)
+	total = len(test_samples)
 
-	# Testing over the test_samples
-	for n, sample in enumerate(test_samples):
-		label, _ = partial_model.predict(sample)
-
-		# If the predicted label is the correct one
-		if label == test_labels[n]:
-			good += 1
+	# Testing over the test_samples at once
+	pred_labels, dists = batch_predict(model, test_samples)
+	good = int(numpy.sum(pred_labels == test_labels))
 
 	score = round(good/total, 4)
 	print('Fold', i, 'completed with score:', score)
 
-	return score
+	return score, test_labels, pred_labels, dists
+
+
+
+
+def crossValidation_split(order, cutoff, folds, i):
+
+	""" Obtains the training and testing positions of a fold
+
+	Arguments:
+	----------
+		order:
+			type: list
+			info: shuffled positions of the samples
+
+		cutoff
+			type: int
+			info: number of samples per fold
+
+		folds:
+			type: int
+			info: total number of folds
+
+		i:
+			type: int
+			info: fold iteration number
+
+	Returns:
+	----------
+		train_index:
+			type: list
+			info: positions of the training samples
+
+		test_index:
+			type: list
+			info: positions of the testing samples
+	"""
+
+	upper_cut = ((folds-i-1) * cutoff)
+	lower_cut = ((folds-i) * cutoff)
+
+	test_index = order[upper_cut:lower_cut]
+	train_index = order[:upper_cut] + order[lower_cut:]
+
+	return train_index, test_index
+
+
+
+
+def share_samples(samples):
+
+	""" Copies the samples into shared memory, so processes can map them
+
+	Arguments:
+	----------
+		samples:
+			type: numpy array / numpy memmap
+			info: contains all the images
+
+	Returns:
+	----------
+		memory:
+			type: SharedMemory / None
+			info: block holding the samples (None if they are packed)
+
+		shared:
+			type: tuple / string
+			info: (name, shape, dtype) of the block, or the path of the pack
+	"""
+
+	if isinstance(samples, numpy.memmap):
+		return None, samples.filename
+
+	samples = numpy.asarray(samples)
+	memory = SharedMemory(create=True, size=max(samples.nbytes, 1))
+
+	shared = numpy.ndarray(samples.shape, samples.dtype, buffer=memory.buf)
+	shared[:] = samples
+
+	return memory, (memory.name, samples.shape, samples.dtype.str)
+
+
+
+
+def release_samples(memory):
+
+	""" Frees the shared memory of some samples (see 'share_samples')
+
+	Arguments:
+	----------
+		memory:
+			type: SharedMemory / None
+			info: block holding the samples
+	"""
+
+	if memory is not None:
+		memory.close()
+		memory.unlink()
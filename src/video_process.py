@@ -2,18 +2,40 @@
 
 
 import cv2
+import json
+import multiprocessing
+import numpy
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from clf_train import load_classifier
+
+from frame_analysis import FrameAnalyser
+from frame_analysis import is_stateful
 
-from image_process import check_faces
 from image_process import draw_rect
 from image_process import draw_text
-from image_process import normalize_face
+
+from records import RecordsWriter
+from records import concat_records
+from records import detection_record
 
 from utils import compute_path
+from utils import read_json
+from utils import write_json
 
 
 
 
-def identify_actors(video_path, clf, clf_th, out_name):
+def identify_actors(video_path, model_name, clf_th, out_name, workers=1, segments=1,
+	video_output=True, records=None, **options):
 
 	""" Identifies the actors using a classifier and generates an output video
 
@@ -23,9 +45,9 @@ def identify_actors(video_path, clf, clf_th, out_name):
 			type: string
 			info: path to where the video is stored
 
-		clf:
-			type: FaceRecognizer object
-			info: trained classifier to identify faces
+		model_name:
+			type: string
+			info: name of the trained model inside the models folder
 
 		clf_th:
 			type: int / float
@@ -34,16 +56,419 @@ def identify_actors(video_path, clf, clf_th, out_name):
 		out_name:
 			type: string
 			info: name of the generated video file
+
+		workers:
+			type: int (optional)
+			info: number of processes analysing frames (1 = serial)
+
+		segments:
+			type: int (optional)
+			info: number of frame ranges analysed independently (1 = none)
+
+		video_output:
+			type: bool (optional)
+			info: whether to generate the annotated video
+
+		records:
+			type: string (optional)
+			info: format of the detections records file {csv, jsonl}
+
+		options:
+			type: keyword arguments
+			info: options of the frames analysis (see 'FrameAnalyser')
 	"""
 
+	if workers < 1:
+		exit('The number of workers must be greater than 0')
+	if segments < 1:
+		exit('The number of segments must be greater than 0')
+	if not video_output and records is None:
+		exit('Either the video or the records must be generated')
+
+	outputs = {'video_output': video_output, 'records': records}
+
+	if segments > 1:
+		identify_segments(video_path, model_name, clf_th, out_name, workers, segments, outputs, options)
+		return
+
+	if workers > 1 and is_stateful(options):
+		exit('The analysis options require a single worker (or segments)')
+
 	video = cv2.VideoCapture(video_path)
 
-	# The new generated video is prepared to be saved
+	if workers == 1:
+		clf = load_classifier(model_name)
+		analyser = FrameAnalyser(clf, clf_th, **options)
+		analysis = serial_analysis(video, analyser)
+	else:
+		analysis = pipeline_analysis(video, model_name, clf_th, workers, options)
+
+	write_analysis(analysis, video, out_name, **outputs)
+	video.release()
+
+	if workers == 1:
+		print('Full detections:', analyser.stats['detections'], 'of', analyser.stats['frames'], 'frames')
+		print('Predictions:', analyser.stats['predictions'])
+		print('Static frames reused:', analyser.stats['skipped'])
+
+
+
+
+def write_analysis(analysis, video, out_name, video_output, records, first_index=0):
+
+	""" Writes the analysed frames into the annotated video and / or records
+
+	Arguments:
+	----------
+		analysis:
+			type: generator
+			info: (frame, detections) tuples, in order
+
+		video:
+			type: OpenCV VideoCapture
+			info: opened video whose size and fps are copied
+
+		out_name:
+			type: string
+			info: name of the generated files (without extension)
+
+		video_output:
+			type: bool
+			info: whether to generate the annotated video
+
+		records:
+			type: string / None
+			info: format of the detections records file {csv, jsonl}
+
+		first_index:
+			type: int (optional)
+			info: position of the first analysed frame within the video
+	"""
+
+	fps = video.get(5) or 30
+	out, records_out = None, None
+
+	if video_output:
+		out = open_writer(video, out_name + '.mp4')
+	if records is not None:
+		records_out = RecordsWriter(out_name, records)
+
+	# Write each frame, in order, with its detected faces
+	for index, (frame, detections) in enumerate(analysis, first_index):
+		if out is not None:
+			out.write(draw_detections(frame, detections))
+		if records_out is not None:
+			records_out.write(index, index / fps, detections)
+
+	if out is not None:
+		out.release()
+	if records_out is not None:
+		records_out.release()
+
+
+
+
+def output_names(out_name, video_output, records):
+
+	""" Lists the names of the files generated for some outputs
+
+	Arguments:
+	----------
+		out_name:
+			type: string
+			info: name of the generated files (without extension)
+
+		video_output:
+			type: bool
+			info: whether the annotated video is generated
+
+		records:
+			type: string / None
+			info: format of the detections records file {csv, jsonl}
+
+	Returns:
+	----------
+		names:
+			type: list
+			info: names of the generated files (with extension)
+	"""
+
+	names = []
+
+	if video_output:
+		names.append(out_name + '.mp4')
+	if records is not None:
+		names.append(out_name + '.' + records)
+
+	return names
+
+
+
+
+def identify_segments(video_path, model_name, clf_th, out_name, workers, segments, outputs, options):
+
+	""" Identifies the actors splitting the video into independent frame ranges
+
+	Each segment is analysed by a process with its own capture and writers,
+	and marked as done once its partial outputs are complete. Segments
+	already done are skipped, so an interrupted run can be resumed.
+
+	Arguments:
+	----------
+		video_path:
+			type: string
+			info: path to where the video is stored
+
+		model_name:
+			type: string
+			info: name of the trained model inside the models folder
+
+		clf_th:
+			type: int / float
+			info: threshold to identify a face as 'Unknown'
+
+		out_name:
+			type: string
+			info: name of the generated video file
+
+		workers:
+			type: int
+			info: number of processes analysing segments
+
+		segments:
+			type: int
+			info: number of frame ranges to split the video into
+
+		outputs:
+			type: dict
+			info: contains the following keys:
+				- video_output (bool)
+				- records (string / None)
+
+		options:
+			type: dict
+			info: options of the frames analysis (see 'FrameAnalyser')
+	"""
+
+	video = cv2.VideoCapture(video_path)
+	total = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+	video.release()
+
+	if total <= 0:
+		exit('The number of frames of the video could not be determined')
+
+	bounds = [round(i * total / segments) for i in range(segments + 1)]
+	tasks, parts = [], []
+
+	for i in range(segments):
+		part = {
+			'name': out_name + '.part' + str(i),
+			'video': video_path,
+			'model': model_name,
+			'clf_th': clf_th,
+			'start': bounds[i],
+			'end': bounds[i+1],
+			'video_output': outputs['video_output'],
+			'records': outputs['records'],
+			'options': options
+		}
+
+		parts.append(part['name'])
+
+		# Completed segments of a previous run are not analysed
+		# again, unless any of their settings or options changed
+		if read_segment(part) != part:
+			tasks.append(part)
+
+	print('Segments to analyse:', len(tasks), 'of', segments)
+
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for name in executor.map(analyse_segment, tasks):
+			print('Segment completed:', name)
+
+	part_files = [output_names(name, **outputs) for name in parts]
+	out_files = output_names(out_name, **outputs)
+
+	# Each output is joined from the same output of every part
+	for i, out_file in enumerate(out_files):
+		files = [names[i] for names in part_files]
+
+		if out_file.endswith('.mp4'):
+			concat_videos(files, out_file)
+		else:
+			concat_records(files, out_file)
+
+	for name, names in zip(parts, part_files):
+		for file in names + [name + '.json']:
+			os.remove(compute_path(file, 'video'))
+
+
+
+
+def analyse_segment(part):
+
+	""" Analyses a range of frames into a partial video (worker process)
+
+	Arguments:
+	----------
+		part:
+			type: dict
+			info: segment description containing:
+				- name (string)
+				- video (string)
+				- model (string)
+				- clf_th (float)
+				- start (int)
+				- end (int)
+				- video_output (bool)
+				- records (string / None)
+				- options (dict, see 'FrameAnalyser')
+
+	Returns:
+	----------
+		name:
+			type: string
+			info: name of the completed segment
+	"""
+
+	video = cv2.VideoCapture(part['video'])
+	video.set(cv2.CAP_PROP_POS_FRAMES, part['start'])
+
+	clf = load_classifier(part['model'])
+	analyser = FrameAnalyser(clf, part['clf_th'], **part['options'])
+
+	analysis = serial_analysis(video, analyser, part['end'] - part['start'])
+	write_analysis(
+		analysis=analysis,
+		video=video,
+		out_name=part['name'],
+		video_output=part['video_output'],
+		records=part['records'],
+		first_index=part['start']
+	)
+
+	video.release()
+
+	print(part['name'], 'static frames reused:', analyser.stats['skipped'], 'of', analyser.stats['frames'])
+
+	# The marker is only written once the partial outputs are complete
+	write_json(part, part['name'] + '.json', 'video')
+
+	return part['name']
+
+
+
+
+def read_segment(part):
+
+	""" Reads the marker of a completed segment, if it exists
+
+	Arguments:
+	----------
+		part:
+			type: dict
+			info: segment description (see 'analyse_segment')
+
+	Returns:
+	----------
+		part:
+			type: dict / None
+			info: completed segment description (None if it was not completed)
+	"""
+
+	names = [part['name'] + '.json']
+	names += output_names(part['name'], part['video_output'], part['records'])
+
+	if not all(os.path.exists(compute_path(name, 'video')) for name in names):
+		return None
+
+	return read_json(part['name'] + '.json', 'video')
+
+
+
+
+def concat_videos(part_names, out_name):
+
+	""" Joins several partial videos into a single one
+
+	FFmpeg is used to copy the streams without re-encoding when available,
+	otherwise the frames are read and written again with OpenCV.
+
+	Arguments:
+	----------
+		part_names:
+			type: list
+			info: names of the partial videos, in order
+
+		out_name:
+			type: string
+			info: name of the joined video file
+	"""
+
+	part_paths = [compute_path(name, 'video') for name in part_names]
+	out_path = compute_path(out_name, 'video')
+
+	if shutil.which('ffmpeg'):
+		list_path = out_path + '.txt'
+
+		with open(list_path, 'w', encoding='utf-8') as file:
+			for path in part_paths:
+				file.write("file '" + path.replace("'", "'\\''") + "'\n")
+
+		result = subprocess.run(
+			['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+			 '-i', list_path, '-c', 'copy', out_path]
+		)
+
+		os.remove(list_path)
+		if result.returncode == 0:
+			return
+
+	video = cv2.VideoCapture(part_paths[0])
+	out = open_writer(video, out_name)
+	video.release()
+
+	for path in part_paths:
+		video = cv2.VideoCapture(path)
+
+		not_finished, frame = video.read()
+		while not_finished:
+			out.write(frame)
+			not_finished, frame = video.read()
+
+		video.release()
+
+	out.release()
+
+
+
+
+def open_writer(video, out_name):
+
+	""" Prepares a video writer with the same properties as the given video
+
+	Arguments:
+	----------
+		video:
+			type: OpenCV VideoCapture
+			info: opened video whose size and fps are copied
+
+		out_name:
+			type: string
+			info: name of the generated video file
+
+	Returns:
+	----------
+		out:
+			type: OpenCV VideoWriter
+			info: opened video writer
+	"""
+
 	video_w = int(video.get(3))
 	video_h = int(video.get(4))
 	video_fps = int(video.get(5))
 
-	out_path = compute_path(out_name + '.mp4', 'video')
+	out_path = compute_path(out_name, 'video')
 	out = cv2.VideoWriter(
 		filename=out_path,
 		fourcc=cv2.VideoWriter_fourcc(*"mp4v"), # Before: cv2.VideoWriter_fourcc('X', '2', '6', '4'),
@@ -51,18 +476,439 @@ def identify_actors(video_path, clf, clf_th, out_name):
 		frameSize=(video_w, video_h)
 	)
 
+	return out
+
+
+
+
+def serial_analysis(video, analyser, max_frames=None):
+
+	""" Analyses the frames of a video one after another (Generator)
+
+	Arguments:
+	----------
+		video:
+			type: OpenCV VideoCapture
+			info: opened video to read the frames from
+
+		analyser:
+			type: FrameAnalyser object
+			info: analyser keeping the state between consecutive frames
+
+		max_frames:
+			type: int (optional)
+			info: maximum number of frames to analyse (None = until the end)
+
+	Yields:
+	----------
+		frame:
+			type: numpy.array
+			info: array of frame pixels
+
+		detections:
+			type: list
+			info: detected faces of the frame (see 'FrameAnalyser.analyse')
+	"""
+
+	analysed = 0
+
 	not_finished, frame = video.read()
+	while not_finished and analysed != max_frames:
+		yield frame, analyser.analyse(frame)
+		analysed += 1
+		not_finished, frame = video.read()
+
+
+
+
+def pipeline_analysis(video, model_name, clf_th, workers, options):
+
+	""" Analyses the frames of a video using a pool of processes (Generator)
+
+	The frames are read by a thread, analysed by the worker processes and
+	yielded back in their original order. At most 4 frames per worker are
+	read and not yielded yet, so a slow frame never lets the reader fill
+	the memory with the ones behind it.
+
+	Arguments:
+	----------
+		video:
+			type: OpenCV VideoCapture
+			info: opened video to read the frames from
+
+		model_name:
+			type: string
+			info: name of the trained model each worker loads
+
+		clf_th:
+			type: int / float
+			info: threshold to identify a face as 'Unknown'
+
+		workers:
+			type: int
+			info: number of worker processes
+
+		options:
+			type: dict
+			info: options of the frames analysis (see 'FrameAnalyser')
+
+	Yields:
+	----------
+		frame:
+			type: numpy.array
+			info: array of frame pixels
+
+		detections:
+			type: list
+			info: detected faces of the frame (see 'FrameAnalyser.analyse')
+	"""
+
+	tasks = multiprocessing.Queue(maxsize=workers * 2)
+	results = multiprocessing.Queue(maxsize=workers * 2)
+
+	# Frames waiting for their detections, indexed by position
+	pending = {}
+	slots = threading.Semaphore(workers * 4)
+
+	reader = threading.Thread(
+		target=read_frames,
+		args=(video, tasks, pending, slots, workers),
+		daemon=True
+	)
+
+	processes = [
+		multiprocessing.Process(
+			target=analyse_frames,
+			args=(tasks, results, model_name, clf_th, options),
+			daemon=True
+		)
+		for _ in range(workers)
+	]
+
+	for process in processes:
+		process.start()
+	reader.start()
+
+	analysed = {}
+	next_index = 0
+	finished = 0
+
+	while finished < workers:
+
+		try:
+			result = results.get(timeout=1)
+		except queue.Empty:
+			if any(p.exitcode for p in processes):
+				exit('A frame analysis worker has died unexpectedly')
+			continue
+
+		if result is None:
+			finished += 1
+			continue
+
+		index, detections = result
+		analysed[index] = detections
+
+		# Releases every consecutive frame already analysed
+		while next_index in analysed:
+			yield pending.pop(next_index), analysed.pop(next_index)
+			slots.release()
+			next_index += 1
+
+	reader.join()
+	for process in processes:
+		process.join()
+
+
+
+
+def read_frames(video, tasks, pending, slots, workers):
+
+	""" Reads every video frame and sends it to the analysis workers
+
+	Arguments:
+	----------
+		video:
+			type: OpenCV VideoCapture
+			info: opened video to read the frames from
+
+		tasks:
+			type: multiprocessing Queue
+			info: queue where the (index, frame) tuples are put
+
+		pending:
+			type: dict
+			info: frames waiting for their detections, indexed by position
+
+		slots:
+			type: threading Semaphore
+			info: frames that can be read before the oldest one is yielded
+
+		workers:
+			type: int
+			info: number of workers to notify when the video is over
+	"""
+
+	index = 0
+
+	slots.acquire()
+	not_finished, frame = video.read()
+
 	while not_finished:
+		pending[index] = frame
+		tasks.put((index, frame))
 
-		# Modify the frame for each detected face
-		frame = modify_frame(frame, clf, clf_th)
+		index += 1
 
-		# Write the frame into the new video file
-		out.write(frame)
+		slots.acquire()
 		not_finished, frame = video.read()
 
+	for _ in range(workers):
+		tasks.put(None)
+
+
+
+
+def analyse_frames(tasks, results, model_name, clf_th, options):
+
+	""" Analyses the frames received until a None is read (worker process)
+
+	Arguments:
+	----------
+		tasks:
+			type: multiprocessing Queue
+			info: queue where the (index, frame) tuples are read from
+
+		results:
+			type: multiprocessing Queue
+			info: queue where the (index, detections) tuples are put
+
+		model_name:
+			type: string
+			info: name of the trained model to load
+
+		clf_th:
+			type: int / float
+			info: threshold to identify a face as 'Unknown'
+
+		options:
+			type: dict
+			info: options of the frames analysis (see 'FrameAnalyser')
+	"""
+
+	clf = load_classifier(model_name)
+	analyser = FrameAnalyser(clf, clf_th, **options)
+
+	for index, frame in iter(tasks.get, None):
+		results.put((index, analyser.analyse(frame)))
+
+	results.put(None)
+
+
+
+
+def stream_actors(source, model_name, clf_th, latency=0.2, realtime=False, display=False, **options):
+
+	""" Identifies the actors of a live source, dropping frames to keep latency
+
+	A thread keeps reading the source, only retaining its latest frame. Frames
+	replaced before being analysed, or older than the latency budget once the
+	analysis is ready for them, are dropped instead of queued.
+
+	Arguments:
+	----------
+		source:
+			type: string
+			info: device index, pipe / URL or path readable by OpenCV
+
+		model_name:
+			type: string
+			info: name of the trained model inside the models folder
+
+		clf_th:
+			type: int / float
+			info: threshold to identify a face as 'Unknown'
+
+		latency:
+			type: float (optional)
+			info: maximum seconds between a frame capture and its analysis
+
+		realtime:
+			type: bool (optional)
+			info: replays a video file at its real speed (live stand-in)
+
+		display:
+			type: bool (optional)
+			info: shows the annotated frames instead of printing detections
+
+		options:
+			type: keyword arguments
+			info: options of the frames analysis (see 'FrameAnalyser')
+	"""
+
+	if source.isdigit():
+		source = int(source)
+
+	video = cv2.VideoCapture(source)
+	if not video.isOpened():
+		exit('The source ' + str(source) + ' could not be opened')
+
+	# Standard output only carries the detection records
+	clf = load_classifier(model_name)
+	clf.verbose = False
+	analyser = FrameAnalyser(clf, clf_th, **options)
+
+	# Latest captured frame, shared with the grabbing thread
+	slot = {'frame': None, 'finished': False, 'stop': False, 'replaced': 0}
+	condition = threading.Condition()
+
+	grabber = threading.Thread(
+		target=grab_frames,
+		args=(video, slot, condition, realtime),
+		daemon=True
+	)
+
+	start = time.perf_counter()
+	grabber.start()
+
+	latencies, stale = [], 0
+
+	try:
+		while True:
+
+			with condition:
+				while slot['frame'] is None and not slot['finished']:
+					condition.wait()
+				if slot['frame'] is None:
+					break
+
+				index, captured, frame = slot['frame']
+				slot['frame'] = None
+
+			if (time.perf_counter() - captured) > latency:
+				stale += 1
+				continue
+
+			detections = analyser.analyse(frame)
+
+			if display:
+				cv2.imshow('Face Recognizer', draw_detections(frame, detections))
+				if cv2.waitKey(1) & 0xFF == ord('q'):
+					break
+			else:
+				for detection in detections:
+					record = detection_record(index, captured - start, detection)
+					print(json.dumps(record), flush=True)
+
+			latencies.append(time.perf_counter() - captured)
+
+	except KeyboardInterrupt:
+		pass
+
+	with condition:
+		slot['stop'] = True
+
+	grabber.join()
 	video.release()
-	out.release()
+
+	if display:
+		cv2.destroyAllWindows()
+
+	print('Analysed frames:', len(latencies), file=sys.stderr)
+	print('Static frames reused:', analyser.stats['skipped'], file=sys.stderr)
+	print(
+		'Dropped frames:', slot['replaced'] + stale,
+		'(replaced:', slot['replaced'], 'stale:', str(stale) + ')',
+		file=sys.stderr
+	)
+
+	if latencies:
+		print('Latency p50:', round(numpy.percentile(latencies, 50) * 1000, 2), 'ms', file=sys.stderr)
+		print('Latency p99:', round(numpy.percentile(latencies, 99) * 1000, 2), 'ms', file=sys.stderr)
+
+
+
+
+def grab_frames(video, slot, condition, realtime):
+
+	""" Reads frames continuously, keeping only the latest one in the slot
+
+	Arguments:
+	----------
+		video:
+			type: OpenCV VideoCapture
+			info: opened source to read the frames from
+
+		slot:
+			type: dict
+			info: contains the following keys:
+				- frame:     (index, capture time, frame) tuple / None
+				- finished:  bool
+				- stop:      bool
+				- replaced:  int
+
+		condition:
+			type: threading Condition
+			info: condition used to notify a new frame
+
+		realtime:
+			type: bool
+			info: whether to wait between frames as a live source would
+	"""
+
+	fps = video.get(5) or 30
+	start = time.perf_counter()
+	index = 0
+
+	not_finished, frame = video.read()
+	while not_finished and not slot['stop']:
+
+		if realtime:
+			time.sleep(max(0, start + index / fps - time.perf_counter()))
+
+		with condition:
+			if slot['frame'] is not None:
+				slot['replaced'] += 1
+
+			slot['frame'] = (index, time.perf_counter(), frame)
+			condition.notify()
+
+		index += 1
+		not_finished, frame = video.read()
+
+	with condition:
+		slot['finished'] = True
+		condition.notify()
+
+
+
+
+def draw_detections(frame, detections):
+
+	""" Plot a rectangle and a label for each of the given detections
+
+	Arguments:
+	----------
+		frame:
+			type: numpy.array
+			info: array of frame pixels
+
+		detections:
+			type: list
+			info: detected faces of the frame (see 'FrameAnalyser.analyse')
+
+	Returns:
+	----------
+		frame:
+			type: numpy.array
+			info: array of frame pixels (may be modified)
+	"""
+
+	for detection in detections:
+		frame = draw_rect(frame, detection['coords'])
+		frame = draw_text(frame, detection['label'], detection['coords'])
+
+	return frame
 
 
 
@@ -92,10 +938,5 @@ def modify_frame(frame, clf, clf_th):
 			info: array of frame pixels (may be modified)
 	"""
 
-	for face, coords in check_faces(frame):
-		face = normalize_face(face)
-		label = clf.predict(face, clf_th)
-		frame = draw_rect(frame, coords)
-		frame = draw_text(frame, label, coords)
-
-	return frame
+	detections = FrameAnalyser(clf, clf_th).analyse(frame)
+	return draw_detections(frame, detections)
@@ -0,0 +1,9 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import os
+import sys
+
+
+# The modules import each other as top level ones
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
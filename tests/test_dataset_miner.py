@@ -0,0 +1,273 @@
+# Created by Sinclert Pérez & Silvia Barbero
+
+
+import threading
+import time
+
+import pytest
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from dataset_miner import create_session
+from dataset_miner import fetch_images
+from dataset_miner import get_image_urls
+from dataset_miner import get_next_page
+from dataset_miner import get_page
+
+
+FIXTURE_PAGE = '''
+<html><body>
+	<img src="/img/0.png">
+	<img src="img/1.png">
+	<img src="../img/2.png">
+	<img src="//localhost:{port}/img/3.png">
+	<img src="data:image/png;base64,Zml4dHVyZQ==">
+	<img src="/img/0.png">
+	<img alt="Without source">
+	<img src="">
+	<a class="fl" href="/results/1">Previous</a>
+	<a class="fl" href="/results/2">Next</a>
+</body></html>
+'''
+
+
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+
+	""" Serves a fixture page and images slowly, counting the requests per host
+
+	Attributes:
+	----------
+		latency:
+			type: float
+			info: seconds waited before every response
+
+		served:
+			type: int
+			info: number of requests received
+
+		active:
+			type: dict
+			info: requests being served per host
+
+		peaks:
+			type: dict
+			info: maximum requests served at the same time per host
+	"""
+
+	latency = 0.05
+	served = 0
+	active = {}
+	peaks = {}
+	lock = threading.Lock()
+
+
+
+
+	def do_GET(self):
+
+		""" Responds with the page, the image of the path, or a not found error """
+
+		host = self.headers.get('Host')
+
+		with self.lock:
+			FixtureHandler.served += 1
+			self.active[host] = self.active.get(host, 0) + 1
+			self.peaks[host] = max(self.peaks.get(host, 0), self.active[host])
+
+		try:
+			time.sleep(self.latency)
+
+			if self.path == '/results/page.html':
+				port = self.server.server_address[1]
+				self.respond('text/html', FIXTURE_PAGE.format(port=port).encode())
+
+			elif self.path.endswith('.png') and self.path != '/img/missing.png':
+				self.respond('image/png', image_bytes(self.path))
+
+			else:
+				self.send_error(404)
+
+		finally:
+			with self.lock:
+				self.active[host] -= 1
+
+
+
+
+	def respond(self, content_type, content):
+
+		""" Sends a successful response
+
+		Arguments:
+		----------
+			content_type:
+				type: string
+				info: MIME type of the content
+
+			content:
+				type: bytes
+				info: body of the response
+		"""
+
+		self.send_response(200)
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(content)))
+		self.end_headers()
+		self.wfile.write(content)
+
+
+
+
+	def log_message(self, *args):
+
+		""" Silences the requests log """
+
+		pass
+
+
+
+
+def image_bytes(path):
+
+	""" Builds the fixture content of an image path
+
+	Arguments:
+	----------
+		path:
+			type: string
+			info: path of the image
+
+	Returns:
+	----------
+		content:
+			type: bytes
+			info: bytes served for the path
+	"""
+
+	return ('fixture ' + path).encode() * 100
+
+
+
+
+@pytest.fixture
+def server():
+
+	""" Starts a fixture server in a thread, stopping it after the test """
+
+	FixtureHandler.served = 0
+	FixtureHandler.active = {}
+	FixtureHandler.peaks = {}
+
+	httpd = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+	thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+	thread.start()
+
+	yield httpd.server_address[1]
+
+	httpd.shutdown()
+	httpd.server_close()
+
+
+
+
+def test_get_image_urls_resolves_the_page_sources(server):
+
+	""" Sources are made absolute and kept in order, once, skipping the empty ones """
+
+	base = 'http://127.0.0.1:' + str(server)
+	url = base + '/results/page.html'
+	page = get_page(url, create_session())
+
+	assert get_image_urls(page, url) == [
+		base + '/img/0.png',
+		base + '/results/img/1.png',
+		base + '/img/2.png',
+		'http://localhost:' + str(server) + '/img/3.png',
+		'data:image/png;base64,Zml4dHVyZQ=='
+	]
+
+	assert get_next_page(page, 'fl') == '/results/2'
+
+
+
+
+def test_fetch_images_downloads_the_page_images(server):
+
+	""" Every image of the fixture page is obtained with its bytes """
+
+	url = 'http://127.0.0.1:' + str(server) + '/results/page.html'
+	urls = get_image_urls(get_page(url, create_session()), url)
+
+	images = dict(fetch_images(urls, create_session(), workers=4, per_host=2))
+
+	assert set(images) == set(urls)
+	assert images[urls[1]] == image_bytes('/results/img/1.png')
+	assert images[urls[3]] == image_bytes('/img/3.png')
+	assert images[urls[4]] == b'fixture'
+
+
+
+
+def test_fetch_images_yields_every_reachable_image(server):
+
+	""" Every image is yielded with its bytes, and the missing one is skipped """
+
+	urls = ['http://127.0.0.1:' + str(server) + '/img/' + str(i) + '.png' for i in range(12)]
+	missing = 'http://127.0.0.1:' + str(server) + '/img/missing.png'
+
+	images = dict(fetch_images(urls + [missing], create_session(), workers=4, per_host=4))
+
+	assert set(images) == set(urls)
+
+	for url, content in images.items():
+		assert content == image_bytes(url.split(str(server), 1)[1])
+
+
+
+
+def test_fetch_images_decodes_inlined_images(server):
+
+	""" Images inlined as data URIs are decoded instead of downloaded """
+
+	url = 'data:image/png;base64,' + 'Zml4dHVyZQ=='
+
+	assert list(fetch_images([url], create_session())) == [(url, b'fixture')]
+
+
+
+
+def test_fetch_images_respects_the_host_limit(server):
+
+	""" No host serves more downloads at the same time than allowed """
+
+	hosts = ['127.0.0.1', 'localhost']
+	urls = [
+		'http://' + host + ':' + str(server) + '/img/' + str(i) + '.png'
+		for host in hosts for i in range(10)
+	]
+
+	images = list(fetch_images(urls, create_session(), workers=8, per_host=2))
+
+	assert len(images) == len(urls)
+	assert all(FixtureHandler.peaks[host + ':' + str(server)] <= 2 for host in hosts)
+
+
+
+
+def test_fetch_images_cancels_pending_downloads(server):
+
+	""" Closing the generator cancels the downloads not started yet """
+
+	urls = ['http://127.0.0.1:' + str(server) + '/img/' + str(i) + '.png' for i in range(40)]
+	images = fetch_images(urls, create_session(), workers=2, per_host=2)
+
+	next(images)
+	images.close()
+
+	# Only the downloads already running are completed
+	time.sleep(10 * FixtureHandler.latency)
+	assert FixtureHandler.served <= 4